@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import time
 import typing
@@ -9,19 +10,23 @@ from fastapi.responses import FileResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
 import redis.asyncio as redis
 import uvicorn
 
 
 from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf.config import settings
-from src.database.db import get_db, get_redis, redis_pool
+from src.database.db import get_async_db, get_redis, redis_pool
 from src.database import db
+from src.database.models import Role
+from src.repository import contacts as repository_contacts
+from src.repository import users as repository_users
 from src.routes import contacts, auth, users
+from src.services.auth.auth import auth_service
+from src.services.rate_limiter import RateLimiter
+from src.services.roles import RoleAccess
 
 logger = logging.getLogger(f"{settings.app_name}")
 logger.setLevel(logging.DEBUG if settings.app_mode == "dev" else logging.INFO)
@@ -41,6 +46,10 @@ async def lifespan(app: FastAPI):
     except Exception as err:
         logger.error(f"other app err: {err}")
     yield
+    for name in ("user_invalidation", "tombstone_purge"):
+        task = getattr(app.state, name, None)
+        if task:
+            task.cancel()
     logger.debug("lifespan after")
 
 
@@ -53,16 +62,19 @@ app = FastAPI(lifespan=lifespan)  # type: ignore
 
 # @app.on_event("startup")
 async def startup():
+    app.state.tombstone_purge = asyncio.create_task(
+        repository_contacts.purge_tombstones_periodically(db.AsyncDBSession, settings.sync_tombstone_purge_seconds)
+    )
     redis_live: bool | None = await db.check_redis()
     if not redis_live:
         # db.redis_pool = False
         app.dependency_overrides[get_redis] = deny_get_redis
         logger.debug("startup DISABLE REDIS THAT DOWN")
     else:
-        await FastAPILimiter.init(get_redis())
         app.dependency_overrides[get_limit] = RateLimiter(
             times=settings.reate_limiter_times, seconds=settings.reate_limiter_seconds
         )
+        app.state.user_invalidation = asyncio.create_task(repository_users.listen_user_invalidation(get_redis()))
         logger.debug("startup done")
 
 
@@ -74,6 +86,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 
@@ -135,10 +148,10 @@ async def main(request: Request):
 
 
 @app.get("/api/healthchecker")
-def healthchecker(db: Session = Depends(get_db)):
+async def healthchecker(db: AsyncSession = Depends(get_async_db)):
     try:
         # Make request
-        result = db.execute(text("SELECT 1")).fetchone()
+        result = (await db.execute(text("SELECT 1"))).fetchone()
         if result is None:
             raise HTTPException(status_code=500, detail="Database is not configured correctly")
         return {"message": f"Welcome to FastAPI on Howe Work 13 APP: {settings.app_name.upper()}!"}
@@ -150,6 +163,16 @@ def healthchecker(db: Session = Depends(get_db)):
         )
 
 
+@app.get("/api/healthchecker/pool", dependencies=[Depends(RoleAccess([Role.admin]))])
+async def pool_status():
+    return db.get_db_pool_status()
+
+
+@app.get("/api/healthchecker/password_pool", dependencies=[Depends(RoleAccess([Role.admin]))])
+async def password_pool_status():
+    return auth_service.get_pool_status()
+
+
 app.include_router(
     contacts.router,
     prefix="/api",
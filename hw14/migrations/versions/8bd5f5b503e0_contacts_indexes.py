@@ -0,0 +1,39 @@
+"""contacts_indexes
+
+Revision ID: 8bd5f5b503e0
+Revises: b5c1d2898113
+Create Date: 2026-10-18 10:12:41.503127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8bd5f5b503e0'
+down_revision: Union[str, None] = 'b5c1d2898113'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index('ix_contacts_user_id_id', 'contacts', ['user_id', 'id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_contacts_user_id_email', 'contacts', ['user_id', sa.text('lower(email)')], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_contacts_user_id_favorite_id', 'contacts', ['user_id', 'favorite', 'id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_contacts_user_id_favorite_id', table_name='contacts', postgresql_concurrently=True,
+                      if_exists=True)
+        op.drop_index('ix_contacts_user_id_email', table_name='contacts', postgresql_concurrently=True,
+                      if_exists=True)
+        op.drop_index('ix_contacts_user_id_id', table_name='contacts', postgresql_concurrently=True,
+                      if_exists=True)
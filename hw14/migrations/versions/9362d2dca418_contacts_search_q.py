@@ -0,0 +1,86 @@
+"""contacts_search_q
+
+Revision ID: 9362d2dca418
+Revises: a333691936e7
+Create Date: 2026-10-18 12:36:52.604118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9362d2dca418'
+down_revision: Union[str, None] = 'a333691936e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PREFIX_COLUMNS = ['first_name', 'last_name']
+
+
+def fts_ddl(columns: list[str]) -> list[str]:
+    # frozen DDL of this revision, tests/test_unit_database_models.py pins src.database.models.contacts_fts_ddl to it
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{name}' for name in columns)
+    old_values = ', '.join(f'old.{name}' for name in columns)
+    delete_old = f"INSERT INTO contacts_fts(contacts_fts, rowid, {names}) VALUES ('delete', old.id, {old_values});"
+    insert_new = f"INSERT INTO contacts_fts(rowid, {names}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE contacts_fts USING fts5("
+        f"{names}, content='contacts', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER contacts_fts_ai AFTER INSERT ON contacts BEGIN {insert_new} END",
+        f"CREATE TRIGGER contacts_fts_ad AFTER DELETE ON contacts BEGIN {delete_old} END",
+        f"CREATE TRIGGER contacts_fts_au AFTER UPDATE ON contacts BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def create_fts(columns: list[str]) -> None:
+    op.execute("DROP TRIGGER IF EXISTS contacts_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS contacts_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS contacts_fts_ai")
+    op.execute("DROP TABLE IF EXISTS contacts_fts")
+    for ddl in fts_ddl(columns):
+        op.execute(ddl)
+    op.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+
+
+def prefix_expression(expression: str) -> sa.TextClause:
+    # ranges of prefix hold in code point order only, PostgreSQL default collation (en_US) ignores punctuation
+    if op.get_context().dialect.name == 'postgresql':
+        return sa.text(f'{expression} COLLATE "C"')
+    return sa.text(expression)
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name == 'sqlite':
+        create_fts(['first_name', 'last_name', 'email', 'phone'])
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction block
+    with op.get_context().autocommit_block():
+        if op.get_context().dialect.name == 'postgresql':
+            op.create_index('ix_contacts_phone_trgm', 'contacts', ['phone'], unique=False,
+                            postgresql_using='gin', postgresql_ops={'phone': 'gin_trgm_ops'},
+                            postgresql_concurrently=True, if_not_exists=True)
+        for name in PREFIX_COLUMNS:
+            op.create_index(f'ix_contacts_user_id_{name}', 'contacts',
+                            ['user_id', prefix_expression(f'lower({name})')], unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+        if op.get_context().dialect.name == 'postgresql':
+            op.create_index('ix_contacts_user_id_email_prefix', 'contacts',
+                            ['user_id', prefix_expression('lower(email)')], unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_contacts_user_id_email_prefix', table_name='contacts', postgresql_concurrently=True,
+                      if_exists=True)
+        for name in reversed(PREFIX_COLUMNS):
+            op.drop_index(f'ix_contacts_user_id_{name}', table_name='contacts', postgresql_concurrently=True,
+                          if_exists=True)
+        if op.get_context().dialect.name == 'postgresql':
+            op.drop_index('ix_contacts_phone_trgm', table_name='contacts', postgresql_concurrently=True,
+                          if_exists=True)
+    if op.get_context().dialect.name == 'sqlite':
+        create_fts(['first_name', 'last_name', 'email'])
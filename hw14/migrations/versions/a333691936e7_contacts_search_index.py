@@ -0,0 +1,59 @@
+"""contacts_search_index
+
+Revision ID: a333691936e7
+Revises: b6bf61e3c9a4
+Create Date: 2026-10-18 11:48:05.216874
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a333691936e7'
+down_revision: Union[str, None] = 'b6bf61e3c9a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRGM_COLUMNS = ['first_name', 'last_name', 'email']
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+                   "first_name, last_name, email, content='contacts', content_rowid='id', tokenize='trigram')")
+        op.execute("CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+                   "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+                   "VALUES (new.id, new.first_name, new.last_name, new.email); END")
+        op.execute("CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+                   "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+                   "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); END")
+        op.execute("CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+                   "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+                   "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); "
+                   "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+                   "VALUES (new.id, new.first_name, new.last_name, new.email); END")
+        op.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name in TRGM_COLUMNS:
+            op.create_index(f'ix_contacts_{name}_trgm', 'contacts', [name], unique=False,
+                            postgresql_using='gin', postgresql_ops={name: 'gin_trgm_ops'},
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS contacts_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS contacts_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS contacts_fts_ai")
+        op.execute("DROP TABLE IF EXISTS contacts_fts")
+        return
+    with op.get_context().autocommit_block():
+        for name in reversed(TRGM_COLUMNS):
+            op.drop_index(f'ix_contacts_{name}_trgm', table_name='contacts', postgresql_concurrently=True,
+                          if_exists=True)
@@ -0,0 +1,39 @@
+"""birthday_doy
+
+Revision ID: b6bf61e3c9a4
+Revises: 8bd5f5b503e0
+Create Date: 2026-10-18 11:03:27.911542
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6bf61e3c9a4'
+down_revision: Union[str, None] = '8bd5f5b503e0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_doy', sa.SmallInteger(), nullable=True))
+    # day of the year in leap year calendar, the same as src.repository.contacts.birthday_doy
+    op.execute(
+        "UPDATE contacts SET birthday_doy = EXTRACT(DOY FROM make_date(2000, "
+        "EXTRACT(MONTH FROM birthday)::int, EXTRACT(DAY FROM birthday)::int)) "
+        "WHERE birthday IS NOT NULL"
+    )
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index('ix_contacts_user_id_birthday_doy', 'contacts', ['user_id', 'birthday_doy'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_contacts_user_id_birthday_doy', table_name='contacts', postgresql_concurrently=True,
+                      if_exists=True)
+    op.drop_column('contacts', 'birthday_doy')
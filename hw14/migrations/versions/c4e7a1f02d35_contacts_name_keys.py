@@ -0,0 +1,143 @@
+"""contacts_name_keys
+
+Revision ID: c4e7a1f02d35
+Revises: 9362d2dca418
+Create Date: 2026-10-18 14:05:12.318406
+
+"""
+import re
+from typing import Sequence, Union
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e7a1f02d35'
+down_revision: Union[str, None] = '9362d2dca418'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+KEY_COLUMNS = ['first_name_key', 'last_name_key']
+FTS_COLUMNS = ['first_name', 'last_name', 'email', 'phone'] + KEY_COLUMNS
+BATCH_SIZE = 1000
+
+# Frozen copy of src.services.translit.search_key of this revision: keys written by the migration
+# must not change with later changes of the application
+CYRILLIC_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'h', 'ґ': 'g', 'д': 'd', 'е': 'e', 'є': 'ie', 'ж': 'zh', 'з': 'z',
+    'и': 'y', 'і': 'i', 'ї': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p',
+    'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh',
+    'щ': 'shch', 'ь': '', 'ю': 'iu', 'я': 'ia', 'ё': 'io', 'ъ': '', 'ы': 'y', 'э': 'e',
+}
+LATIN_FOLD = (('kh', 'h'), ('x', 'ks'), ('w', 'v'), ('y', 'i'), ('j', 'i'))
+TRANSLIT_TABLE = str.maketrans(CYRILLIC_LATIN)
+
+
+def search_key(text: str | None) -> str | None:
+    if not text:
+        return None
+    key = unicodedata.normalize('NFKD', text.casefold().translate(TRANSLIT_TABLE))
+    key = ''.join(c for c in key if not unicodedata.combining(c))
+    for variant, folded in LATIN_FOLD:
+        key = key.replace(variant, folded)
+    key = re.sub(r'[^a-z0-9 ]+', '', key)
+    key = re.sub(r'([a-z])\1+', r'\1', key)
+    key = ' '.join(key.split())
+    return key or None
+
+
+def fts_ddl(columns: list[str]) -> list[str]:
+    # frozen DDL of this revision, tests/test_unit_database_models.py pins src.database.models.contacts_fts_ddl to it
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{name}' for name in columns)
+    old_values = ', '.join(f'old.{name}' for name in columns)
+    delete_old = f"INSERT INTO contacts_fts(contacts_fts, rowid, {names}) VALUES ('delete', old.id, {old_values});"
+    insert_new = f"INSERT INTO contacts_fts(rowid, {names}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE contacts_fts USING fts5("
+        f"{names}, content='contacts', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER contacts_fts_ai AFTER INSERT ON contacts BEGIN {insert_new} END",
+        f"CREATE TRIGGER contacts_fts_ad AFTER DELETE ON contacts BEGIN {delete_old} END",
+        f"CREATE TRIGGER contacts_fts_au AFTER UPDATE ON contacts BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def create_fts(columns: list[str]) -> None:
+    op.execute("DROP TRIGGER IF EXISTS contacts_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS contacts_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS contacts_fts_ai")
+    op.execute("DROP TABLE IF EXISTS contacts_fts")
+    for ddl in fts_ddl(columns):
+        op.execute(ddl)
+    op.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+
+
+def prefix_expression(expression: str) -> sa.TextClause:
+    # ranges of prefix hold in code point order only, PostgreSQL default collation (en_US) ignores punctuation
+    if op.get_context().dialect.name == 'postgresql':
+        return sa.text(f'{expression} COLLATE "C"')
+    return sa.text(expression)
+
+
+def backfill_keys() -> None:
+    # keys are computed by the frozen search_key, batch by batch of id
+    if op.get_context().as_sql:
+        return
+    connection = op.get_bind()
+    contacts = sa.table('contacts', sa.column('id'), sa.column('first_name'), sa.column('last_name'),
+                        sa.column('first_name_key'), sa.column('last_name_key'))
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(contacts.c.id, contacts.c.first_name, contacts.c.last_name)
+            .where(contacts.c.id > last_id).order_by(contacts.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            contacts.update().where(contacts.c.id == sa.bindparam('contact_id')),
+            [{'contact_id': row.id, 'first_name_key': search_key(row.first_name),
+              'last_name_key': search_key(row.last_name)} for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    for name in KEY_COLUMNS:
+        op.add_column('contacts', sa.Column(name, sa.String(), nullable=True))
+    backfill_keys()
+    if op.get_context().dialect.name == 'sqlite':
+        create_fts(FTS_COLUMNS)
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name in KEY_COLUMNS:
+            if op.get_context().dialect.name == 'postgresql':
+                op.create_index(f'ix_contacts_{name}_trgm', 'contacts', [name], unique=False,
+                                postgresql_using='gin', postgresql_ops={name: 'gin_trgm_ops'},
+                                postgresql_concurrently=True, if_not_exists=True)
+            op.create_index(f'ix_contacts_user_id_{name}', 'contacts', ['user_id', prefix_expression(name)],
+                            unique=False, postgresql_concurrently=True, if_not_exists=True)
+        # autocomplete by names uses the keys now
+        for name in ['first_name', 'last_name']:
+            op.drop_index(f'ix_contacts_user_id_{name}', table_name='contacts', postgresql_concurrently=True,
+                          if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in ['first_name', 'last_name']:
+            op.create_index(f'ix_contacts_user_id_{name}', 'contacts',
+                            ['user_id', prefix_expression(f'lower({name})')], unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+        for name in reversed(KEY_COLUMNS):
+            op.drop_index(f'ix_contacts_user_id_{name}', table_name='contacts', postgresql_concurrently=True,
+                          if_exists=True)
+            if op.get_context().dialect.name == 'postgresql':
+                op.drop_index(f'ix_contacts_{name}_trgm', table_name='contacts', postgresql_concurrently=True,
+                              if_exists=True)
+    if op.get_context().dialect.name == 'sqlite':
+        create_fts(['first_name', 'last_name', 'email', 'phone'])
+    for name in reversed(KEY_COLUMNS):
+        op.drop_column('contacts', name)
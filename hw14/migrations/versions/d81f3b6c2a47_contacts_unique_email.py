@@ -0,0 +1,55 @@
+"""contacts_unique_email
+
+Revision ID: d81f3b6c2a47
+Revises: c4e7a1f02d35
+Create Date: 2026-10-18 15:12:40.527113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81f3b6c2a47'
+down_revision: Union[str, None] = 'c4e7a1f02d35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = 'ix_contacts_user_id_email'
+NEW_INDEX_NAME = 'ix_contacts_user_id_email_new'
+
+
+def check_duplicates() -> None:
+    if op.get_context().as_sql:
+        return
+    duplicates = op.get_bind().execute(sa.text(
+        "SELECT user_id, lower(email) FROM contacts GROUP BY user_id, lower(email) HAVING count(*) > 1 LIMIT 10"
+    )).all()
+    if duplicates:
+        raise RuntimeError(f"Contacts with duplicate email must be resolved before migration: {duplicates}")
+
+
+def replace_index(unique: bool) -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        op.drop_index(INDEX_NAME, table_name='contacts', if_exists=True)
+        op.create_index(INDEX_NAME, 'contacts', ['user_id', sa.text('lower(email)')], unique=unique)
+        return
+    # build the new index next to the old one, so lookups by email are served all the time
+    op.create_index(NEW_INDEX_NAME, 'contacts', ['user_id', sa.text('lower(email)')], unique=unique,
+                    postgresql_concurrently=True, if_not_exists=True)
+    op.drop_index(INDEX_NAME, table_name='contacts', postgresql_concurrently=True, if_exists=True)
+    op.execute(f'ALTER INDEX {NEW_INDEX_NAME} RENAME TO {INDEX_NAME}')
+
+
+def upgrade() -> None:
+    check_duplicates()
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction block
+    with op.get_context().autocommit_block():
+        replace_index(unique=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        replace_index(unique=False)
@@ -0,0 +1,43 @@
+"""contacts_delta_sync
+
+Revision ID: e2a9c47b1f86
+Revises: d81f3b6c2a47
+Create Date: 2026-10-18 16:20:05.713290
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a9c47b1f86'
+down_revision: Union[str, None] = 'd81f3b6c2a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('contact_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('contact_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_contact_tombstones_user_id_deleted_at', 'contact_tombstones', ['user_id', 'deleted_at'],
+                    unique=False)
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index('ix_contacts_user_id_updated_at', 'contacts', ['user_id', 'updated_at', 'id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_contacts_user_id_updated_at', table_name='contacts', postgresql_concurrently=True,
+                      if_exists=True)
+    op.drop_index('ix_contact_tombstones_user_id_deleted_at', table_name='contact_tombstones')
+    op.drop_table('contact_tombstones')
@@ -28,8 +28,25 @@ class Settings(BaseSettings):
     app_host: str = "0.0.0.0"
     app_port: int = 9000
     sqlalchemy_database_url: str | None = None
+    sqlalchemy_async_database_url: str | None = None
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
     token_secret_key: str = "some_SuPeR_key"
     token_algorithm: str = "HS256"
+    token_claims: bool = False
+    token_claims_seconds: int = 300
+    token_cache_size: int = 10000
+    password_workers: int = 2
+    password_queue: int = 64
+    login_fails_limit: int = 5
+    login_ip_fails_limit: int = 50
+    login_lockout_seconds: int = 30
+    login_lockout_max_seconds: int = 3600
+    unknown_email_ttl: int = 60
+    forwarded_allow_ips: str = "127.0.0.1"
     mail_username: str = "user@example.com"
     mail_password: str = ""
     mail_from: str = "user@example.com"
@@ -44,6 +61,10 @@ class Settings(BaseSettings):
     cloudinary_api_secret: str = "some_secret"
     reate_limiter_times: int = 2
     reate_limiter_seconds: int = 5
+    sync_tombstone_days: int = 30
+    sync_tombstone_purge_seconds: float = 3600
+    user_cache_size: int = 10000
+    user_cache_ttl: float = 60
     SPHINX_DIRECTORY: str = str(BASE_PATH_PROJECT.joinpath("docs", "_build", "html"))
     STATIC_DIRECTORY: str = str(BASE_PATH_PROJECT.joinpath("static"))
 
@@ -1,12 +1,14 @@
 import logging
 from fastapi import HTTPException, status
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.dialects import postgresql, sqlite
 import redis.asyncio as redis
 
 from src.conf.config import settings
+from src.database.pool import TimedAsyncAdaptedQueuePool, get_pool_status
 
 logger = logging.getLogger(f"{settings.app_name}.{__name__}")
 
@@ -15,23 +17,91 @@ SQLALCHEMY_DATABASE_URL = URI
 
 assert SQLALCHEMY_DATABASE_URL is not None, "SQLALCHEMY_DATABASE_URL UNDEFINED"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, echo=(settings.app_mode == "dev"))
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
 
 
-DBSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def get_async_database_url(url: str) -> str:
+    """Builds URL of async driver for the same database, i.e. postgresql+psycopg2 -> postgresql+asyncpg
+
+    :param url: Database URL of sync driver
+    :type url: str
+    :return: Database URL of async driver
+    :rtype: str
+    """
+    db_url = make_url(url)
+    driver = ASYNC_DRIVERS.get(db_url.get_backend_name())
+    if driver is None:
+        return url
+    return db_url.set(drivername=f"{db_url.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+def get_pool_options(url: str) -> dict:
+    """Options of connection pool from settings, SQLite keeps its own default pool
+
+    :param url: Database URL
+    :type url: str
+    :return: Keyword arguments for create_engine
+    :rtype: dict
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+SQLALCHEMY_ASYNC_DATABASE_URL = settings.sqlalchemy_async_database_url or get_async_database_url(
+    SQLALCHEMY_DATABASE_URL
+)
+
+async_pool_options = get_pool_options(SQLALCHEMY_ASYNC_DATABASE_URL)
+if async_pool_options:
+    async_pool_options["poolclass"] = TimedAsyncAdaptedQueuePool
+async_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL, echo=(settings.app_mode == "dev"), **async_pool_options
+)
+
+
+AsyncDBSession = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
 
 
 # Dependency
-def get_db():
-    db = DBSession()
-    try:
-        yield db
-    except SQLAlchemyError as err:
-        print("SQLAlchemyError:", err)
-        db.rollback()
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
-    finally:
-        db.close()
+async def get_async_db():
+    async with AsyncDBSession() as db:
+        try:
+            yield db
+        except SQLAlchemyError as err:
+            logger.error(f"SQLAlchemyError: {err}")
+            await db.rollback()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+
+
+def dialect_insert(db: AsyncSession, table):
+    """INSERT statement of dialect of session, it supports ON CONFLICT clause (PostgreSQL and SQLite)
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param table: Model or table to insert into
+    :type table: type[Base] | Table
+    :return: Insert statement
+    :rtype: Insert
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+
+def get_db_pool_status() -> dict:
+    """Live statistics of connection pool of async engine
+
+    :return: Pool statistics
+    :rtype: dict
+    """
+    return get_pool_status(async_engine.pool)
 
 
 def create_redis():
@@ -2,22 +2,48 @@ from datetime import date
 import enum
 
 from sqlalchemy import (
+    DDL,
     Boolean,
     Column,
     Date,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
+    SmallInteger,
     String,
     Text,
+    collate,
     func,
     Enum,
+    event,
 )
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.sql.functions import FunctionElement
 
 Base = declarative_base()
 
 
+class code_point_order(FunctionElement):
+    """String expression compared in code point order: COLLATE "C" on PostgreSQL,
+    SQLite compares by BINARY collation already, so the expression is left as is.
+    """
+
+    type = String()
+    inherit_cache = True
+
+
+@compiles(code_point_order)
+def compile_code_point_order(element, compiler, **kw):
+    return compiler.process(list(element.clauses)[0], **kw)
+
+
+@compiles(code_point_order, "postgresql")
+def compile_code_point_order_postgresql(element, compiler, **kw):
+    return compiler.process(collate(list(element.clauses)[0], "C"), **kw)
+
+
 class Role(enum.Enum):
     admin: str = "admin"  # type: ignore
     moderator: str = "moderator"  # type: ignore
@@ -45,9 +71,13 @@ class Contact(Base):
     id: int | Column[int] = Column(Integer, primary_key=True, index=True)
     first_name: str | Column[str] | None = Column(String)
     last_name: str | Column[str] | None = Column(String)
+    # normalized transliterated names for search, see src.services.translit.search_key
+    first_name_key: str | Column[str] | None = Column(String)
+    last_name_key: str | Column[str] | None = Column(String)
     email: str | Column[str] = Column(String)
     phone: str | Column[str] | None = Column(String)
     birthday: date | Column[date] | None = Column(Date)
+    birthday_doy: int | Column[int] | None = Column(SmallInteger)
     comments: str | Column[str] | None = Column(Text)
     favorite: bool | Column[bool] | None = Column(Boolean, default=False)
     created_at = Column(DateTime, default=func.now())
@@ -55,8 +85,111 @@ class Contact(Base):
     user_id: int | Column[int] = Column(
         Integer, ForeignKey("users.id"), nullable=False, default=1
     )
-    user = relationship("User", backref="contacts")
+    user = relationship("User", backref="contacts", lazy="joined")
     # , cascade="all, delete-orphan"
 
+    __table_args__ = (
+        Index("ix_contacts_user_id_id", user_id, id),
+        Index("ix_contacts_user_id_email", user_id, func.lower(email), unique=True),
+        Index("ix_contacts_user_id_favorite_id", user_id, favorite, id),
+        Index("ix_contacts_user_id_birthday_doy", user_id, birthday_doy),
+        # delta sync: changes of user since time
+        Index("ix_contacts_user_id_updated_at", user_id, updated_at, id),
+        # trigram indexes for ILIKE '%...%' search, only PostgreSQL (pg_trgm)
+        Index(
+            "ix_contacts_first_name_trgm",
+            first_name,
+            postgresql_using="gin",
+            postgresql_ops={"first_name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_contacts_last_name_trgm",
+            last_name,
+            postgresql_using="gin",
+            postgresql_ops={"last_name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_contacts_email_trgm",
+            email,
+            postgresql_using="gin",
+            postgresql_ops={"email": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_contacts_phone_trgm",
+            phone,
+            postgresql_using="gin",
+            postgresql_ops={"phone": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_contacts_first_name_key_trgm",
+            first_name_key,
+            postgresql_using="gin",
+            postgresql_ops={"first_name_key": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_contacts_last_name_key_trgm",
+            last_name_key,
+            postgresql_using="gin",
+            postgresql_ops={"last_name_key": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        # prefix indexes for autocomplete, range of prefix holds in code point order only,
+        # so indexes use code_point_order, as search.starts_with compares
+        Index("ix_contacts_user_id_email_prefix", user_id, code_point_order(func.lower(email))).ddl_if(
+            dialect="postgresql"
+        ),
+        Index("ix_contacts_user_id_first_name_key", user_id, code_point_order(first_name_key)),
+        Index("ix_contacts_user_id_last_name_key", user_id, code_point_order(last_name_key)),
+    )
+
     def __str__(self):
         return f"id: {self.id}, email: {self.email}, username: {self.first_name} {self.last_name}, birthday: {self.birthday}"
+
+
+class ContactTombstone(Base):
+    """Trace of removed contact for delta sync, kept for settings.sync_tombstone_days"""
+
+    __tablename__ = "contact_tombstones"
+
+    id: int | Column[int] = Column(Integer, primary_key=True)
+    contact_id: int | Column[int] = Column(Integer, nullable=False)
+    user_id: int | Column[int] = Column(Integer, ForeignKey("users.id"), nullable=False)
+    deleted_at = Column(DateTime, default=func.now(), nullable=False)
+
+    __table_args__ = (Index("ix_contact_tombstones_user_id_deleted_at", user_id, deleted_at),)
+
+
+# Search index of contacts for SQLite: FTS5 table with trigram tokenizer, synchronized by triggers
+CONTACTS_FTS_COLUMNS = ["first_name", "last_name", "email", "phone", "first_name_key", "last_name_key"]
+
+
+def contacts_fts_ddl(columns: list[str]) -> list[str]:
+    """DDL of FTS5 table contacts_fts over columns of contacts and triggers that keep it synchronized.
+    Migrations keep frozen copies of it, tests/test_unit_database_models.py checks that they create the same.
+
+    :param columns: Columns of contacts for search
+    :type columns: list[str]
+    :return: List of DDL statements
+    :rtype: list[str]
+    """
+    names = ", ".join(columns)
+    new_values = ", ".join(f"new.{name}" for name in columns)
+    old_values = ", ".join(f"old.{name}" for name in columns)
+    delete_old = f"INSERT INTO contacts_fts(contacts_fts, rowid, {names}) VALUES ('delete', old.id, {old_values});"
+    insert_new = f"INSERT INTO contacts_fts(rowid, {names}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+        f"{names}, content='contacts', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+CONTACTS_FTS_DDL = contacts_fts_ddl(CONTACTS_FTS_COLUMNS)
+
+event.listen(
+    Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+for ddl in CONTACTS_FTS_DDL:
+    event.listen(Contact.__table__, "after_create", DDL(ddl).execute_if(dialect="sqlite"))
+event.listen(Contact.__table__, "before_drop", DDL("DROP TABLE IF EXISTS contacts_fts").execute_if(dialect="sqlite"))
@@ -0,0 +1,84 @@
+import logging
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.conf.config import settings
+
+logger = logging.getLogger(f"{settings.app_name}.{__name__}")
+
+
+class PoolStats:
+    """Counters of connection checkouts from the pool, used for sizing the pool from data"""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.checkouts: int = 0
+        self.timeouts: int = 0
+        self.wait_total: float = 0.0
+        self.wait_max: float = 0.0
+
+    def add_checkout(self, wait: float) -> None:
+        """Register one checkout from the pool
+
+        :param wait: Seconds spent waiting for a connection
+        :type wait: float
+        """
+        self.checkouts += 1
+        self.wait_total += wait
+        if wait > self.wait_max:
+            self.wait_max = wait
+
+    def as_dict(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_total": round(self.wait_total, 6),
+            "wait_avg": round(self.wait_total / self.checkouts, 6) if self.checkouts else 0.0,
+            "wait_max": round(self.wait_max, 6),
+        }
+
+
+pool_stats = PoolStats()
+
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that measures how long every checkout waits for a connection"""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            pool_stats.timeouts += 1
+            logger.warning(f"Pool timeout: {self.status()}")
+            raise
+        pool_stats.add_checkout(time.perf_counter() - start)
+        return connection
+
+
+def get_pool_status(pool) -> dict:
+    """Current state of the pool with counters of checkouts
+
+    :param pool: Pool of engine
+    :type pool: Pool
+    :return: size, checked_in, checked_out, overflow and checkout wait-time numbers
+    :rtype: dict
+    """
+    result = {"pool": type(pool).__name__}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        result.update(
+            {
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+            }
+        )
+    result.update(pool_stats.as_dict())
+    return result
@@ -1,17 +1,21 @@
 import logging
-from sqlalchemy.orm import Session
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
 from src.conf.config import settings
 from src.database.models import User
+from src.shemas.users import UserPrincipal
 from src.services.auth.auth import auth_service
+from src.services.auth.auth_token import PasswordPoolBusy
 from src.repository import users as repository_users
+from src.repository import refresh_tokens as repository_refresh_tokens
 
 
 logger = logging.getLogger(f"{settings.app_name}.{__name__}")
 
 
-async def a_get_current_user(token: str | None, db: Session, cache = None) -> User | None:
+async def a_get_current_user(token: str | None, db: AsyncSession, cache = None) -> UserPrincipal | None:
     if not token:
         return None
     email = auth_service.decode_jwt(token)
@@ -22,37 +26,61 @@ async def a_get_current_user(token: str | None, db: Session, cache = None) -> Us
         user = await repository_users.get_user_by_email(email, db)
         if user:
             await repository_users.update_cache_user(user, cache)
+            return UserPrincipal.model_validate(user)
 
     return user
 
 
-async def signup(body, db: Session, cache = None):
+async def signup(body, db: AsyncSession, cache = None):
     try:
         user = await repository_users.get_user_by_name(body.username, db)
         if user is not None:
             return None
-        body.password = auth_service.get_password_hash(body.password)
+        body.password = await auth_service.a_get_password_hash(body.password)
         # if not body.email:
         #     body.email = body.username
         new_user = await repository_users.create_user(body, db, cache)
+    except PasswordPoolBusy:
+        raise
     except Exception:
         return None
     return new_user
 
 
-def login(user: User, password: str, db: Session):
+async def login(user: User, password: str, db: AsyncSession, cache = None):
     if user is None:
         return None
-    if not auth_service.verify_password(password, user.password):
+    if not await auth_service.a_verify_password(password, user.password):
         return None
     # Generate JWT
     expires_delta = 12*60*60 if settings.app_mode == 'dev' else None
-    access_token, expire_token = auth_service.create_access_token(data={"sub": user.email}, expires_delta=expires_delta)
+    access_token, expire_token = auth_service.create_access_token(
+        data={"sub": user.email}, expires_delta=expires_delta, user=user
+    )
     token = {"access_token": access_token, "token_type": "bearer", "expire_access_token": expire_token}
-    refresh_token, expire_token = auth_service.create_refresh_token(data={"sub": user.email})
+    refresh_token, expire_token = await new_refresh_token(user, db, cache)
     token.update({"refresh_token": refresh_token, "expire_refresh_token": expire_token})
     return token
 
 
-async def update_refresh_token(username: str, refresh_token: str, db: Session):
-    return await repository_users.update_by_name_refresh_token(username, refresh_token, db)
+async def new_refresh_token(user: User, db: AsyncSession, cache = None) -> tuple[str, datetime]:
+    """New family of refresh tokens in token store, without token store refresh token is saved to database
+
+    :param user: User
+    :type user: User
+    :param db: DB conenction
+    :type db: AsyncSession
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    :return: Refresh token and its expire
+    :rtype: tuple[str, datetime]
+    """
+    issued = await repository_refresh_tokens.issue(str(user.email), cache)
+    if issued is None:
+        refresh_token, expire_token = auth_service.create_refresh_token(data={"sub": user.email})
+        await repository_users.update_user_refresh_token(user, refresh_token, db)
+        return refresh_token, expire_token
+    if user.refresh_token is not None:
+        # token saved to database before token store is not valid anymore
+        await repository_users.update_user_refresh_token(user, None, db)
+    return issued
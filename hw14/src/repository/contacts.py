@@ -1,26 +1,178 @@
-from datetime import date, timedelta
+import asyncio
+import calendar
+from datetime import date, datetime, time, timedelta
 import logging
-from typing import List
-from sqlalchemy import select, text, extract, desc
+from typing import AsyncIterable, AsyncIterator, List
+from uuid import uuid4
+from sqlalchemy import case, func, or_, select, text, extract, desc
+from sqlalchemy import DateTime, delete as sql_delete, insert, update as sql_update
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, contains_eager
+from sqlalchemy.orm.attributes import set_committed_value
 
 
 from src.conf.config import settings
-from src.shemas.contact import ContactFavoriteModel, ContactModel
-from src.database.models import Contact
+from src.shemas.contact import (
+    ContactFavoriteModel,
+    ContactImportError,
+    ContactImportResponse,
+    ContactModel,
+    ContactPatchModel,
+)
+from src.database.db import dialect_insert
+from src.database.models import Contact, ContactTombstone, User
+from src.repository.search import contains, contains_any, relevance, starts_with
+from src.services.translit import search_key
 
 logger = logging.getLogger(f"{settings.app_name}.{__name__}")
 
+# Row numbers of duplicates and errors in report of import
+IMPORT_MAX_REPORTED = 1000
+# Rows fetched by one round trip of server-side cursor of export
+EXPORT_BATCH_SIZE = 1000
+# Seconds to keep version of contacts of user in cache
+CONTACTS_VERSION_TTL = 86400
+# Seconds to keep cached response of contacts
+CONTACTS_CACHE_TTL = 3600
+
+
+def contacts_version_key(user_id: int) -> str:
+    return f"contacts:version:{user_id}"
+
+
+async def get_contacts_version(user_id: int, cache=None) -> str | None:
+    """Version of contacts of a specific user from cache, it is changed by every write of contacts.
+    Missing version is created as new random one, so versions are never repeated.
+
+    :param user_id: The user ID.
+    :type user_id: int
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    :return: Version or None if cache is not available
+    :rtype: str | None
+    """
+    if not cache:
+        return None
+    key = contacts_version_key(user_id)
+    try:
+        version = await cache.get(key)
+        if version is None:
+            await cache.set(key, uuid4().hex, ex=CONTACTS_VERSION_TTL, nx=True)
+            version = await cache.get(key)
+        return version.decode() if isinstance(version, bytes) else version
+    except Exception as err:
+        logger.error(f"Error Redis read {err}")
+        return None
+
+
+async def bump_contacts_version(user_id: int, cache=None) -> None:
+    """Changes version of contacts of a specific user after write
+
+    :param user_id: The user ID.
+    :type user_id: int
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    """
+    if cache:
+        try:
+            await cache.set(contacts_version_key(user_id), uuid4().hex, ex=CONTACTS_VERSION_TTL)
+        except Exception as err:
+            logger.error(f"Error redis save, {err}")
+
+
+async def get_cache_contacts(user_id: int, key: str, cache=None) -> tuple[bytes, str | None] | None:
+    """Cached response of contacts of a specific user, key includes version of contacts
+
+    :param user_id: The user ID.
+    :type user_id: int
+    :param key: Key of response, i.e. ETag built from version of contacts and parameters of request
+    :type key: str
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    :return: JSON body and next cursor, or None if not cached
+    :rtype: tuple[bytes, str | None] | None
+    """
+    if not cache:
+        return None
+    try:
+        cached = await cache.hgetall(f"contacts:cache:{user_id}:{key}")
+        if not cached:
+            return None
+        next_cursor = cached.get(b"next")
+        return cached[b"body"], next_cursor.decode() if next_cursor else None
+    except Exception as err:
+        logger.error(f"Error Redis read {err}")
+        return None
+
+
+async def set_cache_contacts(
+    user_id: int, key: str, body: bytes, next_cursor: str | None, ttl: int, cache=None
+) -> None:
+    """Saves response of contacts of a specific user as hash with fields body and next (if any),
+    old versions are not read anymore and expire
+
+    :param user_id: The user ID.
+    :type user_id: int
+    :param key: Key of response, i.e. ETag built from version of contacts and parameters of request
+    :type key: str
+    :param body: JSON body
+    :type body: bytes
+    :param next_cursor: Cursor of the next page or None
+    :type next_cursor: str | None
+    :param ttl: Seconds to keep response
+    :type ttl: int
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    """
+    if cache:
+        try:
+            cache_key = f"contacts:cache:{user_id}:{key}"
+            mapping = {"body": body, "next": next_cursor} if next_cursor else {"body": body}
+            async with cache.pipeline(transaction=True) as pipe:
+                pipe.hset(cache_key, mapping=mapping)
+                pipe.expire(cache_key, ttl)
+                await pipe.execute()
+        except Exception as err:
+            logger.error(f"Error redis save, {err}")
+
+
+def paginate(query, skip: int | None, limit: int | None, after_id: int | None = None):
+    """Applies stable order by id and pagination to the query of contacts.
+    Keyset mode (after_id) is one index range scan for any depth of page, skip is kept for backward compatibility.
+
+    :param query: Select of contacts
+    :type query: Select
+    :param skip: The number of contacts to skip, ignored when after_id is set.
+    :type skip: int | None
+    :param limit: The maximum number of contacts to return.
+    :type limit: int | None
+    :param after_id: ID of the last contact of previous page, defaults to None.
+    :type after_id: int | None, optional
+    :return: Select with order and pagination
+    :rtype: Select
+    """
+    query = query.order_by(Contact.id)
+    if after_id is not None:
+        query = query.where(Contact.id > after_id)
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit)
+
 
 async def get_contacts(
-    db: Session, user_id: int, skip: int, limit: int, favorite: bool | None = None
+    db: AsyncSession,
+    user_id: int,
+    skip: int,
+    limit: int,
+    favorite: bool | None = None,
+    after_id: int | None = None,
 ) -> List[Contact]:
     """
     Retrieves a list of contacts for a specific user with specified pagination parameters.
 
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param user_id: The user_id to retrieve contacts for.
     :type user_id: int
     :param skip: The number of contacts to skip.
@@ -29,18 +181,44 @@ async def get_contacts(
     :type limit: int
     :param favorite: The favorite flag of contact, defaults to None.
     :type favorite: bool | None, optional
+    :param after_id: Keyset pagination, ID of the last contact of previous page, defaults to None.
+    :type after_id: int | None, optional
     :return: A list of contacts.
     :rtype: List[Contact]
     """
-    query = db.query(Contact).filter_by(user_id=user_id)
+    query = select(Contact).filter_by(user_id=user_id)
     if favorite is not None:
         query = query.filter_by(favorite=favorite)
-    contacts = query.offset(skip).limit(limit).all()
+    contacts = await db.execute(paginate(query, skip, limit, after_id))
     # contacts = db.query(Contact).filter_by(user_id = user_id).offset(skip).limit(limit).all()
-    return contacts
+    return contacts.scalars().all()  # type: ignore
+
+
+async def stream_contacts(user_id: int, db: AsyncSession, fields: List[str]) -> AsyncIterator[dict]:
+    """Streams all contacts of a specific user ordered by id, by server-side cursor (yield_per).
+    Only one batch of rows is kept in memory.
+
+    :param user_id: The user ID to retrieve contacts for.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :param fields: Columns of contact to read
+    :type fields: List[str]
+    :return: Contacts as dicts of fields
+    :rtype: AsyncIterator[dict]
+    """
+    query = (
+        select(*[getattr(Contact, name) for name in fields])
+        .where(Contact.user_id == user_id)
+        .order_by(Contact.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    result = await db.stream(query)
+    async for row in result.mappings():
+        yield dict(row)
 
 
-async def get_contact_by_id(contact_id: int, user_id: int, db: Session) -> Contact:
+async def get_contact_by_id(contact_id: int, user_id: int, db: AsyncSession) -> Contact:
     """Retrieves a single contact with the specified ID for a specific ID of user.
 
     :param contact_id: The ID of the contact to retrieve.
@@ -48,15 +226,15 @@ async def get_contact_by_id(contact_id: int, user_id: int, db: Session) -> Conta
     :param user_id: The user ID to retrieve the contact for.
     :type user_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: Specified contact for specific user.
     :rtype: Contact
     """
-    contact = db.query(Contact).filter_by(id=contact_id, user_id=user_id).first()
-    return contact
+    contact = await db.execute(select(Contact).filter_by(id=contact_id, user_id=user_id))
+    return contact.scalars().first()
 
 
-async def get_contact_by_email(email: str, user_id: int, db: Session) -> Contact:
+async def get_contact_by_email(email: str, user_id: int, db: AsyncSession) -> Contact:
     """Retrieves a single contact with the specified email for a specific ID of user.
 
     :param email: The email of the contact to retrieve.
@@ -64,36 +242,187 @@ async def get_contact_by_email(email: str, user_id: int, db: Session) -> Contact
     :param user_id: The user ID to retrieve the contact for.
     :type user_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: Specified contact for specific user.
     :rtype: Contact
     """
-    contact = db.query(Contact).filter_by(email=email, user_id=user_id).first()
-    return contact
+    contact = await db.execute(select(Contact).filter_by(email=email, user_id=user_id))
+    return contact.scalars().first()
+
+
+def contact_values(body: ContactModel, user_id: int) -> dict:
+    """Values of columns of new contact, with computed columns for search
+
+    :param body: The data for the concact.
+    :type body: ContactModel
+    :param user_id: The user ID of owner.
+    :type user_id: int
+    :return: Values of columns
+    :rtype: dict
+    """
+    values = body.model_dump()
+    values.update(
+        user_id=user_id,
+        birthday_doy=birthday_doy(body.birthday),
+        first_name_key=search_key(body.first_name),
+        last_name_key=search_key(body.last_name),
+    )
+    return values
 
 
-async def create(body: ContactModel, user_id: int, db: Session) -> Contact:
+async def create(body: ContactModel, user_id: int, db: AsyncSession, cache=None) -> Contact | None:
     """Creates a new concact for a specific user.
+    One statement INSERT ... ON CONFLICT DO NOTHING RETURNING, the unique index (user_id, lower(email))
+    guards duplicates also for concurrent requests.
 
     :param body: The data for the concact to create.
     :type body: ContactModel
     :param user_id: The user ID to create the note for.
     :type user_id: int
     :param db: The database session.
-    :type db: Session
-    :return: The newly created contact.
-    :rtype: Contact
+    :type db: AsyncSession
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    :return: The newly created contact, or None if contact with the same email exists.
+    :rtype: Contact | None
     """
-    contact = Contact(**body.model_dump())
-    contact.user_id = user_id
-    db.add(contact)
-    db.commit()
-    db.refresh(contact)
-    return contact
+    stmt = (
+        dialect_insert(db, Contact)
+        .values(**contact_values(body, user_id))
+        .on_conflict_do_nothing(index_elements=[Contact.user_id, func.lower(Contact.email)])
+    )
+    contacts = await returning_with_owner(stmt, user_id, db)
+    await db.commit()
+    if contacts:
+        await bump_contacts_version(user_id, cache)
+    return contacts[0] if contacts else None
+
+
+async def insert_many(bodies: List[ContactModel], user_id: int, db: AsyncSession, cache=None) -> set[str]:
+    """Inserts contacts by multi-row INSERT ... ON CONFLICT DO NOTHING RETURNING email, and commits.
+    Contacts with email that exists already are skipped.
+
+    :param bodies: The data for the contacts to create.
+    :type bodies: List[ContactModel]
+    :param user_id: The user ID to create the contacts for.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    :return: Emails of inserted contacts, lower case
+    :rtype: set[str]
+    """
+    if not bodies:
+        return set()
+    table = Contact.__table__
+    stmt = (
+        dialect_insert(db, table)
+        .on_conflict_do_nothing(index_elements=[table.c.user_id, func.lower(table.c.email)])
+        .returning(table.c.email)
+    )
+    result = await db.execute(stmt, [contact_values(body, user_id) for body in bodies])
+    emails = {email.lower() for email in result.scalars()}
+    await db.commit()
+    if emails:
+        await bump_contacts_version(user_id, cache)
+    return emails
+
+
+async def import_contacts(chunks: AsyncIterable, user_id: int, db: AsyncSession, cache=None) -> ContactImportResponse:
+    """Imports contacts chunk by chunk, see src.services.contacts_import.iter_chunks.
+    Each chunk is one INSERT and one COMMIT, so memory and transaction size do not grow with the file.
+
+    :param chunks: Valid contacts and errors with row numbers, by chunks
+    :type chunks: AsyncIterable[tuple[list[tuple[int, ContactModel]], list[tuple[int, str]]]]
+    :param user_id: The user ID to import the contacts for.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    :return: Report of import, row numbers of duplicates and errors are limited by IMPORT_MAX_REPORTED
+    :rtype: ContactImportResponse
+    """
+    report = ContactImportResponse()
+    async for contacts, errors in chunks:
+        unique, duplicate_rows = {}, []
+        for row, body in contacts:
+            email = body.email.lower()
+            if email in unique:
+                duplicate_rows.append(row)
+            else:
+                unique[email] = (row, body)
+        inserted = await insert_many([body for _, body in unique.values()], user_id, db, cache)
+        duplicate_rows += [row for email, (row, _) in unique.items() if email not in inserted]
+        report.total += len(contacts) + len(errors)
+        report.inserted += len(inserted)
+        report.duplicates += len(duplicate_rows)
+        report.errors += len(errors)
+        free = IMPORT_MAX_REPORTED - len(report.duplicate_rows)
+        report.duplicate_rows += sorted(duplicate_rows)[:free]
+        free = IMPORT_MAX_REPORTED - len(report.error_rows)
+        report.error_rows += [ContactImportError(row=row, error=error) for row, error in errors[:free]]
+    logger.info(f"import_contacts {user_id=}: {report.inserted} of {report.total} inserted")
+    return report
+
+
+async def returning_with_owner(stmt, user_id: int, db: AsyncSession) -> List[Contact]:
+    """Executes INSERT/UPDATE of contacts with RETURNING and loads owner of returned contacts.
+    PostgreSQL does it by one statement: the data-modifying statement is WITH query joined to users.
+    SQLite does not allow INSERT/UPDATE in WITH, owner is read by primary key in the same transaction.
+
+    :param stmt: INSERT or UPDATE of contacts of one user, without RETURNING
+    :type stmt: Insert | Update
+    :param user_id: The user ID of owner.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: Contacts with relationship user set, not committed
+    :rtype: List[Contact]
+    """
+    postgresql = db.get_bind().dialect.name == "postgresql"
+    if postgresql:
+        written = aliased(Contact, stmt.returning(*Contact.__table__.c).cte("written"))
+        query = select(written).join(written.user).options(contains_eager(written.user))
+    else:
+        query = select(Contact).from_statement(stmt.returning(Contact))
+    # contact may be in identity map already, RETURNING row refreshes it (e.g. updated_at)
+    result = await db.execute(query.execution_options(populate_existing=True))
+    contacts = list(result.scalars().unique().all())
+    if contacts and not postgresql:
+        owner = await db.get(User, user_id)
+        for contact in contacts:
+            set_committed_value(contact, "user", owner)
+    return contacts
+
+
+async def update_returning(contact_id: int, user_id: int, db: AsyncSession, cache=None, **values) -> Contact | None:
+    """Updates contact by one statement UPDATE ... WHERE id AND user_id RETURNING, and commits.
+
+    :param contact_id: The ID of the contact to update.
+    :type contact_id: int
+    :param user_id: The user ID to update the contact for.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    :param values: New values of columns
+    :type values: dict
+    :return: The updated contact, or None if it does not exist.
+    :rtype: Contact | None
+    """
+    stmt = sql_update(Contact).where(Contact.id == contact_id, Contact.user_id == user_id).values(**values)
+    contacts = await returning_with_owner(stmt, user_id, db)
+    await db.commit()
+    if contacts:
+        await bump_contacts_version(user_id, cache)
+    return contacts[0] if contacts else None
 
 
-async def update(contact_id: int, body: ContactModel, user_id: int, db: Session) -> Contact | None:
-    """Updates a single contact with the specified ID for a specific user ID.
+async def update(contact_id: int, body: ContactModel, user_id: int, db: AsyncSession, cache=None) -> Contact | None:
+    """Updates a single contact with the specified ID for a specific user ID, by one UPDATE ... RETURNING.
 
     :param contact_id: The ID of the contact to update.
     :type contact_id: int
@@ -102,24 +431,27 @@ async def update(contact_id: int, body: ContactModel, user_id: int, db: Session)
     :param user_id: The user ID to update the contact for.
     :type user_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
     :return: The updated contact, or None if it does not exist.
     :rtype: Contact | None
     """
-    contact = await get_contact_by_id(contact_id, user_id, db)
-    if contact:
-        contact.first_name = body.first_name
-        contact.last_name = body.last_name
-        contact.email = body.email
-        contact.phone = body.phone
-        contact.birthday = body.birthday
-        contact.comments = body.comments
-        contact.favorite = body.favorite
-        db.commit()
-    return contact
+    return await update_returning(
+        contact_id,
+        user_id,
+        db,
+        cache,
+        **body.model_dump(),
+        birthday_doy=birthday_doy(body.birthday),
+        first_name_key=search_key(body.first_name),
+        last_name_key=search_key(body.last_name),
+    )
 
 
-async def favorite_update(contact_id: int, body: ContactFavoriteModel, user_id: int, db: Session) -> Contact | None:
+async def favorite_update(
+    contact_id: int, body: ContactFavoriteModel, user_id: int, db: AsyncSession, cache=None
+) -> Contact | None:
     """Updates favorute status (i.e. "true" or "false") of contact with the specified ID for a specific user ID.
 
     :param contact_id: The ID of the contact to update.
@@ -129,37 +461,236 @@ async def favorite_update(contact_id: int, body: ContactFavoriteModel, user_id:
     :param user_id: The user ID to update the contact for.
     :type user_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
     :return: The updated contact, or None if it does not exist.
     :rtype: Contact | None
     """
-    contact = await get_contact_by_id(contact_id, user_id, db)
-    if contact:
-        contact.favorite = body.favorite
-        db.commit()
-    return contact
+    return await update_returning(contact_id, user_id, db, cache, favorite=body.favorite)
 
 
-async def delete(contact_id: int, user_id: int, db: Session) -> Contact | None:
-    """Removes a single contact with the specified ID for a specific user ID.
+async def delete(contact_id: int, user_id: int, db: AsyncSession, cache=None) -> Contact | None:
+    """Removes a single contact with the specified ID for a specific user ID, by one DELETE ... RETURNING.
 
     :param contact_id: The ID of the contact to remove.
     :type contact_id: int
     :param user_id: The user ID to remove the contact for.
     :type user_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
     :return: The removed contact, or None if it does not exist.
     :rtype: Contact | None
     """
-    contact = await get_contact_by_id(contact_id, user_id, db)
+    stmt = sql_delete(Contact).where(Contact.id == contact_id, Contact.user_id == user_id).returning(Contact)
+    result = await db.execute(stmt)
+    contact = result.scalars().first()
+    if contact:
+        await add_tombstones([contact_id], user_id, db)
+    await db.commit()
     if contact:
-        db.delete(contact)
-        db.commit()
+        await bump_contacts_version(user_id, cache)
     return contact
 
 
-async def search_contacts(param: dict, user_id: int, db: Session) -> List[Contact]:
+async def get_contacts_by_ids(ids: List[int], user_id: int, db: AsyncSession) -> List[Contact]:
+    """Retrieves contacts with the specified IDs for a specific user, by one query.
+
+    :param ids: IDs of contacts.
+    :type ids: List[int]
+    :param user_id: The user ID to retrieve contacts for.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: Found contacts, ordered by id.
+    :rtype: List[Contact]
+    """
+    query = select(Contact).where(Contact.user_id == user_id, Contact.id.in_(ids)).order_by(Contact.id)
+    contacts = await db.execute(query)
+    return contacts.scalars().unique().all()
+
+
+def patch_values(patch: dict) -> dict:
+    """Values of columns for partial update, with computed columns for search of changed fields
+
+    :param patch: Changed fields of contact
+    :type patch: dict
+    :return: Values of columns
+    :rtype: dict
+    """
+    values = dict(patch)
+    if "first_name" in patch:
+        values["first_name_key"] = search_key(patch["first_name"])
+    if "last_name" in patch:
+        values["last_name_key"] = search_key(patch["last_name"])
+    if "birthday" in patch:
+        values["birthday_doy"] = birthday_doy(patch["birthday"])
+    return values
+
+
+async def update_many(patches: List[ContactPatchModel], user_id: int, db: AsyncSession, cache=None) -> List[Contact]:
+    """Updates contacts of a specific user by patches in one transaction.
+    Patches with the same changes are grouped to one UPDATE ... WHERE id IN (...) RETURNING,
+    so i.e. marking many contacts as favorite is one statement.
+
+    :param patches: ID and changed fields of each contact.
+    :type patches: List[ContactPatchModel]
+    :param user_id: The user ID to update the contacts for.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    :return: Updated contacts, missing ones are absent.
+    :rtype: List[Contact]
+    """
+    groups = {}
+    for patch in patches:
+        changes = patch.model_dump(exclude_unset=True, exclude={"id"})
+        groups.setdefault(tuple(sorted(changes.items())), []).append(patch.id)
+    contacts = []
+    for changes, ids in groups.items():
+        if changes:
+            stmt = (
+                sql_update(Contact)
+                .where(Contact.user_id == user_id, Contact.id.in_(ids))
+                .values(**patch_values(dict(changes)))
+            )
+            contacts.extend(await returning_with_owner(stmt, user_id, db))
+        else:
+            # owner is loaded by joined relationship
+            result = await db.execute(select(Contact).where(Contact.user_id == user_id, Contact.id.in_(ids)))
+            contacts.extend(result.scalars().unique().all())
+    await db.commit()
+    if contacts:
+        await bump_contacts_version(user_id, cache)
+    return contacts
+
+
+async def delete_many(ids: List[int], user_id: int, db: AsyncSession, cache=None) -> List[int]:
+    """Removes contacts with the specified IDs for a specific user, by one DELETE ... RETURNING id.
+
+    :param ids: IDs of contacts.
+    :type ids: List[int]
+    :param user_id: The user ID to remove contacts for.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    :return: IDs of removed contacts.
+    :rtype: List[int]
+    """
+    stmt = sql_delete(Contact).where(Contact.user_id == user_id, Contact.id.in_(ids)).returning(Contact.id)
+    result = await db.execute(stmt)
+    deleted = list(result.scalars().all())
+    await add_tombstones(deleted, user_id, db)
+    await db.commit()
+    if deleted:
+        await bump_contacts_version(user_id, cache)
+    return deleted
+
+
+async def add_tombstones(ids: List[int], user_id: int, db: AsyncSession) -> None:
+    """Records removed contacts for delta sync, in the transaction of DELETE.
+
+    :param ids: IDs of removed contacts.
+    :type ids: List[int]
+    :param user_id: The user ID of removed contacts.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    """
+    if ids:
+        await db.execute(insert(ContactTombstone), [{"contact_id": id_, "user_id": user_id} for id_ in ids])
+
+
+async def get_changes(
+    user_id: int, since: datetime | None, until: datetime, after_id: int | None, limit: int, db: AsyncSession
+) -> tuple[List[Contact], List[int]]:
+    """Changes of contacts of a specific user in time window [since, until), by index (user_id, updated_at, id).
+    Changed contacts are paginated by id, removed ones are returned with the first page only.
+
+    :param user_id: The user ID to retrieve changes for.
+    :type user_id: int
+    :param since: Start of window, None for all contacts (no removed)
+    :type since: datetime | None
+    :param until: End of window, excluded
+    :type until: datetime
+    :param after_id: ID of the last contact of previous page, None for the first page
+    :type after_id: int | None
+    :param limit: The maximum number of changed contacts to return.
+    :type limit: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: Changed contacts, IDs of removed contacts
+    :rtype: tuple[List[Contact], List[int]]
+    """
+    query = select(Contact).where(Contact.user_id == user_id, Contact.updated_at < until)
+    if since:
+        query = query.where(Contact.updated_at >= since)
+    contacts = (await db.execute(paginate(query, None, limit, after_id))).scalars().unique().all()
+    deleted = []
+    if since and not after_id:
+        query = select(ContactTombstone.contact_id).where(
+            ContactTombstone.user_id == user_id,
+            ContactTombstone.deleted_at >= since,
+            ContactTombstone.deleted_at < until,
+        )
+        deleted = list(dict.fromkeys((await db.execute(query)).scalars().all()))
+    return contacts, deleted
+
+
+async def purge_tombstones(before: datetime, db: AsyncSession) -> None:
+    """Removes tombstones of all users older than retention time.
+
+    :param before: Tombstones removed before this time are purged.
+    :type before: datetime
+    :param db: The database session.
+    :type db: AsyncSession
+    """
+    await db.execute(sql_delete(ContactTombstone).where(ContactTombstone.deleted_at < before))
+    await db.commit()
+
+
+async def purge_tombstones_periodically(session_factory, interval_seconds: float) -> None:
+    """Removes tombstones older than settings.sync_tombstone_days, runs until cancelled
+
+    Delta sync rejects tokens older than the same retention, so purge may lag behind without losing deletions.
+
+    :param session_factory: Factory of database sessions
+    :type session_factory: async_sessionmaker[AsyncSession]
+    :param interval_seconds: Pause between purges
+    :type interval_seconds: float
+    """
+    while True:
+        try:
+            async with session_factory() as db:
+                retention = await db_now(db) - timedelta(days=settings.sync_tombstone_days)
+                await purge_tombstones(retention, db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            logger.error(f"Error purge tombstones {err}")
+        await asyncio.sleep(interval_seconds)
+
+
+async def db_now(db: AsyncSession) -> datetime:
+    """Current time of database server, the same clock and time zone as updated_at of contacts.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: Current time without time zone
+    :rtype: datetime
+    """
+    now = func.now() if db.get_bind().dialect.name == "sqlite" else func.localtimestamp(type_=DateTime)
+    result = await db.execute(select(now))
+    return result.scalar()
+
+
+async def search_contacts(param: dict, user_id: int, db: AsyncSession) -> List[Contact]:
     """Retrieves a list of contacts for a specific user with specified search and pagination parameters.
 
     :param param: This is dictionary of parameters for search contacts. Dictionary keys:
@@ -167,29 +698,73 @@ async def search_contacts(param: dict, user_id: int, db: Session) -> List[Contac
         - first_name - (optional) First name of contact
         - last_name - (optional) Last name of contact
         - email - (optional) email of contact
+        - q - (optional) Words to search in first name, last name, email and phone, results are ordered by relevance
         - skip - The number of contacts to skip
         - limit - The maximum number of contacts to return
+        - after_id - (optional) ID of the last contact of previous page, keyset pagination, not used with q
 
-    :type param: dict{"first_name": str, "last_name": str, "email": str, "skip": int, "limit": int}
+    :type param: dict{"first_name": str, "last_name": str, "email": str, "q": str, "skip": int, "limit": int,
+        "after_id": int}
     :param user_id: The user ID to search the contact for.
     :type user_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A list of contacts.
     :rtype: List[Contact]
     """
-    query = db.query(Contact).filter_by(user_id=user_id)
+    query = select(Contact).filter_by(user_id=user_id)
     first_name = param.get("first_name")
     last_name = param.get("last_name")
     email = param.get("email")
     if first_name:
-        query = query.filter(Contact.first_name.ilike(f"%{first_name}%"))
+        query = query.filter(contains(db, "first_name", first_name))
     if last_name:
-        query = query.filter(Contact.last_name.ilike(f"%{last_name}%"))
+        query = query.filter(contains(db, "last_name", last_name))
     if email:
-        query = query.filter(Contact.email.ilike(f"%{email}%"))
-    contacts = query.offset(param.get("skip")).limit(param.get("limit"))
-    return contacts
+        query = query.filter(contains(db, "email", email))
+    terms = (param.get("q") or "").split()
+    if terms:
+        for term in terms:
+            query = query.filter(contains_any(db, term))
+        query = query.order_by(relevance(terms).desc(), Contact.id)
+        query = query.offset(param.get("skip")).limit(param.get("limit"))
+    else:
+        query = paginate(query, param.get("skip"), param.get("limit"), param.get("after_id"))
+    contacts = await db.execute(query)
+    return contacts.scalars().all()  # type: ignore
+
+
+async def autocomplete(prefix: str, user_id: int, limit: int, db: AsyncSession) -> List[dict]:
+    """Retrieves ID and display name of contacts whose first name, last name or email starts with prefix.
+    Names are compared by search keys, so Cyrillic and Latin spelling are found both.
+    Only the needed columns are read, by prefix indexes.
+
+    :param prefix: Typed prefix
+    :type prefix: str
+    :param user_id: The user ID to search the contact for.
+    :type user_id: int
+    :param limit: The maximum number of contacts to return
+    :type limit: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: A list of dictionaries {"id": int, "name": str}
+    :rtype: List[dict]
+    """
+    conditions = [starts_with(func.lower(Contact.email), prefix.lower())]
+    key = search_key(prefix)
+    if key:
+        conditions += [starts_with(Contact.first_name_key, key), starts_with(Contact.last_name_key, key)]
+    query = (
+        select(Contact.id, Contact.first_name, Contact.last_name, Contact.email)
+        .where(Contact.user_id == user_id, or_(*conditions))
+        .order_by(Contact.first_name, Contact.last_name, Contact.id)
+        .limit(limit)
+    )
+    rows = await db.execute(query)
+    return [
+        {"id": row.id, "name": " ".join(filter(None, (row.first_name, row.last_name))) or row.email}
+        for row in rows
+    ]
 
 
 def date_replace_year(d: date, year: int) -> date:
@@ -213,10 +788,56 @@ def date_replace_year(d: date, year: int) -> date:
     return d
 
 
-# SELECT * FROM public.contacts where user_id = 6 and EXTRACT(MONTH FROM contacts.birthday) IN (1,2,3);
+def birthday_doy(d: date | None) -> int | None:
+    """Day of the year of birthday in leap year calendar, so it is the same for any year of birth:
+    01.01 -> 1, 28.02 -> 59, 29.02 -> 60, 01.03 -> 61, 31.12 -> 366
+
+    :param d: Birthday
+    :type d: date | None
+    :return: Day of the year or None if birthday is unknown
+    :rtype: int | None
+    """
+    if d is None:
+        return None
+    return date(2000, d.month, d.day).timetuple().tm_yday
+
+
+def birthday_doy_ranges(date_now: date, days: int) -> list[tuple[int, int]]:
+    """Ranges of birthday_doy for birthdays of the next few days, two ranges when window passes 31.12.
+    Birthday 29.02 is celebrated on 01.03 in not leap year, the same as date_replace_year does.
+
+    :param date_now: First date of window
+    :type date_now: date
+    :param days: The number of days after date_now in window
+    :type days: int
+    :return: List of ranges (first, last) of birthday_doy
+    :rtype: list[tuple[int, int]]
+    """
+    first = birthday_doy(date_now)
+    if date_now.month == 3 and date_now.day == 1 and not calendar.isleap(date_now.year):
+        first = birthday_doy(date(2000, 2, 29))
+    last = birthday_doy(date_now + timedelta(days=days))
+    if first <= last:  # type: ignore
+        return [(first, last)]  # type: ignore
+    return [(first, 366), (1, last)]  # type: ignore
+
+
+# SELECT * FROM public.contacts where user_id = 6
+# and (birthday_doy BETWEEN 362 AND 366 OR birthday_doy BETWEEN 1 AND 5)
+# ORDER BY CASE WHEN birthday_doy >= 362 THEN 0 ELSE 1 END, birthday_doy, id;
 
 
-async def search_birthday(param: dict, user_id: int, db: Session) -> List[Contact]:
+def seconds_to_midnight() -> int:
+    """Seconds until the next local midnight, when result of birthday search changes
+
+    :return: Seconds, at least 1
+    :rtype: int
+    """
+    midnight = datetime.combine(date.today() + timedelta(days=1), time.min)
+    return max(1, int((midnight - datetime.now()).total_seconds()))
+
+
+async def search_birthday(param: dict, user_id: int, db: AsyncSession) -> List[Contact]:
     """
     Retrieves a list of contacts for a specific user with the specified birthday search parameters
     for the next few days and pagination parameters.
@@ -231,48 +852,34 @@ async def search_birthday(param: dict, user_id: int, db: Session) -> List[Contac
     :param user_id: The user ID to search the contact for.
     :type user_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A list of contacts.
     :rtype: List[Contact]
     """
     days: int = int(param.get("days", 7)) + 1
-    # days = 67
-    date_now = param.get("fixed_now",  date.today())
-    # date_now = date.today()
-    # date_now = date(2023, 2, 25)
-    date_now_year = date_now.year
-    date_now_month = date_now.month
-    date_last_month = (date_now + timedelta(days=days + 1)).month
-    # logger.debug(f"{date_now_month=}, ${date_last_month=} {date_now + timedelta(days=days+1)}")
-    list_month = [date_now_month]
-    while date_last_month != date_now_month:
-        # logger.debug(f"{date_last_month=}, {date_now_month=}")
-        list_month.append(date_last_month)
-        date_last_month = 12 if date_last_month <= 1 else date_last_month - 1
-
-    contacts = []
-    # list_month = (date_now_month,) if date_now_month == date_last_month else (date_now_month, date_last_month)
-    # query = db.query(Contact).filter_by(user_id=user_id).filter_by(birthday__month=12)
-    # query = db.query(Contact).filter_by(user_id=user_id).filter(text(f"EXTRACT(MONTH FROM contacts.birthday) IN ({date_now_month},{date_now_month+1})"))
-    # query = db.query(Contact).filter(Contact.user_id == user_id, extract("MONTH", Contact.birthday).in_(list_month)) # type: ignore
-    # query(Contact).filter(Contact.user_id == user_id, extract("MONTH", Contact.birthday).in_(list_month)) # type: ignore
+    date_now = param.get("fixed_now", date.today())
+    ranges = birthday_doy_ranges(date_now, days)
+    # 29.02 is celebrated together with 01.03 in not leap year
+    date_march = date(date_now.year, 3, 1)
+    if date_march < date_now:
+        date_march = date(date_now.year + 1, 3, 1)
+    days_order = Contact.birthday_doy
+    if not calendar.isleap(date_march.year):
+        march_doy = birthday_doy(date_march)
+        days_order = case(
+            (Contact.birthday_doy == march_doy - 1, march_doy), else_=Contact.birthday_doy  # type: ignore
+        )
+    if len(ranges) > 1:
+        order_by = (case((Contact.birthday_doy >= ranges[0][0], 0), else_=1), days_order, Contact.id)
+    else:
+        order_by = (days_order, Contact.id)
     # v2.0 select style
     query = (
         select(Contact)
-        .where(Contact.user_id == user_id, extract("MONTH", Contact.birthday).in_(list_month))  # type: ignore
-        .order_by(desc(Contact.birthday))  # type: ignore
+        .where(Contact.user_id == user_id, or_(*[Contact.birthday_doy.between(first, last) for first, last in ranges]))
+        .order_by(*order_by)
+        .offset(int(param.get("skip", 0)))
+        .limit(int(param.get("limit", 0)))
     )
-    contacts_q = db.execute(query).scalars()
-    for contact in contacts_q:
-        birthday: date | None = contact.birthday  # type: ignore
-        if birthday is not None:
-            bd = date_replace_year(birthday, date_now_year)
-            if bd < date_now:
-                bd = date_replace_year(birthday, date_now_year + 1)
-            diff_bd = bd - date_now
-            if diff_bd.days <= days:
-                logger.debug(f"f{str(contact)=}")
-                contacts.append(contact)
-    skip = int(param.get("skip", 0))
-    limit = int(param.get("limit", 0))
-    return contacts[skip : skip + limit]
+    contacts = await db.execute(query)
+    return contacts.scalars().all()  # type: ignore
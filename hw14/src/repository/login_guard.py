@@ -0,0 +1,108 @@
+import logging
+import math
+import time
+
+from src.conf.config import settings
+
+
+logger = logging.getLogger(f"{settings.app_name}.{__name__}")
+
+
+def fails_key(kind: str, value: str) -> str:
+    return f"login:fails:{kind}:{value}"
+
+
+def lock_key(kind: str, value: str) -> str:
+    return f"login:lock:{kind}:{value}"
+
+
+def lockout_seconds(fails: int, limit: int) -> int:
+    """Duration of lockout, it is doubled by every failed login over the limit
+
+    :param fails: Number of failed logins in a row
+    :type fails: int
+    :param limit: Number of failed logins without lockout
+    :type limit: int
+    :return: Seconds of lockout, 0 if not locked
+    :rtype: int
+    """
+    if fails < limit:
+        return 0
+    return min(settings.login_lockout_seconds * 2 ** min(fails - limit, 32), settings.login_lockout_max_seconds)
+
+
+async def get_lockout(email: str, ip: str, cache=None) -> int:
+    """Seconds until account and IP are unlocked, login is rejected before database and password check
+
+    :param email: Login email
+    :type email: str
+    :param ip: IP address of client
+    :type ip: str
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    :return: Seconds of lockout, 0 if not locked
+    :rtype: int
+    """
+    if not cache:
+        return 0
+    try:
+        values = await cache.mget(lock_key("account", email.lower()), lock_key("ip", ip))
+    except Exception as err:
+        logger.error(f"Error Redis read {err}")
+        return 0
+    now = time.time()
+    return max([math.ceil(float(value) - now) for value in values if value] + [0])
+
+
+async def register_failure(email: str, ip: str, cache=None) -> int:
+    """Counts failed login of account and of IP, locks them when limits are exceeded
+
+    :param email: Login email
+    :type email: str
+    :param ip: IP address of client
+    :type ip: str
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    :return: Seconds of lockout, 0 if not locked
+    :rtype: int
+    """
+    if not cache:
+        return 0
+    email = email.lower()
+    window = settings.login_lockout_max_seconds
+    try:
+        async with cache.pipeline(transaction=False) as pipe:
+            pipe.incr(fails_key("account", email))
+            pipe.expire(fails_key("account", email), window)
+            pipe.incr(fails_key("ip", ip))
+            pipe.expire(fails_key("ip", ip), window)
+            account_fails, _, ip_fails, _ = await pipe.execute()
+        lockout = 0
+        for kind, value, fails, limit in (
+            ("account", email, account_fails, settings.login_fails_limit),
+            ("ip", ip, ip_fails, settings.login_ip_fails_limit),
+        ):
+            seconds = lockout_seconds(fails, limit)
+            if seconds:
+                await cache.set(lock_key(kind, value), time.time() + seconds, ex=seconds)
+                logger.warning(f"Login locked for {seconds}s {kind} {value}")
+                lockout = max(lockout, seconds)
+        return lockout
+    except Exception as err:
+        logger.error(f"Error redis save, {err}")
+        return 0
+
+
+async def reset_failures(email: str, cache=None) -> None:
+    """Resets counter of failed logins of account after successful login
+
+    :param email: Login email
+    :type email: str
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    """
+    if cache:
+        try:
+            await cache.delete(fails_key("account", email.lower()))
+        except Exception as err:
+            logger.error(f"Error redis save, {err}")
@@ -0,0 +1,86 @@
+import logging
+from datetime import datetime, timezone
+from typing import Any
+from uuid import uuid4
+
+from src.conf.config import settings
+from src.services.auth.auth import auth_service
+
+
+logger = logging.getLogger(f"{settings.app_name}.{__name__}")
+
+# Every login starts a family of refresh tokens, only the last token of the family is valid.
+# Value of key is jti of the last token, key expires with the last token.
+# Result: 1 rotated, 0 reuse of old token (family is revoked), -1 unknown or expired family
+ROTATE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if not current then
+    return -1
+end
+if current ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+def refresh_family_key(family: str) -> str:
+    return f"refresh:family:{family}"
+
+
+def token_ttl(expire: datetime) -> int:
+    return max(int((expire - datetime.now(timezone.utc)).total_seconds()), 1)
+
+
+async def issue(email: str, cache=None) -> tuple[str, datetime] | None:
+    """Starts new family of refresh tokens at login, so user may have several sessions
+
+    :param email: User's email
+    :type email: str
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    :return: Refresh token and its expire or None if token store is not available
+    :rtype: tuple[str, datetime] | None
+    """
+    if not cache:
+        return None
+    family, jti = uuid4().hex, uuid4().hex
+    refresh_token, expire = auth_service.create_refresh_token(data={"sub": email, "fam": family, "jti": jti})
+    try:
+        await cache.set(refresh_family_key(family), jti, ex=token_ttl(expire))
+    except Exception as err:
+        logger.error(f"Error redis save, {err}")
+        return None
+    return refresh_token, expire
+
+
+async def rotate(claims: dict[str, Any], cache=None) -> tuple[str, datetime] | None:
+    """Replaces refresh token of family by the new one atomically.
+    Reuse of replaced token revokes the family, because the token may be stolen.
+
+    :param claims: Verified payload of refresh token with fam and jti
+    :type claims: dict[str, Any]
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    :return: New refresh token and its expire or None if token is not valid
+    :rtype: tuple[str, datetime] | None
+    """
+    if not cache:
+        return None
+    family, jti = claims["fam"], uuid4().hex
+    refresh_token, expire = auth_service.create_refresh_token(data={"sub": claims["sub"], "fam": family, "jti": jti})
+    try:
+        result = await cache.eval(
+            ROTATE_SCRIPT, 1, refresh_family_key(family), claims["jti"], jti, token_ttl(expire)
+        )
+    except Exception as err:
+        logger.error(f"Error redis save, {err}")
+        return None
+    if result == 0:
+        logger.warning(f"Reuse of refresh token, family is revoked {claims['sub']}")
+    if result != 1:
+        return None
+    return refresh_token, expire
+
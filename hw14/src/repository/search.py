@@ -0,0 +1,142 @@
+import logging
+import sys
+
+from sqlalchemy import case, column, func, literal, or_, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.models import Contact, code_point_order
+from src.services.translit import search_key
+
+logger = logging.getLogger(f"{settings.app_name}.{__name__}")
+
+# Shortest value that trigram index can serve
+TRIGRAM = 3
+
+# Code points of UTF-16 surrogates
+SURROGATES = (0xD800, 0xDFFF)
+
+# Fields of contact for search by q
+SEARCH_FIELDS = ("first_name", "last_name", "email", "phone")
+# Fields of normalized transliterated names, compared with search_key of value
+KEY_FIELDS = ("first_name_key", "last_name_key")
+
+contacts_fts = table(
+    "contacts_fts",
+    column("rowid"),
+    column("first_name"),
+    column("last_name"),
+    column("email"),
+    column("phone"),
+    column("first_name_key"),
+    column("last_name_key"),
+)
+
+
+def fts5_phrase(value: str) -> str:
+    """Quotes value as FTS5 phrase, so symbols of query syntax are searched as is
+
+    :param value: Search string
+    :type value: str
+    :return: FTS5 phrase
+    :rtype: str
+    """
+    return '"' + value.replace('"', '""') + '"'
+
+
+def contains(db: AsyncSession, field: str, value: str):
+    """Condition "field of contact contains value", case insensitive.
+    PostgreSQL serves ILIKE '%...%' by pg_trgm GIN index, SQLite uses FTS5 trigram table contacts_fts.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param field: Name of field: first_name, last_name or email
+    :type field: str
+    :param value: Search string
+    :type value: str
+    :return: Condition for where clause
+    :rtype: ColumnElement[bool]
+    """
+    if len(value) >= TRIGRAM and db.get_bind().dialect.name == "sqlite":
+        fts_query = select(contacts_fts.c.rowid).where(contacts_fts.c[field].match(fts5_phrase(value)))
+        return Contact.id.in_(fts_query)
+    return getattr(Contact, field).ilike(f"%{value}%")
+
+
+def contains_any(db: AsyncSession, value: str):
+    """Condition "any of search fields of contact contains value", case insensitive.
+    Names are also compared by search keys, so "Тарас" finds "Taras" and vice versa.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param value: Search string
+    :type value: str
+    :return: Condition for where clause
+    :rtype: ColumnElement[bool]
+    """
+    key = search_key(value)
+    if len(value) >= TRIGRAM and (not key or len(key) >= TRIGRAM) and db.get_bind().dialect.name == "sqlite":
+        fts_match = " OR ".join(fts5_phrase(phrase) for phrase in (value, key) if phrase)
+        fts_query = select(contacts_fts.c.rowid).where(column("contacts_fts").match(fts_match))
+        return Contact.id.in_(fts_query)
+    conditions = [getattr(Contact, field).ilike(f"%{value}%") for field in SEARCH_FIELDS]
+    if key:
+        conditions += [getattr(Contact, field).like(f"%{key}%") for field in KEY_FIELDS]
+    return or_(*conditions)
+
+
+def relevance(terms: list[str]):
+    """Relevance of contact for search terms: 4 for equal field, 2 for field starts with term, summed up over fields.
+    It is calculated only for rows found by index.
+
+    :param terms: Search terms
+    :type terms: list[str]
+    :return: Expression of relevance
+    :rtype: ColumnElement[int]
+    """
+    scores = []
+    for term in terms:
+        compare = [(func.lower(getattr(Contact, field)), term.lower()) for field in SEARCH_FIELDS]
+        key = search_key(term)
+        if key:
+            compare += [(getattr(Contact, field), key) for field in KEY_FIELDS]
+        for value, text in compare:
+            scores.append(case((value == text, 4), (value.startswith(text, autoescape=True), 2), else_=0))
+    return sum(scores[1:], scores[0]) if scores else 0
+
+
+def prefix_upper_bound(prefix: str) -> str | None:
+    """The least string greater than all strings that start with prefix, in code point order
+
+    :param prefix: Prefix
+    :type prefix: str
+    :return: Upper bound or None if there is no bound, i.e. prefix of U+10FFFF only
+    :rtype: str | None
+    """
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    code = ord(prefix[-1]) + 1
+    if SURROGATES[0] <= code <= SURROGATES[1]:
+        # surrogates are not valid characters of text, the next character is after them
+        code = SURROGATES[1] + 1
+    return prefix[:-1] + chr(code)
+
+
+def starts_with(value, prefix: str):
+    """Condition "value starts with prefix" as a range of index with exact recheck by LIKE.
+    The range holds only in code point order, so values are compared by code_point_order: COLLATE "C" on PostgreSQL
+    (linguistic collations like en_US ignore punctuation and spaces), as the prefix indexes are built.
+
+    :param value: Indexed expression: column or lower(column)
+    :type value: ColumnElement[str]
+    :param prefix: Prefix, in the same case as value
+    :type prefix: str
+    :return: Condition for where clause
+    :rtype: ColumnElement[bool]
+    """
+    condition = code_point_order(value) >= code_point_order(literal(prefix))
+    prefix_next = prefix_upper_bound(prefix)
+    if prefix_next is not None:
+        condition &= code_point_order(value) < code_point_order(literal(prefix_next))
+    return condition & value.startswith(prefix, autoescape=True)
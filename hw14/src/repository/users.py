@@ -1,12 +1,15 @@
+import asyncio
 import logging
-import pickle
 from libgravatar import Gravatar
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import redis.asyncio as redis
 
 from src.conf.config import settings
-from src.shemas.users import UserModel
+from src.shemas.users import UserModel, UserPrincipal
 from src.database.models import User
+from src.repository.contacts import bump_contacts_version
+from src.services.local_cache import TTLCache
 
 
 logger = logging.getLogger(f"{settings.app_name}.{__name__}")
@@ -15,24 +18,72 @@ logger = logging.getLogger(f"{settings.app_name}.{__name__}")
 # redis_conn = redis.Redis(host=settings.redis_host, port=int(settings.redis_port), db=0)
 # redis_conn: redis.Redis = get_redis()
 
-async def get_cache_user_by_email(email: str, cache = None ) -> User | None:
+# Version of cached representation of user, is changed with fields of UserPrincipal
+USER_CACHE_VERSION = 1
+USER_CACHE_TTL = 900
+
+# Pub/sub channel with emails of users changed by any worker
+USER_INVALIDATE_CHANNEL = "user:invalidate"
+
+# In-process tier in front of Redis, enabled while listen_user_invalidation is subscribed
+local_users = TTLCache(settings.user_cache_size, settings.user_cache_ttl, enabled=False)
+
+
+async def listen_user_invalidation(cache, retry_seconds: float = 5) -> None:
+    """Removes users changed by other workers from in-process cache, runs until cancelled
+
+    While not subscribed, in-process cache is disabled, because invalidation messages may be lost.
+
+    :param cache: cache service
+    :type cache: cache service connection like redis
+    :param retry_seconds: Pause before resubscribe after error, defaults to 5
+    :type retry_seconds: float, optional
+    """
+    while True:
+        try:
+            async with cache.pubsub() as pubsub:
+                await pubsub.subscribe(USER_INVALIDATE_CHANNEL)
+                local_users.enabled = True
+                logger.info("Subscribed to user invalidation")
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        data = message["data"]
+                        local_users.pop(data.decode() if isinstance(data, bytes) else data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            logger.error(f"Error Redis subscribe {err}")
+        finally:
+            local_users.enabled = False
+            local_users.clear()
+        await asyncio.sleep(retry_seconds)
+
+def user_cache_key(email: str) -> str:
+    return f"user:v{USER_CACHE_VERSION}:{email}"
+
+
+async def get_cache_user_by_email(email: str, cache = None ) -> UserPrincipal | None:
     """Get user from cache by email if it is or None if not found
 
     :param email: User's email
     :type email: str
     :param cache: cache service, defaults to None
     :type cache: cache service connection like redis, optional
-    :return: User object or None
-    :rtype: User | None
+    :return: UserPrincipal object or None
+    :rtype: UserPrincipal | None
     """
     if email:
         user_bytes = None
         try:
             if cache:
-                user_bytes = await cache.get(f"user:{email}")
+                user = local_users.get(email)
+                if user is not None:
+                    return user
+                user_bytes = await cache.get(user_cache_key(email))
             if user_bytes is None:
                 return None
-            user = pickle.loads(user_bytes)  # type: ignore
+            user = UserPrincipal.model_validate_json(user_bytes)
+            local_users.set(email, user)
             logger.info(f"Get from Redis  {str(user.email)}")
         except Exception as err:
             logger.error(f"Error Redis read {err}")
@@ -41,7 +92,7 @@ async def get_cache_user_by_email(email: str, cache = None ) -> User | None:
 
 
 async def update_cache_user(user: User, cache = None):
-    """Update user on cache
+    """Update user on cache, other workers drop the user from in-process cache
 
     :param user: User
     :type user: User
@@ -51,20 +102,65 @@ async def update_cache_user(user: User, cache = None):
     if user and cache:
         email = user.email
         try:
-            await cache.set(f"user:{email}", pickle.dumps(user))
-            await cache.expire(f"user:{email}", 900)
+            user_json = UserPrincipal.model_validate(user).model_dump_json()
+            await cache.set(user_cache_key(email), user_json, ex=USER_CACHE_TTL)
+            local_users.pop(email)
+            await cache.publish(USER_INVALIDATE_CHANNEL, email)
             logger.info(f"Save to Redis {str(user.email)}")
         except Exception as err:
             logger.error(f"Error redis save, {err}")
 
 
-async def create_user(body: UserModel, db: Session, cache = None) -> User | None:
+def unknown_email_key(email: str) -> str:
+    return f"user:unknown:{email}"
+
+
+async def is_unknown_email(email: str | None, cache = None) -> bool:
+    """Email is known as not registered, so login may be rejected without query to database
+
+    :param email: User's email
+    :type email: str | None
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    :return: True if email is in negative cache
+    :rtype: bool
+    """
+    if email and cache:
+        try:
+            return bool(await cache.exists(unknown_email_key(email)))
+        except Exception as err:
+            logger.error(f"Error Redis read {err}")
+    return False
+
+
+async def set_unknown_email(email: str | None, cache = None, registered: bool = False):
+    """Adds email that is not registered to negative cache for settings.unknown_email_ttl,
+    or removes it when user is registered
+
+    :param email: User's email
+    :type email: str | None
+    :param cache: cache service, defaults to None
+    :type cache: cache service connection like redis, optional
+    :param registered: User with email is created, defaults to False
+    :type registered: bool, optional
+    """
+    if email and cache:
+        try:
+            if registered:
+                await cache.delete(unknown_email_key(email))
+            else:
+                await cache.set(unknown_email_key(email), 1, ex=settings.unknown_email_ttl)
+        except Exception as err:
+            logger.error(f"Error redis save, {err}")
+
+
+async def create_user(body: UserModel, db: AsyncSession, cache = None) -> User | None:
     """create_user
 
     :param body: User Model
     :type body: UserModel
     :param db: DB conenction
-    :type db: Session
+    :type db: AsyncSession
     :param cache: cache service, defaults to None
     :type cache: cache service connection like redis, optional
     :return: User object or None
@@ -74,51 +170,56 @@ async def create_user(body: UserModel, db: Session, cache = None) -> User | None
         g = Gravatar(body.email)
         new_user = User(**body.model_dump(), avatar=g.get_image())
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
         await update_cache_user(new_user, cache)
+        await set_unknown_email(str(new_user.email), cache, registered=True)
     except Exception:
         return None
     return new_user
 
 
-async def get_user_by_email(email: str | None, db: Session) -> User | None:
+async def get_user_by_email(email: str | None, db: AsyncSession) -> User | None:
     """get_user_by_email
 
     :param email: User's email
     :type email: str | None
     :param db: DB conenction
-    :type db: Session
+    :type db: AsyncSession
     :return: User object or None
     :rtype: User | None
     """
     if email:
         try:
-            return db.query(User).filter_by(email=email).first()
+            user = await db.execute(select(User).filter_by(email=email))
+            return user.scalars().first()
         except Exception:
             ...
     return None
 
 
-async def get_user_by_name(username: str | None, db: Session) -> User | None:
+async def get_user_by_name(username: str | None, db: AsyncSession) -> User | None:
     """get_user_by_name
 
     :param email: User's username
     :type email: str | None
     :param db: DB conenction
-    :type db: Session
+    :type db: AsyncSession
     :return: User object
     :rtype: User | None
     """
     if username:
         try:
-            return db.query(User).filter_by(email=username).first()
+            user = await db.execute(select(User).filter_by(email=username))
+            return user.scalars().first()
         except Exception:
             ...
     return None
 
 
-async def update_user_refresh_token(user: User, refresh_token: str | None, db: Session, cache = None) -> str | None:
+async def update_user_refresh_token(
+    user: User, refresh_token: str | None, db: AsyncSession, cache=None
+) -> str | None:
     """update_user_refresh_token
 
     :param user: User
@@ -126,7 +227,7 @@ async def update_user_refresh_token(user: User, refresh_token: str | None, db: S
     :param refresh_token: refresh token
     :type refresh_token: str | None
     :param db: DB conenction
-    :type db: Session
+    :type db: AsyncSession
     :param cache: cache service, defaults to None
     :type cache: cache service connection like redis, optional
     :return: refresh_token
@@ -135,7 +236,7 @@ async def update_user_refresh_token(user: User, refresh_token: str | None, db: S
     if user:
         try:
             user.refresh_token = refresh_token
-            db.commit()
+            await db.commit()
             await update_cache_user(user, cache)
             return refresh_token
         except Exception:
@@ -144,7 +245,7 @@ async def update_user_refresh_token(user: User, refresh_token: str | None, db: S
 
 
 async def update_by_name_refresh_token(
-    username: str | None, refresh_token: str | None, db: Session
+    username: str | None, refresh_token: str | None, db: AsyncSession
 ) -> str | None:
     """update_by_name_refresh_token by username
 
@@ -153,7 +254,7 @@ async def update_by_name_refresh_token(
     :param refresh_token: refresh_token
     :type refresh_token: str | None
     :param db: DB conenction
-    :type db: Session
+    :type db: AsyncSession
     :return: refresh_token
     :rtype: str | None
     """
@@ -166,13 +267,13 @@ async def update_by_name_refresh_token(
     return None
 
 
-async def confirmed_email(email: str | None, db: Session, cache = None) -> bool | None:
+async def confirmed_email(email: str | None, db: AsyncSession, cache = None) -> bool | None:
     """set state of confirmed email
 
     :param email: User's email
     :type email: str | None
     :param db:  DB conenction
-    :type db: Session
+    :type db: AsyncSession
     :param cache: cache service, defaults to None
     :type cache: cache service connection like redis, optional
     :return: true if success, None if fail
@@ -183,7 +284,7 @@ async def confirmed_email(email: str | None, db: Session, cache = None) -> bool
             user = await get_user_by_email(email, db)
             if user:
                 user.confirmed = True
-                db.commit()
+                await db.commit()
                 await update_cache_user(user, cache)
                 return True
         except Exception:
@@ -191,7 +292,7 @@ async def confirmed_email(email: str | None, db: Session, cache = None) -> bool
     return None
 
 
-async def update_avatar(email: str | None, url: str | None, db: Session, cache = None) -> User:
+async def update_avatar(email: str | None, url: str | None, db: AsyncSession, cache = None) -> User:
     """_summary_
 
     :param email: update User's avatar
@@ -199,7 +300,7 @@ async def update_avatar(email: str | None, url: str | None, db: Session, cache =
     :param url: email
     :type url: str | None
     :param db:  DB conenction
-    :type db: Session
+    :type db: AsyncSession
     :param cache: cache service, defaults to None
     :type cache: cache service connection like redis, optional
     :return: User object
@@ -208,7 +309,9 @@ async def update_avatar(email: str | None, url: str | None, db: Session, cache =
     user: User = await get_user_by_email(email, db)
     if user:
         user.avatar = url
-        db.commit()
+        await db.commit()
         await update_cache_user(user, cache)
+        # owner is part of cached responses of contacts
+        await bump_contacts_version(user.id, cache)  # type: ignore
     return user
 
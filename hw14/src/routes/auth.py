@@ -16,16 +16,20 @@ from fastapi.security import (
     HTTPBasicCredentials,
     HTTPBearer,
 )
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf.config import settings
-from src.database.db import get_db, get_redis
+from src.database.db import get_async_db, get_redis
 from src.database.models import User
-from src.shemas.users import UserResponse, UserModel, UserDetailResponse
+from src.shemas.users import TokenPrincipal, UserPrincipal, UserResponse, UserModel, UserDetailResponse
 from src.shemas.auth import RequestEmail
 from src.repository import auth as repository_auth
 from src.repository import users as repository_users
+from src.repository import refresh_tokens as repository_refresh_tokens
+from src.repository import login_guard
 from src.services.auth.auth import auth_service
+from src.services.auth.auth_token import PasswordPoolBusy
+from src.services.client_ip import client_ip
 from src.services.emails import send_email
 
 logger = logging.getLogger(f"{settings.app_name}.{__name__}")
@@ -36,6 +40,18 @@ security = HTTPBearer()
 
 SET_COOKIES = False
 
+# Seconds for header Retry-After when queue of password hashing is full
+PASSWORD_RETRY_AFTER = 1
+
+
+def password_pool_busy(err: PasswordPoolBusy) -> HTTPException:
+    logger.warning(f"Password pool busy: {err}")
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many logins, try again later",
+        headers={"Retry-After": str(PASSWORD_RETRY_AFTER)},
+    )
+
 
 @router.post(
     "/signup",
@@ -43,24 +59,52 @@ SET_COOKIES = False
     response_model_exclude_none=True,
     status_code=status.HTTP_201_CREATED,
 )
-async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
-    new_user = await repository_auth.signup(body=body, db=db)
+async def signup(
+    body: UserModel,
+    background_tasks: BackgroundTasks,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    cache=Depends(get_redis),
+):
+    try:
+        new_user = await repository_auth.signup(body=body, db=db, cache=cache)
+    except PasswordPoolBusy as err:
+        raise password_pool_busy(err)
     if new_user is None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
     background_tasks.add_task(send_email, str(new_user.email), str(new_user.username), str(request.base_url))
     return {"user": new_user, "detail": "User successfully created. Check your email for confirmation."}
 
 
+def too_many_logins(lockout: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many failed logins, try again later",
+        headers={"Retry-After": str(lockout)},
+    )
+
+
 # Annotated[OAuth2PasswordRequestForm, Depends()]
 # auth_response_model = Depends()
 @router.post("/login", response_model=auth_service.token_response_model)
 async def login(
+    request: Request,
     response: Response,
     body: Annotated[auth_service.auth_response_model, Depends()],  # type: ignore
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
+    cache=Depends(get_redis),
 ):
-    user = await repository_users.get_user_by_email(body.username, db)
+    ip = client_ip(request)
+    lockout = await login_guard.get_lockout(body.username, ip, cache)
+    if lockout:
+        raise too_many_logins(lockout)
+    user = None
+    if not await repository_users.is_unknown_email(body.username, cache):
+        user = await repository_users.get_user_by_email(body.username, db)
+        if user is None:
+            await repository_users.set_unknown_email(body.username, cache)
     if user is None:
+        await login_guard.register_failure(body.username, ip, cache)
         exception_data = {
             "status_code": status.HTTP_401_UNAUTHORIZED,
             "detail": "Invalid credentianal",
@@ -73,8 +117,12 @@ async def login(
         }
         raise HTTPException(**exception_data)
 
-    token = repository_auth.login(user=user, password=body.password, db=db)
+    try:
+        token = await repository_auth.login(user=user, password=body.password, db=db, cache=cache)
+    except PasswordPoolBusy as err:
+        raise password_pool_busy(err)
     if token is None:
+        await login_guard.register_failure(body.username, ip, cache)
         exception_data = {
             "status_code": status.HTTP_401_UNAUTHORIZED,
             "detail": "Invalid credentianal",
@@ -89,9 +137,8 @@ async def login(
                 }
             )
         raise HTTPException(**exception_data)
+    await login_guard.reset_failures(body.username, cache)
     refresh_token = token.get("refresh_token")
-    if refresh_token:
-        await repository_auth.update_refresh_token(username=body.username, refresh_token=refresh_token, db=db)
     new_access_token = token.get("access_token")
     if SET_COOKIES:
         if new_access_token:
@@ -124,7 +171,7 @@ async def get_current_user(
     access_token: Annotated[str | None, Cookie()] = None,
     refresh_token: Annotated[str | None, Cookie()] = None,
     token: str | None = Depends(auth_service.auth_scheme),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     cache=Depends(get_redis),
 ) -> User | None:
     credentials_exception = HTTPException(
@@ -168,6 +215,26 @@ async def get_current_user(
     return user
 
 
+async def get_current_principal(
+    response: Response,
+    access_token: Annotated[str | None, Cookie()] = None,
+    refresh_token: Annotated[str | None, Cookie()] = None,
+    token: str | None = Depends(auth_service.auth_scheme),
+    db: AsyncSession = Depends(get_async_db),
+    cache=Depends(get_redis),
+) -> TokenPrincipal | UserPrincipal | User:
+    """Lightweight current user for routes that need only id and role.
+    Access token with claims (settings.token_claims) authorizes without lookup of user in cache or database,
+    otherwise it is the same as get_current_user.
+    """
+    claims = auth_service.decode_access_claims(token) or auth_service.decode_access_claims(access_token)
+    if claims:
+        return TokenPrincipal(
+            id=claims["uid"], email=claims["sub"], role=claims["role"], confirmed=claims["confirmed"]
+        )
+    return await get_current_user(response, access_token, refresh_token, token, db, cache)  # type: ignore
+
+
 @router.get("/secret")
 async def read_item(current_user: User = Depends(get_current_user)):
     auth_result = {"email": current_user.email}
@@ -186,34 +253,51 @@ async def refresh_access_token(refresh_token: str) -> dict[str, Any] | None:
     return None
 
 
+def invalid_refresh_token(response: Response) -> HTTPException:
+    response.delete_cookie(key="refresh_token", httponly=True, path="/api/")
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={
+            "set-cookie": response.headers.get("set-cookie", ""),
+        },
+    )
+
+
 @router.get("/refresh_token")
 async def refresh_token(
     response: Response,
     refresh_token: Annotated[str | None, Cookie()] = None,
     credentials: HTTPAuthorizationCredentials = Security(security),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     cache=Depends(get_redis),
 ):
     token: str = credentials.credentials
     logger.info(f"refresh_token {token=}")
     if not token and refresh_token:
         token = refresh_token
-    email = auth_service.decode_refresh_token(token)
+    claims = auth_service.decode_refresh_claims(token)
+    email = claims["sub"]
     logger.info(f"refresh_token {email=}")
-    user: User | None = await repository_users.get_user_by_email(email, db)
-    if user and user.refresh_token != token:  # type: ignore
-        await repository_users.update_user_refresh_token(user, None, db, cache)
-        response.delete_cookie(key="refresh_token", httponly=True, path="/api/")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid refresh token",
-            headers={
-                "set-cookie": response.headers.get("set-cookie", ""),
-            },
-        )
-    new_access_token, expire_access_token = auth_service.create_access_token(data={"sub": email})
-    new_refresh_token, expire_refresh_token = auth_service.create_refresh_token(data={"sub": email})
-    await repository_users.update_user_refresh_token(user, new_refresh_token, db, cache)
+    if "fam" in claims:
+        # token from token store, rotation does not write to database
+        rotated = await repository_refresh_tokens.rotate(claims, cache)
+        if rotated is None:
+            raise invalid_refresh_token(response)
+        new_refresh_token, expire_refresh_token = rotated
+        user = await repository_users.get_cache_user_by_email(email, cache)
+        if user is None:
+            user = await repository_users.get_user_by_email(email, db)
+    else:
+        user = await repository_users.get_user_by_email(email, db)
+        if user and user.refresh_token != token:  # type: ignore
+            await repository_users.update_user_refresh_token(user, None, db)
+            raise invalid_refresh_token(response)
+        if user:
+            new_refresh_token, expire_refresh_token = await repository_auth.new_refresh_token(user, db, cache)
+        else:
+            new_refresh_token, expire_refresh_token = auth_service.create_refresh_token(data={"sub": email})
+    new_access_token, expire_access_token = auth_service.create_access_token(data={"sub": email}, user=user)
     if SET_COOKIES:
         if new_access_token:
             response.set_cookie(
@@ -245,7 +329,7 @@ async def refresh_token(
 
 
 @router.get("/confirmed_email/{token}")
-async def confirmed_email(token: str, db: Session = Depends(get_db), cache=Depends(get_redis)):
+async def confirmed_email(token: str, db: AsyncSession = Depends(get_async_db), cache=Depends(get_redis)):
     email = auth_service.get_email_from_token(token)
     if email:
         user = await repository_users.get_user_by_email(email, db)
@@ -259,7 +343,7 @@ async def confirmed_email(token: str, db: Session = Depends(get_db), cache=Depen
 
 @router.post("/request_email")
 async def request_email(
-    body: RequestEmail, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)
+    body: RequestEmail, background_tasks: BackgroundTasks, request: Request, db: AsyncSession = Depends(get_async_db)
 ):
     user = await repository_users.get_user_by_email(body.email, db)
     if user:
@@ -1,30 +1,195 @@
-from typing import List
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable, List
 
-from fastapi import Path, Depends, HTTPException, Query, status, APIRouter
-from fastapi_limiter.depends import RateLimiter
+from fastapi import Path, Depends, Header, HTTPException, Query, Request, Response, status, APIRouter
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf.config import settings
-from src.database.db import get_db
-from src.shemas.contact import ContactFavoriteModel, ContactModel, ContactResponse
+from src.database.db import get_async_db, get_redis
+from src.shemas.contact import (
+    ContactAutocompleteResponse,
+    ContactBatchIds,
+    ContactBatchPatch,
+    ContactBatchResult,
+    ContactChangesResponse,
+    ContactFavoriteModel,
+    ContactImportResponse,
+    ContactModel,
+    ContactResponse,
+)
 from src.repository import contacts as repository_contacts
-from src.database.models import User
+from src.database.models import Contact, User
 from src.routes import auth
+from src.services import contacts_export, contacts_import
+from src.services.cursor import decode_cursor, encode_cursor
+from src.services.etag import etag_matches, make_etag, not_modified
 
 
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 
+CONTACTS_ADAPTER = TypeAdapter(List[ContactResponse])
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Overlap of windows of delta sync, longer than transactions that change contacts
+SYNC_LAG = timedelta(seconds=60)
+
+
+def get_after_id(cursor: str | None) -> int | None:
+    """Keyset pagination, ID of the last contact of previous page from opaque cursor
+
+    :param cursor: Cursor from header X-Next-Cursor of previous page
+    :type cursor: str | None
+    :raises HTTPException: Invalid cursor
+    :return: ID of contact or None for the first page
+    :rtype: int | None
+    """
+    if not cursor:
+        return None
+    try:
+        return int(decode_cursor(cursor)["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def decode_sync_token(token: str | None) -> tuple[datetime | None, datetime | None, int | None]:
+    """Window of delta sync from opaque token
+
+    :param token: Token from field next of previous response of changes
+    :type token: str | None
+    :raises HTTPException: Invalid token
+    :return: Start of window, end of window (None for new window), ID of the last contact of previous page
+    :rtype: tuple[datetime | None, datetime | None, int | None]
+    """
+    if not token:
+        return None, None, None
+    try:
+        keys = decode_cursor(token)
+        since = datetime.fromisoformat(keys["s"]) if keys.get("s") else None
+        until = datetime.fromisoformat(keys["u"]) if keys.get("u") else None
+        after_id = int(keys["a"]) if keys.get("a") else None
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid token")
+    return since, until, after_id
+
+
+def contact_etag_key(contact: Contact) -> tuple:
+    """Values of columns of contact and fields of owner for ETag without cached version,
+    it does not depend on precision of updated_at
+
+    :param contact: Contact
+    :type contact: Contact
+    :return: Values of columns and fields of owner
+    :rtype: tuple
+    """
+    owner = contact.user
+    return (
+        *(getattr(contact, column.key) for column in Contact.__table__.columns),
+        owner.username,
+        owner.email,
+        owner.avatar,
+        owner.role,
+    )
+
+
+def get_next_cursor(contacts: List, limit: int) -> str | None:
+    """Cursor of the next page when the page is full, so next page may exist
+
+    :param contacts: Contacts of page
+    :type contacts: List
+    :param limit: The maximum number of contacts of page
+    :type limit: int
+    :return: Cursor for header X-Next-Cursor or None
+    :rtype: str | None
+    """
+    if contacts and len(contacts) >= limit:
+        return encode_cursor(id=contacts[-1].id)
+    return None
+
+
+async def cached_contacts(
+    request_key: tuple,
+    load: Callable[[], Awaitable[tuple[List[Contact], str | None]]],
+    if_none_match: str | None,
+    current_user: User,
+    cache,
+    ttl: int = repository_contacts.CONTACTS_CACHE_TTL,
+) -> Response:
+    """Read-through cache of list of contacts with ETag and 304 Not Modified.
+    Key of cached response is ETag from version of contacts of user and request, so any write of contacts
+    or of profile of owner invalidates it.
+    Without cache, ETag is computed from loaded contacts.
+
+    :param request_key: Endpoint and parameters of request
+    :type request_key: tuple
+    :param load: Loads contacts and next cursor from database
+    :type load: Callable[[], Awaitable[tuple[List[Contact], str | None]]]
+    :param if_none_match: Header If-None-Match
+    :type if_none_match: str | None
+    :param current_user: Current user
+    :type current_user: User
+    :param cache: cache service
+    :type cache: cache service connection like redis
+    :param ttl: Seconds to keep cached response, defaults to CONTACTS_CACHE_TTL
+    :type ttl: int, optional
+    :return: JSON response with headers ETag and X-Next-Cursor
+    :rtype: Response
+    """
+    version = await repository_contacts.get_contacts_version(current_user.id, cache)  # type: ignore
+    if version:
+        # short circuit by version of contacts, without query to database
+        etag = make_etag(version, *request_key)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        cached = await repository_contacts.get_cache_contacts(current_user.id, etag, cache)  # type: ignore
+        if cached:
+            return contacts_response(*cached, etag)
+    contacts, next_cursor = await load()
+    if not version:
+        etag = make_etag(*[contact_etag_key(contact) for contact in contacts], *request_key)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    body = CONTACTS_ADAPTER.dump_json(CONTACTS_ADAPTER.validate_python(contacts, from_attributes=True))
+    if version:
+        await repository_contacts.set_cache_contacts(
+            current_user.id, etag, body, next_cursor, ttl, cache  # type: ignore
+        )
+    return contacts_response(body, next_cursor, etag)
+
+
+def contacts_response(body: bytes, next_cursor: str | None, etag: str) -> Response:
+    """JSON response of list of contacts
+
+    :param body: JSON body
+    :type body: bytes
+    :param next_cursor: Cursor for header X-Next-Cursor or None
+    :type next_cursor: str | None
+    :param etag: ETag
+    :type etag: str
+    :return: Response
+    :rtype: Response
+    """
+    headers = {"ETag": etag}
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
 @router.get("/search", response_model=List[ContactResponse])
 async def search_contacts(
     first_name: str | None = None,
     last_name: str | None = None,
     email: str | None = None,
+    q: str | None = None,
     skip: int = 0,
     limit: int = Query(default=10, le=100, ge=10),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth.get_current_user),
+    cursor: str | None = None,
+    if_none_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_principal),
+    cache=Depends(get_redis),
 ):
     """ Route of search contacts
 
@@ -34,32 +199,68 @@ async def search_contacts(
     :type last_name: str | None, optional
     :param email: _description_, defaults to None
     :type email: str | None, optional
+    :param q: Words to search in first name, last name, email and phone, ordered by relevance, defaults to None
+    :type q: str | None, optional
     :param skip: _description_, defaults to 0
     :type skip: int, optional
     :param limit: _description_, defaults to Query(default=10, le=100, ge=10)
     :type limit: int, optional
-    :param db: _description_, defaults to Depends(get_db)
-    :type db: Session, optional
-    :param current_user: _description_, defaults to Depends(auth.get_current_user)
+    :param cursor: Opaque cursor from header X-Next-Cursor of previous page, skip is ignored, defaults to None
+    :type cursor: str | None, optional
+    :param if_none_match: ETag of cached response, answer is 304 if not modified, defaults to Header(None)
+    :type if_none_match: str | None, optional
+    :param db: _description_, defaults to Depends(get_async_db)
+    :type db: AsyncSession, optional
+    :param current_user: _description_, defaults to Depends(auth.get_current_principal)
     :type current_user: User, optional
+    :param cache: _description_, defaults to Depends(get_redis)
+    :type cache: _type_, optional
     :raises HTTPException: _description_
     :return: _description_
     :rtype: _type_
     """
-    contacts = None
-    if first_name or last_name or email:
-        param = {
-            "first_name": first_name,
-            "last_name": last_name,
-            "email": email,
-            "skip": skip,
-            "limit": limit,
-        }
-        user_id: int = current_user.id  # type: ignore
-        contacts = await repository_contacts.search_contacts(param, user_id, db)
-    if contacts is None:
+    if not (first_name or last_name or email or q):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
-    return contacts
+    param = {
+        "first_name": first_name,
+        "last_name": last_name,
+        "email": email,
+        "q": q,
+        "skip": skip,
+        "limit": limit,
+        "after_id": get_after_id(cursor),
+    }
+
+    async def load():
+        contacts = await repository_contacts.search_contacts(param, current_user.id, db)  # type: ignore
+        return contacts, None if q else get_next_cursor(contacts, limit)
+
+    request_key = ("search", first_name, last_name, email, q, skip, limit, cursor)
+    return await cached_contacts(request_key, load, if_none_match, current_user, cache)
+
+
+@router.get("/autocomplete", response_model=List[ContactAutocompleteResponse])
+async def autocomplete_contacts(
+    prefix: str = Query(min_length=1, max_length=50),
+    limit: int = Query(default=10, le=50, ge=1),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_principal),
+):
+    """Route autocomplete_contacts, only ID and display name of contacts whose first name, last name or email
+    starts with prefix
+
+    :param prefix: Typed prefix
+    :type prefix: str
+    :param limit: _description_, defaults to Query(default=10, le=50, ge=1)
+    :type limit: int, optional
+    :param db: _description_, defaults to Depends(get_async_db)
+    :type db: AsyncSession, optional
+    :param current_user: _description_, defaults to Depends(auth.get_current_principal)
+    :type current_user: User, optional
+    :return: _description_
+    :rtype: _type_
+    """
+    return await repository_contacts.autocomplete(prefix, current_user.id, limit, db)  # type: ignore
 
 
 @router.get("/search/birtdays", response_model=List[ContactResponse])
@@ -67,8 +268,10 @@ async def search_contacts_birthday(
     days: int = Query(default=7, le=30, ge=1),
     skip: int = 0,
     limit: int = Query(default=10, le=100, ge=10),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth.get_current_user),
+    if_none_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_principal),
+    cache=Depends(get_redis),
 ):
     """Route of search_contacts_birthday
 
@@ -78,25 +281,32 @@ async def search_contacts_birthday(
     :type skip: int, optional
     :param limit: _description_, defaults to Query(default=10, le=100, ge=10)
     :type limit: int, optional
-    :param db: _description_, defaults to Depends(get_db)
-    :type db: Session, optional
-    :param current_user: _description_, defaults to Depends(auth.get_current_user)
+    :param if_none_match: ETag of cached response, answer is 304 if not modified, defaults to Header(None)
+    :type if_none_match: str | None, optional
+    :param db: _description_, defaults to Depends(get_async_db)
+    :type db: AsyncSession, optional
+    :param current_user: _description_, defaults to Depends(auth.get_current_principal)
     :type current_user: User, optional
+    :param cache: _description_, defaults to Depends(get_redis)
+    :type cache: _type_, optional
     :raises HTTPException: _description_
     :return: _description_
     :rtype: _type_
     """
-    contacts = None
-    if days:
-        param = {
-            "days": days,
-            "skip": skip,
-            "limit": limit,
-        }
+    param = {
+        "days": days,
+        "skip": skip,
+        "limit": limit,
+    }
+
+    async def load():
         contacts = await repository_contacts.search_birthday(param, current_user.id, db)  # type: ignore
-    if contacts is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
-    return contacts
+        return contacts, None
+
+    # result depends on today, cached response expires at local midnight
+    request_key = ("birthdays", date.today(), days, skip, limit)
+    ttl = repository_contacts.seconds_to_midnight()
+    return await cached_contacts(request_key, load, if_none_match, current_user, cache, ttl)
 
 
 @router.get("", response_model=List[ContactResponse])
@@ -104,8 +314,11 @@ async def get_contacts(
     skip: int = 0,
     limit: int = Query(default=10, le=100, ge=10),
     favorite: bool | None = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth.get_current_user),
+    cursor: str | None = None,
+    if_none_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_principal),
+    cache=Depends(get_redis),
 ):
     """Route get_contacts
 
@@ -115,40 +328,148 @@ async def get_contacts(
     :type limit: int, optional
     :param favorite: _description_, defaults to None
     :type favorite: bool | None, optional
-    :param db: _description_, defaults to Depends(get_db)
-    :type db: Session, optional
-    :param current_user: _description_, defaults to Depends(auth.get_current_user)
+    :param cursor: Opaque cursor from header X-Next-Cursor of previous page, skip is ignored, defaults to None
+    :type cursor: str | None, optional
+    :param if_none_match: ETag of cached response, answer is 304 if not modified, defaults to Header(None)
+    :type if_none_match: str | None, optional
+    :param db: _description_, defaults to Depends(get_async_db)
+    :type db: AsyncSession, optional
+    :param current_user: _description_, defaults to Depends(auth.get_current_principal)
+    :type current_user: User, optional
+    :param cache: _description_, defaults to Depends(get_redis)
+    :type cache: _type_, optional
+    :return: _description_
+    :rtype: _type_
+    """
+    after_id = get_after_id(cursor)
+
+    async def load():
+        contacts = await repository_contacts.get_contacts(
+            db=db,
+            user_id=current_user.id,  # type: ignore
+            skip=skip,
+            limit=limit,
+            favorite=favorite,
+            after_id=after_id,
+        )
+        return contacts, get_next_cursor(contacts, limit)
+
+    request_key = ("list", skip, limit, favorite, cursor)
+    return await cached_contacts(request_key, load, if_none_match, current_user, cache)
+
+
+@router.get(
+    "/changes",
+    response_model=ContactChangesResponse,
+    description="Delta sync: contacts changed and removed since token, all contacts without token",
+)
+async def get_changes(
+    since: str | None = Query(None, description="Token from field next of previous response"),
+    limit: int = Query(100, ge=10, le=1000),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_principal),
+):
+    """Route get_changes
+
+    :param since: _description_, defaults to Query(None)
+    :type since: str | None, optional
+    :param limit: _description_, defaults to Query(100, ge=10, le=1000)
+    :type limit: int, optional
+    :param db: _description_, defaults to Depends(get_async_db)
+    :type db: AsyncSession, optional
+    :param current_user: _description_, defaults to Depends(auth.get_current_principal)
+    :type current_user: User, optional
+    :raises HTTPException: _description_
+    :return: _description_
+    :rtype: _type_
+    """
+    since_time, until, after_id = decode_sync_token(since)
+    if until is None:
+        # new window up to now, previous ones are complete
+        until = await repository_contacts.db_now(db)
+        retention = until - timedelta(days=settings.sync_tombstone_days)
+        if since_time and since_time < retention:
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Token is expired, full sync is required")
+    contacts, deleted = await repository_contacts.get_changes(
+        current_user.id, since_time, until, after_id, limit, db  # type: ignore
+    )
+    more = len(contacts) >= limit
+    if more:
+        next_token = encode_cursor(s=since_time, u=until, a=contacts[-1].id)
+    else:
+        # windows overlap by SYNC_LAG, changes committed late are not lost, clients apply them idempotently
+        next_token = encode_cursor(s=until - SYNC_LAG)
+    return {"contacts": contacts, "deleted": deleted, "next": next_token, "more": more}
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    description="All contacts of user as NDJSON, CSV or vCard, streamed",
+)
+async def export_contacts(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv|vcf)$"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_principal),
+):
+    """Route export_contacts
+
+    :param export_format: _description_, defaults to Query("ndjson", alias="format", pattern="^(ndjson|csv|vcf)$")
+    :type export_format: str, optional
+    :param db: _description_, defaults to Depends(get_async_db)
+    :type db: AsyncSession, optional
+    :param current_user: _description_, defaults to Depends(auth.get_current_principal)
     :type current_user: User, optional
     :return: _description_
     :rtype: _type_
     """
-    contacts = await repository_contacts.get_contacts(
-        db=db, user_id=current_user.id, skip=skip, limit=limit, favorite=favorite  # type: ignore
+    rows = repository_contacts.stream_contacts(current_user.id, db, contacts_export.EXPORT_FIELDS)  # type: ignore
+    return StreamingResponse(
+        contacts_export.export_lines(rows, export_format),
+        media_type=contacts_export.EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="contacts.{export_format}"'},
     )
-    return contacts
 
 
 @router.get("/{contact_id}", response_model=ContactResponse)
 async def get_contact(
+    response: Response,
     contact_id: int = Path(ge=1),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth.get_current_user),
+    if_none_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_principal),
+    cache=Depends(get_redis),
 ):
     """Route get_contact
 
     :param contact_id: _description_, defaults to Path(ge=1)
     :type contact_id: int, optional
-    :param db: _description_, defaults to Depends(get_db)
-    :type db: Session, optional
-    :param current_user: _description_, defaults to Depends(auth.get_current_user)
+    :param if_none_match: ETag of cached response, answer is 304 if not modified, defaults to Header(None)
+    :type if_none_match: str | None, optional
+    :param db: _description_, defaults to Depends(get_async_db)
+    :type db: AsyncSession, optional
+    :param current_user: _description_, defaults to Depends(auth.get_current_principal)
     :type current_user: User, optional
+    :param cache: _description_, defaults to Depends(get_redis)
+    :type cache: _type_, optional
     :raises HTTPException: _description_
     :return: _description_
     :rtype: _type_
     """
+    version = await repository_contacts.get_contacts_version(current_user.id, cache)  # type: ignore
+    if version:
+        # short circuit by version of contacts, without query to database
+        etag = make_etag(version, contact_id)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
     contact = await repository_contacts.get_contact_by_id(contact_id, current_user.id, db)  # type: ignore
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    if not version:
+        etag = make_etag(contact_etag_key(contact))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    response.headers["ETag"] = etag
     return contact
 
 
@@ -157,42 +478,181 @@ async def get_contact(
     response_model=ContactResponse,
     status_code=status.HTTP_201_CREATED,
     description=f"No more than  {settings.reate_limiter_times} requests per {settings.reate_limiter_seconds} seconds",
-    # dependencies=[Depends(RateLimiter(times=settings.reate_limiter_times, seconds=settings.reate_limiter_seconds))],
 )
 async def create_contact(
     body: ContactModel,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_principal),
+    cache=Depends(get_redis),
 ):
     """Route create_contact
 
     :param body: _description_
     :type body: ContactModel
-    :param db: _description_, defaults to Depends(get_db)
-    :type db: Session, optional
-    :param current_user: _description_, defaults to Depends(auth.get_current_user)
+    :param db: _description_, defaults to Depends(get_async_db)
+    :type db: AsyncSession, optional
+    :param current_user: _description_, defaults to Depends(auth.get_current_principal)
     :type current_user: User, optional
+    :param cache: _description_, defaults to Depends(get_redis)
+    :type cache: _type_, optional
     :raises HTTPException: _description_
     :raises HTTPException: _description_
     :return: _description_
     :rtype: _type_
     """
-    contact = await repository_contacts.get_contact_by_email(body.email, current_user.id, db)  # type: ignore
-    if contact:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Email is exist!")
     try:
-        contact = await repository_contacts.create(body, current_user.id, db)  # type: ignore
+        contact = await repository_contacts.create(body, current_user.id, db, cache)  # type: ignore
     except IntegrityError as err:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Error: {err}")
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Email is exist!")
     return contact
 
 
+@router.post(
+    "/import",
+    response_model=ContactImportResponse,
+    description="Body is NDJSON (application/x-ndjson) or CSV with header line (text/csv), streamed",
+)
+async def import_contacts(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_principal),
+    cache=Depends(get_redis),
+):
+    """Route import_contacts
+
+    :param request: _description_
+    :type request: Request
+    :param db: _description_, defaults to Depends(get_async_db)
+    :type db: AsyncSession, optional
+    :param current_user: _description_, defaults to Depends(auth.get_current_principal)
+    :type current_user: User, optional
+    :param cache: _description_, defaults to Depends(get_redis)
+    :type cache: _type_, optional
+    :raises HTTPException: _description_
+    :return: _description_
+    :rtype: _type_
+    """
+    import_format = contacts_import.import_format(request.headers.get("content-type"))
+    if import_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Expected NDJSON or CSV content type"
+        )
+    lines = contacts_import.iter_lines(request.stream())
+    rows = contacts_import.iter_csv(lines) if import_format == "csv" else contacts_import.iter_ndjson(lines)
+    return await repository_contacts.import_contacts(
+        contacts_import.iter_chunks(rows), current_user.id, db, cache  # type: ignore
+    )
+
+
+def batch_results(ids: List[int], contacts: dict) -> List[ContactBatchResult]:
+    """Per-item results of batch in order of requested IDs, repeated IDs are reported once
+
+    :param ids: Requested IDs
+    :type ids: List[int]
+    :param contacts: Found contacts (or True for removed) by ID
+    :type contacts: dict
+    :return: Results of items
+    :rtype: List[ContactBatchResult]
+    """
+    results = []
+    for contact_id in dict.fromkeys(ids):
+        contact = contacts.get(contact_id)
+        if contact is None:
+            results.append(ContactBatchResult(id=contact_id, status=status.HTTP_404_NOT_FOUND))
+        elif contact is True:
+            results.append(ContactBatchResult(id=contact_id, status=status.HTTP_200_OK))
+        else:
+            results.append(
+                ContactBatchResult(
+                    id=contact_id, status=status.HTTP_200_OK, contact=ContactResponse.model_validate(contact)
+                )
+            )
+    return results
+
+
+@router.post("/batch/get", response_model=List[ContactBatchResult])
+async def get_contacts_batch(
+    body: ContactBatchIds,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_principal),
+):
+    """Route get_contacts_batch
+
+    :param body: _description_
+    :type body: ContactBatchIds
+    :param db: _description_, defaults to Depends(get_async_db)
+    :type db: AsyncSession, optional
+    :param current_user: _description_, defaults to Depends(auth.get_current_principal)
+    :type current_user: User, optional
+    :return: _description_
+    :rtype: _type_
+    """
+    contacts = await repository_contacts.get_contacts_by_ids(body.ids, current_user.id, db)  # type: ignore
+    return batch_results(body.ids, {contact.id: contact for contact in contacts})
+
+
+@router.patch("/batch", response_model=List[ContactBatchResult])
+async def update_contacts_batch(
+    body: ContactBatchPatch,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_principal),
+    cache=Depends(get_redis),
+):
+    """Route update_contacts_batch
+
+    :param body: _description_
+    :type body: ContactBatchPatch
+    :param db: _description_, defaults to Depends(get_async_db)
+    :type db: AsyncSession, optional
+    :param current_user: _description_, defaults to Depends(auth.get_current_principal)
+    :type current_user: User, optional
+    :param cache: _description_, defaults to Depends(get_redis)
+    :type cache: _type_, optional
+    :raises HTTPException: _description_
+    :return: _description_
+    :rtype: _type_
+    """
+    try:
+        contacts = await repository_contacts.update_many(body.items, current_user.id, db, cache)  # type: ignore
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Email is exist!")
+    return batch_results([item.id for item in body.items], {contact.id: contact for contact in contacts})
+
+
+@router.post("/batch/delete", response_model=List[ContactBatchResult])
+async def remove_contacts_batch(
+    body: ContactBatchIds,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_principal),
+    cache=Depends(get_redis),
+):
+    """Route remove_contacts_batch
+
+    :param body: _description_
+    :type body: ContactBatchIds
+    :param db: _description_, defaults to Depends(get_async_db)
+    :type db: AsyncSession, optional
+    :param current_user: _description_, defaults to Depends(auth.get_current_principal)
+    :type current_user: User, optional
+    :param cache: _description_, defaults to Depends(get_redis)
+    :type cache: _type_, optional
+    :return: _description_
+    :rtype: _type_
+    """
+    deleted = await repository_contacts.delete_many(body.ids, current_user.id, db, cache)  # type: ignore
+    return batch_results(body.ids, dict.fromkeys(deleted, True))
+
+
 @router.put("/{contact_id}", response_model=ContactResponse)
 async def update_contact(
     body: ContactModel,
     contact_id: int = Path(ge=1),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_principal),
+    cache=Depends(get_redis),
 ):
     """Route update_contact
 
@@ -200,15 +660,22 @@ async def update_contact(
     :type body: ContactModel
     :param contact_id: _description_, defaults to Path(ge=1)
     :type contact_id: int, optional
-    :param db: _description_, defaults to Depends(get_db)
-    :type db: Session, optional
-    :param current_user: _description_, defaults to Depends(auth.get_current_user)
+    :param db: _description_, defaults to Depends(get_async_db)
+    :type db: AsyncSession, optional
+    :param current_user: _description_, defaults to Depends(auth.get_current_principal)
     :type current_user: User, optional
+    :param cache: _description_, defaults to Depends(get_redis)
+    :type cache: _type_, optional
+    :raises HTTPException: _description_
     :raises HTTPException: _description_
     :return: _description_
     :rtype: _type_
     """
-    contact = await repository_contacts.update(contact_id, body, current_user.id, db)  # type: ignore
+    try:
+        contact = await repository_contacts.update(contact_id, body, current_user.id, db, cache)  # type: ignore
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Email is exist!")
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
     return contact
@@ -218,8 +685,9 @@ async def update_contact(
 async def favorite_update(
     body: ContactFavoriteModel,
     contact_id: int = Path(ge=1),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_principal),
+    cache=Depends(get_redis),
 ):
     """Route favorite_update
 
@@ -227,15 +695,17 @@ async def favorite_update(
     :type body: ContactFavoriteModel
     :param contact_id: _description_, defaults to Path(ge=1)
     :type contact_id: int, optional
-    :param db: _description_, defaults to Depends(get_db)
-    :type db: Session, optional
-    :param current_user: _description_, defaults to Depends(auth.get_current_user)
+    :param db: _description_, defaults to Depends(get_async_db)
+    :type db: AsyncSession, optional
+    :param current_user: _description_, defaults to Depends(auth.get_current_principal)
     :type current_user: User, optional
+    :param cache: _description_, defaults to Depends(get_redis)
+    :type cache: _type_, optional
     :raises HTTPException: _description_
     :return: _description_
     :rtype: _type_
     """
-    contact = await repository_contacts.favorite_update(contact_id, body, current_user.id, db)  # type: ignore
+    contact = await repository_contacts.favorite_update(contact_id, body, current_user.id, db, cache)  # type: ignore
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
     return contact
@@ -248,22 +718,25 @@ async def favorite_update(
 )
 async def remove_contact(
     contact_id: int = Path(ge=1),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_principal),
+    cache=Depends(get_redis),
 ):
     """Route remove_contact
 
     :param contact_id: _description_, defaults to Path(ge=1)
     :type contact_id: int, optional
-    :param db: _description_, defaults to Depends(get_db)
-    :type db: Session, optional
-    :param current_user: _description_, defaults to Depends(auth.get_current_user)
+    :param db: _description_, defaults to Depends(get_async_db)
+    :type db: AsyncSession, optional
+    :param current_user: _description_, defaults to Depends(auth.get_current_principal)
     :type current_user: User, optional
+    :param cache: _description_, defaults to Depends(get_redis)
+    :type cache: _type_, optional
     :raises HTTPException: _description_
     :return: _description_
     :rtype: _type_
     """
-    contact = await repository_contacts.delete(contact_id, current_user.id, db)  # type: ignore
+    contact = await repository_contacts.delete(contact_id, current_user.id, db, cache)  # type: ignore
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
     return None
@@ -1,9 +1,9 @@
 import logging
 from fastapi import APIRouter, Depends, status, UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
-from src.database.db import get_db, get_redis
+from src.database.db import get_async_db, get_redis
 from src.database.models import User
 from src.repository import users as repository_users
 from src.routes.auth import get_current_user
@@ -30,7 +30,10 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
 
 @router.patch("/avatar", response_model=UserResponse, response_model_exclude_unset=True)
 async def update_avatar_user(
-    file: UploadFile = File(), current_user: User = Depends(get_current_user), db: Session = Depends(get_db), cache = Depends(get_redis)
+    file: UploadFile = File(),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    cache=Depends(get_redis),
 ):
     """Route  Users  update_avatar_user
 
@@ -38,8 +41,8 @@ async def update_avatar_user(
     :type file: UploadFile, optional
     :param current_user: _description_, defaults to Depends(get_current_user)
     :type current_user: User, optional
-    :param db: _description_, defaults to Depends(get_db)
-    :type db: Session, optional
+    :param db: _description_, defaults to Depends(get_async_db)
+    :type db: AsyncSession, optional
     :param cache: _description_, defaults to Depends(get_redis)
     :type cache: _type_, optional
     :return: _description_
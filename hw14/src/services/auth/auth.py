@@ -17,12 +17,28 @@ class Auth(AuthToken):
     token_response_model = None  #AccessTokenRefreshResponse
 
     # constructor
-    def __init__(self, secret_key: str, algorithm: str | None = None, token_url: str = "/api/auth/login") -> None:
+    def __init__(
+        self,
+        secret_key: str,
+        algorithm: str | None = None,
+        token_url: str = "/api/auth/login",
+        claims_expire: float | None = None,
+        password_workers: int = 2,
+        password_queue: int = 64,
+        token_cache_size: int = 10000,
+    ) -> None:
         assert secret_key, "MISSED SECRET_KEY"
         self.auth_scheme = OAuth2PasswordBearer(tokenUrl=token_url)
         self.auth_response_model = OAuth2PasswordRequestForm
         self.token_response_model = AccessTokenRefreshResponse
-        super().__init__(secret_key=secret_key, algorithm=algorithm)
+        super().__init__(
+            secret_key=secret_key,
+            algorithm=algorithm,
+            claims_expire=claims_expire,
+            password_workers=password_workers,
+            password_queue=password_queue,
+            token_cache_size=token_cache_size,
+        )
 
     # define a function to generate a new refresh token
     def create_refresh_token(
@@ -38,12 +54,11 @@ class Auth(AuthToken):
         encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_refresh_token, expire
 
-    def decode_refresh_token(self, refresh_token: str):
+    def decode_refresh_claims(self, refresh_token: str) -> dict[str, Any]:
         try:
             payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
             if payload["scope"] == "refresh_token":
-                email = payload["sub"]
-                return email
+                return payload
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid scope for token",
@@ -54,6 +69,9 @@ class Auth(AuthToken):
                 detail="Could not validate credentials",
             )
 
+    def decode_refresh_token(self, refresh_token: str):
+        return self.decode_refresh_claims(refresh_token)["sub"]
+
     def create_email_token(self, data: dict, expires_delta: Optional[float] = None) -> str | None:
         to_encode = data.copy()
         if expires_delta:
@@ -95,5 +113,11 @@ class Auth(AuthToken):
 
 
 auth_service = Auth(
-    secret_key=settings.token_secret_key, algorithm=settings.token_algorithm, token_url="/api/auth/login"
+    secret_key=settings.token_secret_key,
+    algorithm=settings.token_algorithm,
+    token_url="/api/auth/login",
+    claims_expire=settings.token_claims_seconds if settings.token_claims else None,
+    password_workers=settings.password_workers,
+    password_queue=settings.password_queue,
+    token_cache_size=settings.token_cache_size,
 )
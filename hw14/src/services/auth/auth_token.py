@@ -1,16 +1,38 @@
+import asyncio
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 
+from src.services.local_cache import TTLCache
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+class PasswordPoolBusy(Exception):
+    """Queue of password hashing is full"""
+
 
 class PassCrypt:
     pwd_context: CryptContext
 
-    def __init__(self, scheme: str = "bcrypt") -> None:
+    def __init__(self, scheme: str = "bcrypt", workers: int = 2, max_queue: int = 64) -> None:
+        """
+        :param workers: Threads of hashing, bcrypt releases GIL, so they run in parallel with event loop
+        :param max_queue: Maximum number of hashing operations waiting for free thread
+        """
         self.pwd_context = CryptContext(schemes=[scheme], deprecated="auto")
         # print("init PassCrypt ", scheme, self.pwd_context)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="passcrypt")
 
     def verify_password(self, plain_password, hashed_password):
         return self.pwd_context.verify(plain_password, hashed_password)
@@ -18,36 +40,113 @@ class PassCrypt:
     def get_password_hash(self, password: str):
         return self.pwd_context.hash(password)
 
+    async def run_in_pool(self, func: Callable, *args) -> Any:
+        """Runs hashing in pool of threads, event loop is not blocked
+
+        :raises PasswordPoolBusy: If all threads are busy and queue is full
+        :return: Result of func
+        :rtype: Any
+        """
+        if self.pending >= self.workers + self.max_queue:
+            raise PasswordPoolBusy(f"{self.pending} password operations are queued or in flight")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def a_verify_password(self, plain_password, hashed_password) -> bool:
+        return await self.run_in_pool(self.verify_password, plain_password, hashed_password)
+
+    async def a_get_password_hash(self, password: str) -> str:
+        return await self.run_in_pool(self.get_password_hash, password)
+
+    def get_pool_status(self) -> dict:
+        """Live statistics of pool of password hashing
+
+        :return: Number of threads, operations in flight and queued, limit of queue
+        :rtype: dict
+        """
+        in_flight = min(self.pending, self.workers)
+        return {
+            "workers": self.workers,
+            "in_flight": in_flight,
+            "queued": self.pending - in_flight,
+            "max_queue": self.max_queue,
+        }
+
 
 class AuthToken(PassCrypt):
     SECRET_KEY: str
     ALGORITHM: str
+    CLAIMS_EXPIRE: float | None
 
     # constructor
-    def __init__(self, secret_key: str | None = None, algorithm: str | None = None) -> None:
+    def __init__(
+        self,
+        secret_key: str | None = None,
+        algorithm: str | None = None,
+        claims_expire: float | None = None,
+        password_workers: int = 2,
+        password_queue: int = 64,
+        token_cache_size: int = 10000,
+    ) -> None:
+        """
+        :param claims_expire: Seconds of life of access token with claims of user, None to not embed claims
+        :param token_cache_size: Number of verified access tokens kept in memory, 0 to verify every time
+        """
         assert secret_key, "MISSED SECRET_KEY"
         self.SECRET_KEY: str = str(secret_key)
         self.ALGORITHM: str = str(algorithm or "HS256")
         assert self.ALGORITHM, "MISSED ALGORITHM"
-        super().__init__()
+        self.CLAIMS_EXPIRE = claims_expire
+        # entries expire with tokens, ttl of cache only bounds clock skew
+        self.verified_tokens = TTLCache(token_cache_size, ttl=24 * 60 * 60)
+        super().__init__(workers=password_workers, max_queue=password_queue)
 
     # JWT operation
     def encode_jwt(self, to_encode) -> str:
         return jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
 
-    def decode_jwt(self, token) -> str | None:
+    def verify_access_token(self, token: str | None) -> dict[str, Any] | None:
+        """Verified payload of access token, memoized by digest of token until the token expires
+
+        :param token: Access token
+        :type token: str | None
+        :return: Payload or None if token is invalid, expired or is not access token
+        :rtype: dict[str, Any] | None
+        """
+        if not token:
+            return None
+        key = token_digest(token)
+        payload = self.verified_tokens.get(key)
+        if payload is not None:
+            return payload
         try:
-            # Decode JWT
             payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload["scope"] == "access_token":
-                email = payload["sub"]
-                return email
-        except JWTError as e:
+        except JWTError:
             return None
+        if payload.get("scope") != "access_token":
+            return None
+        if "exp" in payload:
+            self.verified_tokens.set(key, payload, ttl=payload["exp"] - time.time())
+        return payload
+
+    def decode_jwt(self, token) -> str | None:
+        payload = self.verify_access_token(token)
+        if payload:
+            return payload["sub"]
+        return None
 
     # define a function to generate a new access token
-    def create_access_token(self, data: dict[str, Any], expires_delta: Optional[float] = None) -> tuple[str, datetime]:
+    def create_access_token(
+        self, data: dict[str, Any], expires_delta: Optional[float] = None, user: Any = None
+    ) -> tuple[str, datetime]:
         to_encode = data.copy()
+        if user is not None and self.CLAIMS_EXPIRE:
+            # claims authorize requests without lookup of user, so they are not older than CLAIMS_EXPIRE
+            to_encode.update({"uid": user.id, "role": user.role.value, "confirmed": bool(user.confirmed)})
+            expires_delta = min(expires_delta or self.CLAIMS_EXPIRE, self.CLAIMS_EXPIRE)
         if expires_delta:
             timed: timedelta = timedelta(seconds=expires_delta)
         else:
@@ -62,12 +161,18 @@ class AuthToken(PassCrypt):
         encoded_access_token = self.encode_jwt(to_encode)
         return encoded_access_token, expire
 
+    def decode_access_claims(self, access_token: str | None) -> dict[str, Any] | None:
+        """Verified payload of access token with claims of user
+
+        :param access_token: Access token
+        :type access_token: str | None
+        :return: Payload with sub, uid, role and confirmed or None if token is invalid or has no claims
+        :rtype: dict[str, Any] | None
+        """
+        payload = self.verify_access_token(access_token)
+        if payload and "uid" in payload:
+            return payload
+        return None
+
     def decode_access_token(self, access_token: str) -> str | None:
-        try:
-            payload = jwt.decode(access_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload["scope"] == "access_token":
-                email = payload["sub"]
-                return email
-            return None
-        except JWTError:
-            return None
+        return self.decode_jwt(access_token)
@@ -0,0 +1,46 @@
+import ipaddress
+
+from fastapi import Request
+
+from src.conf.config import settings
+
+
+def is_trusted_proxy(host: str) -> bool:
+    """Checks host by settings.forwarded_allow_ips: comma separated addresses, networks or host names, "*" for any
+
+    :param host: Address of peer
+    :type host: str
+    :return: True if host is trusted proxy
+    :rtype: bool
+    """
+    for allowed in settings.forwarded_allow_ips.split(","):
+        allowed = allowed.strip()
+        if allowed == "*" or allowed == host:
+            return True
+        try:
+            if ipaddress.ip_address(host) in ipaddress.ip_network(allowed, strict=False):
+                return True
+        except ValueError:
+            continue
+    return False
+
+
+def client_ip(request: Request) -> str:
+    """IP address of client. X-Forwarded-For is read only when request comes from trusted proxy,
+    addresses are taken from the right and the first one that is not trusted proxy is the client.
+    Otherwise any client could choose its own address in the header.
+
+    :param request: Request
+    :type request: Request
+    :return: IP address of client
+    :rtype: str
+    """
+    ip = request.client.host if request.client else "unknown"
+    if not is_trusted_proxy(ip):
+        return ip
+    forwarded = [host.strip() for host in request.headers.get("X-Forwarded-For", "").split(",") if host.strip()]
+    for host in reversed(forwarded):
+        ip = host
+        if not is_trusted_proxy(host):
+            break
+    return ip
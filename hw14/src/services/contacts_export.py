@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+from datetime import date
+from typing import AsyncIterable, AsyncIterator
+
+from src.shemas.contact import ContactModel
+
+# Columns of export, the same as fields of import, so export file can be imported back
+EXPORT_FIELDS = list(ContactModel.model_fields)
+
+# Size of chunk of response body, characters
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "vcf": "text/vcard; charset=utf-8",
+}
+
+
+def to_ndjson(row: dict) -> str:
+    """Contact as line of NDJSON
+
+    :param row: Values of EXPORT_FIELDS
+    :type row: dict
+    :return: JSON object and line break
+    :rtype: str
+    """
+    return json.dumps(row, ensure_ascii=False, default=str) + "\n"
+
+
+def to_csv(values: list) -> str:
+    """Values as line of CSV
+
+    :param values: Values of line
+    :type values: list
+    :return: CSV line with line break
+    :rtype: str
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(["" if value is None else value for value in values])
+    return buffer.getvalue()
+
+
+def vcard_escape(value) -> str:
+    """Escapes text value of vCard property (RFC 6350)
+
+    :param value: Value
+    :type value: Any
+    :return: Escaped text
+    :rtype: str
+    """
+    text = "" if value is None else str(value)
+    text = text.replace("\\", "\\\\").replace(",", "\\,").replace(";", "\\;")
+    return text.replace("\r\n", "\n").replace("\n", "\\n")
+
+
+def to_vcard(row: dict) -> str:
+    """Contact as vCard 3.0
+
+    :param row: Values of EXPORT_FIELDS
+    :type row: dict
+    :return: vCard with CRLF line breaks
+    :rtype: str
+    """
+    first_name, last_name = vcard_escape(row["first_name"]), vcard_escape(row["last_name"])
+    lines = [
+        "BEGIN:VCARD",
+        "VERSION:3.0",
+        f"N:{last_name};{first_name};;;",
+        f"FN:{' '.join(name for name in (first_name, last_name) if name)}",
+        f"EMAIL;TYPE=INTERNET:{vcard_escape(row['email'])}",
+    ]
+    if row["phone"]:
+        lines.append(f"TEL;TYPE=VOICE:{vcard_escape(row['phone'])}")
+    if isinstance(row["birthday"], date):
+        lines.append(f"BDAY:{row['birthday'].isoformat()}")
+    if row["comments"]:
+        lines.append(f"NOTE:{vcard_escape(row['comments'])}")
+    lines.append("END:VCARD")
+    return "\r\n".join(lines) + "\r\n"
+
+
+async def export_lines(rows: AsyncIterable[dict], export_format: str) -> AsyncIterator[bytes]:
+    """Encodes streamed contacts to the format of export, lines are sent by chunks of EXPORT_CHUNK_SIZE
+
+    :param rows: Contacts as dicts of EXPORT_FIELDS
+    :type rows: AsyncIterable[dict]
+    :param export_format: "ndjson", "csv" or "vcf"
+    :type export_format: str
+    :return: Chunks of response body
+    :rtype: AsyncIterator[bytes]
+    """
+    lines, size = [], 0
+    if export_format == "csv":
+        lines.append(to_csv(EXPORT_FIELDS))
+    async for row in rows:
+        if export_format == "csv":
+            line = to_csv([row[name] for name in EXPORT_FIELDS])
+        elif export_format == "vcf":
+            line = to_vcard(row)
+        else:
+            line = to_ndjson(row)
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield "".join(lines).encode("utf-8")
+            lines, size = [], 0
+    if lines:
+        yield "".join(lines).encode("utf-8")
@@ -0,0 +1,257 @@
+from collections import deque
+import csv
+import json
+from typing import AsyncIterable, AsyncIterator, Iterator
+
+from pydantic import ValidationError
+
+from src.shemas.contact import ContactModel
+
+# Rows validated and inserted by one statement
+IMPORT_CHUNK_SIZE = 1000
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json-lines")
+CSV_MEDIA_TYPES = ("text/csv", "application/csv")
+
+# Bytes of line of NDJSON, characters of record of CSV
+IMPORT_MAX_LINE = 65536
+
+INVALID_ENCODING = "Expected UTF-8 encoding"
+LINE_TOO_LONG = f"Line is longer than {IMPORT_MAX_LINE} bytes"
+UNTERMINATED_QUOTE = "Unterminated quoted value"
+
+
+def import_format(content_type: str | None) -> str | None:
+    """Format of import by Content-Type header
+
+    :param content_type: Value of Content-Type header
+    :type content_type: str | None
+    :return: "ndjson", "csv" or None for unsupported media type
+    :rtype: str | None
+    """
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in NDJSON_MEDIA_TYPES:
+        return "ndjson"
+    if media_type in CSV_MEDIA_TYPES:
+        return "csv"
+    return None
+
+
+def decode_line(line: bytes) -> tuple[str | None, str | None]:
+    """Decodes line of body as UTF-8, byte order mark is skipped
+
+    :param line: Line without line break
+    :type line: bytes
+    :return: Text of line or None, error or None
+    :rtype: tuple[str | None, str | None]
+    """
+    if len(line) > IMPORT_MAX_LINE:
+        return None, LINE_TOO_LONG
+    try:
+        return line.rstrip(b"\r").decode("utf-8-sig"), None
+    except UnicodeDecodeError:
+        return None, INVALID_ENCODING
+
+
+async def iter_lines(stream: AsyncIterable[bytes]) -> AsyncIterator[tuple[str | None, str | None]]:
+    """Splits streamed body to lines, at most IMPORT_MAX_LINE bytes of the current line are kept in memory.
+    Longer line and line that is not valid UTF-8 are errors of their rows, and import goes on from the next line.
+
+    :param stream: Chunks of body
+    :type stream: AsyncIterable[bytes]
+    :return: Lines without line breaks or None, error or None
+    :rtype: AsyncIterator[tuple[str | None, str | None]]
+    """
+    tail = b""
+    # the rest of too long line is skipped up to the next line break
+    skip = False
+    async for chunk in stream:
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            if skip:
+                skip = False
+                continue
+            yield decode_line(line)
+        if len(tail) > IMPORT_MAX_LINE:
+            if not skip:
+                yield None, LINE_TOO_LONG
+            tail, skip = b"", True
+    if tail and not skip:
+        yield decode_line(tail)
+
+
+async def iter_ndjson(
+    lines: AsyncIterable[tuple[str | None, str | None]]
+) -> AsyncIterator[tuple[int, dict | None, str | None]]:
+    """Parses NDJSON, one contact object per line, empty lines are skipped
+
+    :param lines: Lines of body or errors of lines, from iter_lines
+    :type lines: AsyncIterable[tuple[str | None, str | None]]
+    :return: Row number, data of row or None, parse error or None
+    :rtype: AsyncIterator[tuple[int, dict | None, str | None]]
+    """
+    row = 0
+    async for line, error in lines:
+        if line is None:
+            row += 1
+            yield row, None, error
+            continue
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            data = json.loads(line)
+        except ValueError as err:
+            yield row, None, f"Invalid JSON: {err}"
+            continue
+        if not isinstance(data, dict):
+            yield row, None, "Invalid JSON: object expected"
+            continue
+        yield row, data, None
+
+
+class CsvRecords:
+    """Joins lines of CSV to records, quoted values may contain line breaks.
+    Record with unterminated quoted value is limited by IMPORT_MAX_LINE characters: then its first line is error
+    and the next lines are joined again, so a stray quote costs one row, not the rest of file.
+    """
+
+    def __init__(self, max_size: int = IMPORT_MAX_LINE) -> None:
+        self.max_size = max_size
+        self.lines: list[str] = []
+        self.size = 0
+        self.quotes = 0
+
+    def clear(self) -> list[str]:
+        lines = self.lines
+        self.lines, self.size, self.quotes = [], 0, 0
+        return lines
+
+    def feed(self, line: str) -> Iterator[str | None]:
+        """Adds line to the current record
+
+        :param line: Line without line break
+        :type line: str
+        :return: Complete records, None for record with unterminated quoted value
+        :rtype: Iterator[str | None]
+        """
+        pending = deque([line])
+        while pending:
+            line = pending.popleft()
+            self.lines.append(line)
+            self.size += len(line) + 1
+            self.quotes += line.count('"')
+            # line break inside quoted value: odd number of quotes so far
+            if not self.quotes % 2:
+                yield "\n".join(self.clear())
+            elif self.size > self.max_size:
+                yield None
+                pending.extendleft(reversed(self.clear()[1:]))
+
+    def finish(self) -> Iterator[str | None]:
+        """Ends body, unterminated record is error of its first line
+
+        :return: Complete records, None for record with unterminated quoted value
+        :rtype: Iterator[str | None]
+        """
+        while self.lines:
+            yield None
+            for line in self.clear()[1:]:
+                yield from self.feed(line)
+
+
+async def iter_csv(
+    lines: AsyncIterable[tuple[str | None, str | None]]
+) -> AsyncIterator[tuple[int, dict | None, str | None]]:
+    """Parses CSV with header line, quoted values may contain line breaks, empty values are None
+
+    :param lines: Lines of body or errors of lines, from iter_lines
+    :type lines: AsyncIterable[tuple[str | None, str | None]]
+    :return: Row number, data of row or None, parse error or None
+    :rtype: AsyncIterator[tuple[int, dict | None, str | None]]
+    """
+    header = None
+    row = 0
+    records = CsvRecords()
+
+    def parse(text: str | None) -> tuple[int, dict | None, str | None] | None:
+        nonlocal header, row
+        if text is not None and not text.strip():
+            return None
+        if header is None:
+            if text is None:
+                return 1, None, f"{UNTERMINATED_QUOTE} in header"
+            header = [name.strip() for name in next(csv.reader([text]))]
+            return None
+        row += 1
+        if text is None:
+            return row, None, UNTERMINATED_QUOTE
+        values = next(csv.reader([text]))
+        if len(values) != len(header):
+            return row, None, f"Expected {len(header)} values, got {len(values)}"
+        return row, {name: value if value != "" else None for name, value in zip(header, values)}, None
+
+    async for line, error in lines:
+        if line is None:
+            if header is None:
+                yield 1, None, f"{error} in header"
+                return
+            # quotes of the line are unknown, the record ends with it
+            records.clear()
+            row += 1
+            yield row, None, error
+            continue
+        for text in records.feed(line):
+            result = parse(text)
+            if result:
+                yield result
+                if header is None:
+                    return
+    for text in records.finish():
+        result = parse(text)
+        if result:
+            yield result
+            if header is None:
+                return
+
+
+def validate_row(data: dict) -> tuple[ContactModel | None, str | None]:
+    """Validates data of row by ContactModel
+
+    :param data: Data of row
+    :type data: dict
+    :return: Contact or None, error or None
+    :rtype: tuple[ContactModel | None, str | None]
+    """
+    try:
+        return ContactModel.model_validate(data), None
+    except ValidationError as err:
+        return None, "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in err.errors())
+
+
+async def iter_chunks(
+    rows: AsyncIterable[tuple[int, dict | None, str | None]], size: int = IMPORT_CHUNK_SIZE
+) -> AsyncIterator[tuple[list[tuple[int, ContactModel]], list[tuple[int, str]]]]:
+    """Validates parsed rows and groups them to chunks
+
+    :param rows: Parsed rows from iter_ndjson or iter_csv
+    :type rows: AsyncIterable[tuple[int, dict | None, str | None]]
+    :param size: Maximum number of valid contacts in chunk, defaults to IMPORT_CHUNK_SIZE
+    :type size: int, optional
+    :return: Valid contacts with row numbers, errors with row numbers
+    :rtype: AsyncIterator[tuple[list[tuple[int, ContactModel]], list[tuple[int, str]]]]
+    """
+    contacts, errors = [], []
+    async for row, data, error in rows:
+        if data is not None:
+            contact, error = validate_row(data)
+            if contact:
+                contacts.append((row, contact))
+        if error:
+            errors.append((row, error))
+        if len(contacts) >= size:
+            yield contacts, errors
+            contacts, errors = [], []
+    if contacts or errors:
+        yield contacts, errors
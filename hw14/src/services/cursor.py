@@ -0,0 +1,31 @@
+import base64
+import json
+
+
+def encode_cursor(**keys) -> str:
+    """Builds opaque cursor for keyset pagination from the sort keys of the last row of page
+
+    :return: Opaque url safe cursor, i.e. encode_cursor(id=15)
+    :rtype: str
+    """
+    data = json.dumps(keys, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Restores sort keys from opaque cursor
+
+    :param cursor: Cursor from encode_cursor
+    :type cursor: str
+    :raises ValueError: Cursor is damaged
+    :return: Sort keys of the last row of previous page
+    :rtype: dict
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        keys = json.loads(data)
+    except (ValueError, TypeError) as err:
+        raise ValueError(f"Invalid cursor: {err}")
+    if not isinstance(keys, dict):
+        raise ValueError("Invalid cursor")
+    return keys
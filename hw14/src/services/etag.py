@@ -0,0 +1,42 @@
+import hashlib
+
+from fastapi import Response, status
+
+
+def make_etag(*parts) -> str:
+    """Weak ETag from parts of representation, i.e. version of data and parameters of request
+
+    :return: Weak ETag, i.e. W/"3f2a9c0d1b7e6a54"
+    :rtype: str
+    """
+    digest = hashlib.blake2b("\x1f".join(map(str, parts)).encode("utf-8"), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison of ETag with header If-None-Match (RFC 9110)
+
+    :param if_none_match: Value of header If-None-Match, list of ETags or "*"
+    :type if_none_match: str | None
+    :param etag: Current ETag
+    :type etag: str
+    :return: True if client has the current representation
+    :rtype: bool
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    """Response 304 Not Modified without body
+
+    :param etag: Current ETag
+    :type etag: str
+    :return: Response
+    :rtype: Response
+    """
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
@@ -0,0 +1,73 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class TTLCache:
+    """Bounded in-process LRU cache, entries expire after ttl seconds
+
+    The cache is used only while enabled, i.e. while invalidation messages from other workers are received.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, enabled: bool = True) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any | None:
+        """Value by key, the most recently used keys are evicted last
+
+        :param key: Key
+        :type key: Hashable
+        :return: Value or None if not found, expired or cache is disabled
+        :rtype: Any | None
+        """
+        if not self.enabled:
+            return None
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expire, value = item
+        if expire <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """Stores value, the least recently used key is evicted when cache is full
+
+        :param key: Key
+        :type key: Hashable
+        :param value: Value
+        :type value: Any
+        :param ttl: Seconds to keep this value if less than ttl of cache, defaults to None
+        :type ttl: float | None, optional
+        """
+        if not self.enabled or self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Any | None:
+        """Removes key
+
+        :param key: Key
+        :type key: Hashable
+        :return: Removed value or None
+        :rtype: Any | None
+        """
+        item = self._data.pop(key, None)
+        return item[1] if item else None
+
+    def clear(self) -> None:
+        self._data.clear()
@@ -0,0 +1,120 @@
+import logging
+import math
+import time
+
+from fastapi import Depends, HTTPException, Request, status
+
+from src.conf.config import settings
+from src.database.db import get_redis
+from src.services.client_ip import client_ip
+from src.services.local_cache import TTLCache
+
+logger = logging.getLogger(f"{settings.app_name}.{__name__}")
+
+# GCRA: key keeps theoretical arrival time (TAT) of the next request in milliseconds of Redis clock.
+# Result: 0 if request is allowed, otherwise milliseconds to wait
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+local retry_after = tat - burst - now
+if retry_after > 0 then
+    return math.ceil(retry_after)
+end
+redis.call('SET', KEYS[1], tat + interval, 'PX', math.ceil(tat + interval - now))
+return 0
+"""
+
+
+def client_key(request: Request) -> str:
+    """Client IP and path of request
+
+    :param request: Request
+    :type request: Request
+    :return: Identifier of client
+    :rtype: str
+    """
+    return f"{client_ip(request)}:{request.scope['path']}"
+
+
+class RateLimiter:
+    """Dependency that allows `times` requests per `seconds` for client, by one atomic call of Redis (GCRA).
+
+    In-process token bucket with the same rate rejects client without call of Redis, when this worker alone
+    has seen more requests than the limit, or Redis has rejected client and retry time has not passed.
+    """
+
+    def __init__(self, times: int, seconds: float, local_size: int = 10000) -> None:
+        self.times = times
+        self.period = seconds * 1000
+        self.interval = self.period / times
+        self.burst = self.period - self.interval
+        # bucket that is not used for a period is full, so it may be evicted
+        self.buckets = TTLCache(local_size, ttl=seconds)
+
+    def local_check(self, key: str) -> float:
+        """Takes token from in-process bucket of client
+
+        :param key: Identifier of client
+        :type key: str
+        :return: 0 if request may be allowed, otherwise milliseconds to wait
+        :rtype: float
+        """
+        now = time.monotonic() * 1000
+        tokens, updated, blocked = self.buckets.get(key) or (self.times, now, 0)
+        if now < blocked:
+            return blocked - now
+        tokens = min(self.times, tokens + (now - updated) / self.interval)
+        if tokens < 1:
+            self.buckets.set(key, (tokens, now, 0))
+            return (1 - tokens) * self.interval
+        self.buckets.set(key, (tokens - 1, now, 0))
+        return 0
+
+    def local_block(self, key: str, retry_after: float) -> None:
+        """Rejects client without call of Redis until retry time
+
+        :param key: Identifier of client
+        :type key: str
+        :param retry_after: Milliseconds to wait
+        :type retry_after: float
+        """
+        now = time.monotonic() * 1000
+        self.buckets.set(key, (0, now, now + retry_after))
+
+    async def redis_check(self, key: str, cache=None) -> float:
+        """Checks limit of client across all workers
+
+        :param key: Identifier of client
+        :type key: str
+        :param cache: cache service, defaults to None
+        :type cache: cache service connection like redis, optional
+        :return: 0 if request is allowed, otherwise milliseconds to wait
+        :rtype: float
+        """
+        if not cache:
+            return 0
+        try:
+            return await cache.eval(GCRA_SCRIPT, 1, f"ratelimit:{key}", self.interval, self.burst)
+        except Exception as err:
+            logger.error(f"Error Redis rate limit {err}")
+            return 0
+
+    async def __call__(self, request: Request, cache=Depends(get_redis)) -> None:
+        key = client_key(request)
+        retry_after = self.local_check(key)
+        if not retry_after:
+            retry_after = await self.redis_check(key, cache)
+            if retry_after:
+                self.local_block(key, retry_after)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too Many Requests",
+                headers={"Retry-After": str(math.ceil(retry_after / 1000))},
+            )
@@ -14,7 +14,7 @@ class RoleAccess:
     def __init__(self, allowed_roles: List[Role]) -> None:
         self.allowed_roles = allowed_roles
 
-    async def __call__(self, request: Request, current_user: User = Depends(auth.get_current_user)) -> Any:
+    async def __call__(self, request: Request, current_user: User = Depends(auth.get_current_principal)) -> Any:
         logger.debug(f"{request.method=}, {request.url=}")
         if current_user:
             logger.debug(f"User role: {current_user.role}")
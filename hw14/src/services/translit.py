@@ -0,0 +1,47 @@
+import re
+import unicodedata
+
+# Ukrainian national transliteration (2010) with Russian letters, lower case
+CYRILLIC_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d", "е": "e", "є": "ie", "ж": "zh", "з": "z",
+    "и": "y", "і": "i", "ї": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p",
+    "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh",
+    "щ": "shch", "ь": "", "ю": "iu", "я": "ia", "ё": "io", "ъ": "", "ы": "y", "э": "e",
+}
+
+# Spelling variants of Latin names folded to one form: Kharkiv/Harkiv, Yuriy/Iurii, Oleksiy/Olexiy
+LATIN_FOLD = (("kh", "h"), ("x", "ks"), ("w", "v"), ("y", "i"), ("j", "i"))
+
+TRANSLIT_TABLE = str.maketrans(CYRILLIC_LATIN)
+
+
+def transliterate(text: str) -> str:
+    """Transliterates Cyrillic text to Latin, letters are lower case
+
+    :param text: Text in Cyrillic or Latin script
+    :type text: str
+    :return: Text in Latin script
+    :rtype: str
+    """
+    text = text.casefold().translate(TRANSLIT_TABLE)
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def search_key(text: str | None) -> str | None:
+    """Normalized search key of name, the same for Cyrillic and Latin spelling: "Тарас", "Taras" -> "taras"
+
+    :param text: Name
+    :type text: str | None
+    :return: Search key or None for empty name
+    :rtype: str | None
+    """
+    if not text:
+        return None
+    key = transliterate(text)
+    for variant, folded in LATIN_FOLD:
+        key = key.replace(variant, folded)
+    key = re.sub(r"[^a-z0-9 ]+", "", key)
+    key = re.sub(r"([a-z])\1+", r"\1", key)
+    key = " ".join(key.split())
+    return key or None
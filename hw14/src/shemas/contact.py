@@ -1,5 +1,7 @@
 from datetime import date, datetime
-from pydantic import BaseModel, ConfigDict, Field, EmailStr
+from typing import List
+
+from pydantic import BaseModel, ConfigDict, Field, EmailStr, field_validator
 
 # from src.database.models import User
 from src.shemas.users import UserResponse
@@ -39,6 +41,54 @@ class ContactFavoriteModel(BaseModel):
     # pattern=r"^+[0-9\s\(\)-]+$
 
 
+class ContactPatchModel(BaseModel):
+    """Item of batch update: id and only the fields to change"""
+
+    id: int = Field(ge=1)
+    first_name: str | None = Field(None, min_length=1, max_length=25)
+    last_name: str | None = Field(None, min_length=1, max_length=25)
+    email: EmailStr | None = None
+    phone: str | None = Field(None, max_length=25)
+    birthday: date | None = None
+    comments: str | None = None
+    favorite: bool | None = None
+
+    @field_validator("email", "favorite")
+    @classmethod
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError("may be omitted, but not null")
+        return value
+
+
+class ContactBatchIds(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=1000)
+
+
+class ContactBatchPatch(BaseModel):
+    items: List[ContactPatchModel] = Field(min_length=1, max_length=1000)
+
+
+class ContactAutocompleteResponse(BaseModel):
+    id: int
+    name: str
+
+
+class ContactImportError(BaseModel):
+    row: int
+    error: str
+
+
+class ContactImportResponse(BaseModel):
+    total: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    errors: int = 0
+    # row numbers of data (without CSV header), limited to the first rows
+    duplicate_rows: List[int] = []
+    error_rows: List[ContactImportError] = []
+
+
 class ContactResponse(BaseModel):
     id: int
     first_name: str | None
@@ -60,6 +110,13 @@ class ContactResponse(BaseModel):
     # email: str = Field(default="email@examole.com", pattern=r'^\w+@\w+\.\w+$')
 
 
+class ContactBatchResult(BaseModel):
+    id: int
+    # HTTP status of item: 200 or 404
+    status: int
+    contact: ContactResponse | None = None
+
+
 # class Contact(Base):
 #     """
 #     Ім'я
@@ -81,3 +138,13 @@ class ContactResponse(BaseModel):
 #     favorite = Column(Boolean, default=False)
 #     created_at = Column(DateTime, default=func.now())
 #     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class ContactChangesResponse(BaseModel):
+    # changed or created contacts
+    contacts: List[ContactResponse]
+    # IDs of removed contacts
+    deleted: List[int]
+    # token for the next request: the next page if more, else changes after this sync
+    next: str
+    more: bool
@@ -29,6 +29,25 @@ class UserResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class UserPrincipal(UserResponse):
+    """Authenticated user without ORM state, cached as compact JSON"""
+
+    confirmed: bool = False
+
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+
+class TokenPrincipal(BaseModel):
+    """Authenticated user from verified claims of access token"""
+
+    id: int
+    email: str
+    role: Role
+    confirmed: bool = False
+
+    model_config = ConfigDict(frozen=True)
+
+
 class UserDetailResponse(BaseModel):           
     detail: str
     user: UserResponse
\ No newline at end of file
@@ -53,12 +53,7 @@ async def get_fake_contacts():
         ]
 
 
-async def send_data_to_api() -> None:
-    headers = {
-        "content-type": "application/json",
-        "Authorization": f"Bearer {ACCESS_TOKEN}",
-    }
-    session = aiohttp.ClientSession()
+async def get_ndjson_body():
     async for first_name, last_name, email, phone, birthday, address, favorite in get_fake_contacts():
         data = {
             "first_name": first_name,
@@ -69,26 +64,31 @@ async def send_data_to_api() -> None:
             "address": address,
             "favorite": favorite,
         }
-        try:
-            # print(f"{data=}")
-            result = await session.post(
-                f"http://{settings.app_host}:{settings.app_port}/api/contacts",
-                headers=headers,
-                data=json.dumps(data),
+        yield (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def send_data_to_api() -> None:
+    headers = {
+        "content-type": "application/x-ndjson",
+        "Authorization": f"Bearer {ACCESS_TOKEN}",
+    }
+    session = aiohttp.ClientSession()
+    try:
+        # all contacts by one streamed request of bulk import
+        result = await session.post(
+            f"http://{settings.app_host}:{settings.app_port}/api/contacts/import",
+            headers=headers,
+            data=get_ndjson_body(),
+        )
+        if result.status == 200:
+            print(await result.json())
+        else:
+            print(
+                f"ERROR: {result.status=}, Try set token. Get token link "
+                f"http://{settings.app_host}:{settings.app_port}/api/auth/login"
             )
-            if result.status == 429:
-                print(f"ERROR: {result.status=}, sleep")
-                await asyncio.sleep(6)
-                print()
-            elif result.status != 201:
-                print(
-                    f"ERROR: {result.status=}, Try set token. Get token link "
-                    f"http://{settings.app_host}:{settings.app_port}/api/auth/login"
-                )
-                break
-        except aiohttp.ClientOSError as err:
-            print(f"Connection error: {str(err)}")
-            break
+    except aiohttp.ClientOSError as err:
+        print(f"Connection error: {str(err)}")
     await session.close()
     print("Done")
 
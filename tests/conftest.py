@@ -1,13 +1,16 @@
+import atexit
 from datetime import datetime
 import os
 from pathlib import Path
+import shutil
 import sys
-from unittest.mock import AsyncMock, MagicMock
+import tempfile
+from unittest.mock import MagicMock
 import pytest
 from fastapi.testclient import TestClient
-from fastapi_limiter.depends import RateLimiter
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 curr_path = Path(__file__).resolve().parent
 hw_path: str = str(curr_path.parent.joinpath("hw14"))
@@ -18,13 +21,19 @@ os.environ["PYTHONPATH"] += os.pathsep + hw_path
 
 from main import app, get_limit
 from src.database.models import Base
-from src.database.db import get_db, get_redis
+from src.database.db import get_async_db, get_redis
 
-db_path = curr_path / "test.sqlite"
+# database of test session is created in temporary directory, not in the source tree
+db_dir = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, db_dir, ignore_errors=True)
+db_path = Path(db_dir) / "test.sqlite"
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{db_path}"
+SQLALCHEMY_ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{db_path}"
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 
 @pytest.fixture(scope="module")
@@ -41,14 +50,6 @@ def session():
         db.close()
 
 
-@pytest.fixture()
-def mock_ratelimiter(monkeypatch):
-    mock_rate_limiter = AsyncMock()
-    monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", mock_rate_limiter)
-    monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", mock_rate_limiter)
-    monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", mock_rate_limiter)
-
-
 @pytest.fixture(scope="module")
 def client(session):
 
@@ -57,11 +58,9 @@ def client(session):
     class Empty:
         ...
 
-    def override_get_db():
-        try:
-            yield session
-        finally:
-            session.close()
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
 
     async def override_get_limit():
         return None
@@ -69,7 +68,7 @@ def client(session):
     async def override_get_redis():
         return None
     
-    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     app.dependency_overrides[get_redis] = override_get_redis
 
     yield TestClient(app)
@@ -1,4 +1,8 @@
+import base64
+import csv
 from datetime import datetime
+import io
+import json
 import os
 from pathlib import Path
 from unittest.mock import MagicMock, patch, AsyncMock
@@ -9,7 +13,8 @@ hw_path: str = str(Path(__file__).resolve().parent.parent.joinpath("hw14"))
 os.environ["PATH"] += os.pathsep + hw_path
 os.environ["PYTHONPATH"] += os.pathsep + hw_path
 
-from src.database.models import User
+from src.database.models import Contact, User
+from src.services.cursor import encode_cursor
 
 
 # class MockRedis:
@@ -58,9 +63,8 @@ def get_access_token_user(client, user):
 
 
 @pytest.fixture()
-def token(client, user, session, monkeypatch, mock_ratelimiter):
+def token(client, user, session, monkeypatch):
     """ get auth token foa all auth requests
-        mock_ratelimiter not used, but required in argumants for execute fixture before
     """
     # print(f"token {db.redis_pool=}")
     create_user(client, session, user, monkeypatch)
@@ -76,6 +80,14 @@ def test_create_contact(client, contact, token):
     assert "id" in data
 
 
+def test_create_contact_exist(client, contact, token):
+    response = client.post(
+        "/api/contacts", json={**contact, "email": contact["email"].upper()}, headers={"Authorization": token}
+    )
+    assert response.status_code == 409, response.text
+    assert response.json()["detail"] == "Email is exist!"
+
+
 # @patch("src.database.db.redis_pool", False)
 def test_get_contact(client, token, contact):
     # with patch("src.database.db.redis_pool", False):
@@ -106,6 +118,72 @@ def test_get_contacts(client, contact, token):
     assert "id" in data[0]
 
 
+def test_get_contacts_cursor(client, token):
+    response = client.get("/api/contacts", params={"cursor": encode_cursor(id=1)}, headers={"Authorization": token})
+    assert response.status_code == 200, response.text
+    assert response.json() == []
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_get_contacts_invalid_cursor(client, token):
+    response = client.get("/api/contacts", params={"cursor": "not a cursor"}, headers={"Authorization": token})
+    assert response.status_code == 400, response.text
+    data = response.json()
+    assert data["detail"] == "Invalid cursor"
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor",
+        base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+        base64.urlsafe_b64encode(b"[1]").decode(),
+        encode_cursor(key=1),
+        encode_cursor(id="x"),
+        encode_cursor(id=None),
+        encode_cursor(id=[1]),
+    ],
+)
+def test_get_after_id_invalid(cursor):
+    from fastapi import HTTPException
+    from src.routes.contacts import get_after_id
+
+    with pytest.raises(HTTPException) as err:
+        get_after_id(cursor)
+    assert err.value.status_code == 400 and err.value.detail == "Invalid cursor"
+
+
+def test_search_contacts(client, contact, token):
+    response = client.get("/api/contacts/search", params={"first_name": "AAA"}, headers={"Authorization": token})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert len(data) == 1
+    assert data[0]["first_name"] == contact.get("first_name")
+    response = client.get("/api/contacts/search", params={"last_name": "zzz"}, headers={"Authorization": token})
+    assert response.status_code == 200, response.text
+    assert response.json() == []
+
+
+def test_search_contacts_q(client, contact, token):
+    response = client.get("/api/contacts/search", params={"q": "aaaa bbb"}, headers={"Authorization": token})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert len(data) == 1
+    assert data[0]["email"] == contact.get("email")
+
+
+def test_autocomplete_contacts(client, token):
+    response = client.get("/api/contacts/autocomplete", params={"prefix": "BBB"}, headers={"Authorization": token})
+    assert response.status_code == 200, response.text
+    assert response.json() == [{"id": 1, "name": "aaaa bbbbb"}]
+
+
+def test_autocomplete_contacts_translit(client, token):
+    response = client.get("/api/contacts/autocomplete", params={"prefix": "ббб"}, headers={"Authorization": token})
+    assert response.status_code == 200, response.text
+    assert response.json() == [{"id": 1, "name": "aaaa bbbbb"}]
+
+
 # @patch("src.database.db.redis_pool", False)
 def test_update_contact(client, token):
     # with patch("src.database.db.redis_pool", False):
@@ -139,3 +217,395 @@ def test_repeat_delete_contact(client, token):
     assert response.status_code == 404, response.text
     data = response.json()
     assert data["detail"] == "Not found"
+
+
+def test_import_contacts_ndjson(client, token):
+    body = "\n".join(
+        [
+            '{"first_name": "imp1", "last_name": "imp", "email": "imp1@uu.cc", "birthday": "1990-03-01"}',
+            '{"first_name": "imp2", "last_name": "imp", "email": "IMP1@uu.cc"}',
+            '{"first_name": "imp3", "last_name": "imp", "email": "not-email"}',
+            "not json",
+            "",
+            '{"first_name": "imp4", "last_name": "imp", "email": "imp4@uu.cc"}',
+        ]
+    )
+    response = client.post(
+        "/api/contacts/import",
+        content=body.encode(),
+        headers={"Authorization": token, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert (data["total"], data["inserted"], data["duplicates"], data["errors"]) == (5, 2, 1, 2)
+    assert data["duplicate_rows"] == [2]
+    assert [error["row"] for error in data["error_rows"]] == [3, 4]
+
+
+def test_import_contacts_csv(client, token):
+    body = 'first_name,last_name,email,phone,comments\nimp5,imp,imp5@uu.cc,,"line1\nline2"\nimp6,imp,imp1@uu.cc,,\n'
+    response = client.post(
+        "/api/contacts/import", content=body.encode(), headers={"Authorization": token, "Content-Type": "text/csv"}
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert (data["total"], data["inserted"], data["duplicates"], data["errors"]) == (2, 1, 1, 0)
+    response = client.get("/api/contacts/search", params={"email": "imp5@"}, headers={"Authorization": token})
+    assert response.json()[0]["comments"] == "line1\nline2"
+    assert response.json()[0]["phone"] is None
+
+
+def test_import_contacts_unsupported(client, token):
+    response = client.post(
+        "/api/contacts/import", content=b"{}", headers={"Authorization": token, "Content-Type": "application/xml"}
+    )
+    assert response.status_code == 415, response.text
+
+
+def test_export_contacts_ndjson(client, token):
+    response = client.get("/api/contacts/export", headers={"Authorization": token})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    emails = [row["email"] for row in rows]
+    assert "imp1@uu.cc" in emails and "imp5@uu.cc" in emails
+    assert rows[emails.index("imp1@uu.cc")]["birthday"] == "1990-03-01"
+
+
+def test_export_contacts_csv(client, token):
+    response = client.get("/api/contacts/export", params={"format": "csv"}, headers={"Authorization": token})
+    assert response.status_code == 200, response.text
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert next(row for row in rows if row["email"] == "imp5@uu.cc")["comments"] == "line1\nline2"
+
+
+def test_export_contacts_vcard(client, token):
+    response = client.get("/api/contacts/export", params={"format": "vcf"}, headers={"Authorization": token})
+    assert response.status_code == 200, response.text
+    assert response.text.startswith("BEGIN:VCARD\r\nVERSION:3.0\r\n")
+    assert "NOTE:line1\\nline2\r\n" in response.text
+    assert "BDAY:1990-03-01\r\n" in response.text
+
+
+def test_export_contacts_invalid_format(client, token):
+    response = client.get("/api/contacts/export", params={"format": "xml"}, headers={"Authorization": token})
+    assert response.status_code == 422, response.text
+
+
+def test_contacts_batch(client, token):
+    response = client.get("/api/contacts/search", params={"email": "imp"}, headers={"Authorization": token})
+    ids = [contact["id"] for contact in response.json()][:2]
+    assert len(ids) == 2
+
+    response = client.post(
+        "/api/contacts/batch/get", json={"ids": ids + [999, ids[0]]}, headers={"Authorization": token}
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [(item["id"], item["status"]) for item in data] == [(ids[0], 200), (ids[1], 200), (999, 404)]
+    assert data[0]["contact"]["id"] == ids[0] and data[2]["contact"] is None
+
+    items = [{"id": ids[0], "favorite": True}, {"id": ids[1], "favorite": True, "first_name": "Тарас"}, {"id": 999}]
+    response = client.patch("/api/contacts/batch", json={"items": items}, headers={"Authorization": token})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [(item["id"], item["status"]) for item in data] == [(ids[0], 200), (ids[1], 200), (999, 404)]
+    assert data[0]["contact"]["favorite"] is True
+    assert data[1]["contact"]["first_name"] == "Тарас"
+    response = client.get("/api/contacts/autocomplete", params={"prefix": "taras"}, headers={"Authorization": token})
+    assert [item["id"] for item in response.json()] == [ids[1]]
+
+    response = client.patch(
+        "/api/contacts/batch", json={"items": [{"id": ids[0], "email": None}]}, headers={"Authorization": token}
+    )
+    assert response.status_code == 422, response.text
+
+    response = client.post("/api/contacts/batch/delete", json={"ids": ids + [999]}, headers={"Authorization": token})
+    assert response.status_code == 200, response.text
+    assert [(item["id"], item["status"]) for item in response.json()] == [(ids[0], 200), (ids[1], 200), (999, 404)]
+    response = client.post("/api/contacts/batch/get", json={"ids": ids}, headers={"Authorization": token})
+    assert [item["status"] for item in response.json()] == [404, 404]
+
+
+def test_contacts_changes(client, token):
+    response = client.get("/api/contacts/changes", headers={"Authorization": token})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["contacts"] and data["deleted"] == [] and data["more"] is False
+    next_token = data["next"]
+
+    response = client.post(
+        "/api/contacts",
+        json={"first_name": "sync", "last_name": "sync", "email": "sync@uu.cc"},
+        headers={"Authorization": token},
+    )
+    contact_id = response.json()["id"]
+    response = client.get("/api/contacts/changes", params={"since": next_token}, headers={"Authorization": token})
+    assert response.status_code == 200, response.text
+    assert contact_id in [contact["id"] for contact in response.json()["contacts"]]
+
+    client.delete(f"/api/contacts/{contact_id}", headers={"Authorization": token})
+    response = client.get("/api/contacts/changes", params={"since": next_token}, headers={"Authorization": token})
+    data = response.json()
+    assert contact_id not in [contact["id"] for contact in data["contacts"]]
+    assert contact_id in data["deleted"]
+
+
+def test_contacts_changes_pages(client, token):
+    response = client.get("/api/contacts/changes", params={"limit": 10}, headers={"Authorization": token})
+    contacts = response.json()["contacts"]
+    while response.json()["more"]:
+        response = client.get(
+            "/api/contacts/changes",
+            params={"since": response.json()["next"], "limit": 10},
+            headers={"Authorization": token},
+        )
+        contacts += response.json()["contacts"]
+    ids = [contact["id"] for contact in contacts]
+    assert ids == sorted(set(ids))
+
+
+def test_contacts_changes_invalid_token(client, token):
+    response = client.get("/api/contacts/changes", params={"since": "bad"}, headers={"Authorization": token})
+    assert response.status_code == 400, response.text
+    expired = encode_cursor(s="2000-01-01 00:00:00")
+    response = client.get("/api/contacts/changes", params={"since": expired}, headers={"Authorization": token})
+    assert response.status_code == 410, response.text
+
+
+def test_contacts_etag(client, token):
+    response = client.post(
+        "/api/contacts",
+        json={"first_name": "etag", "last_name": "etag", "email": "etag@uu.cc"},
+        headers={"Authorization": token},
+    )
+    contact_id = response.json()["id"]
+    response = client.get(f"/api/contacts/{contact_id}", headers={"Authorization": token})
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+    response = client.get(f"/api/contacts/{contact_id}", headers={"Authorization": token, "If-None-Match": etag})
+    assert response.status_code == 304, response.text
+    assert response.headers["ETag"] == etag and response.content == b""
+
+    response = client.get("/api/contacts", headers={"Authorization": token})
+    list_etag = response.headers["ETag"]
+    response = client.get("/api/contacts", headers={"Authorization": token, "If-None-Match": f'"other", {list_etag}'})
+    assert response.status_code == 304, response.text
+    response = client.get(
+        "/api/contacts", params={"favorite": True}, headers={"Authorization": token, "If-None-Match": list_etag}
+    )
+    assert response.status_code == 200, response.text
+
+    response = client.put(
+        f"/api/contacts/{contact_id}",
+        json={"first_name": "etag2", "last_name": "etag", "email": "etag@uu.cc"},
+        headers={"Authorization": token},
+    )
+    response = client.get(f"/api/contacts/{contact_id}", headers={"Authorization": token, "If-None-Match": etag})
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] != etag
+
+
+class FakePipeline:
+    def __init__(self, cache):
+        self.cache = cache
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def hset(self, *args, **kwargs):
+        self.commands.append((self.cache.hset, args, kwargs))
+
+    def expire(self, *args, **kwargs):
+        self.commands.append((self.cache.expire, args, kwargs))
+
+    async def execute(self):
+        return [await command(*args, **kwargs) for command, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.ttl = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        self.ttl[key] = ex
+        return True
+
+    async def hgetall(self, key):
+        return self.data.get(key, {})
+
+    async def hset(self, key, mapping):
+        self.data[key] = {
+            name.encode(): value.encode() if isinstance(value, str) else value for name, value in mapping.items()
+        }
+        return len(mapping)
+
+    async def expire(self, key, seconds):
+        self.ttl[key] = seconds
+        return True
+
+
+@pytest.fixture()
+def fake_redis():
+    from main import app
+    from src.database.db import get_redis
+
+    cache = FakeRedis()
+    override = app.dependency_overrides.get(get_redis)
+    app.dependency_overrides[get_redis] = lambda: cache
+    yield cache
+    app.dependency_overrides[get_redis] = override
+
+
+def test_contacts_cache(client, token, fake_redis, monkeypatch):
+    response = client.get("/api/contacts", headers={"Authorization": token})
+    assert response.status_code == 200, response.text
+    body, etag = response.json(), response.headers["ETag"]
+    cached = [value for key, value in fake_redis.data.items() if key.startswith("contacts:cache:")]
+    assert cached == [{b"body": response.content}]
+
+    async def not_called(*args, **kwargs):
+        raise AssertionError("database is not expected")
+
+    monkeypatch.setattr("src.repository.contacts.get_contacts", not_called)
+    response = client.get("/api/contacts", headers={"Authorization": token})
+    assert response.status_code == 200, response.text
+    assert response.json() == body and response.headers["ETag"] == etag
+    response = client.get("/api/contacts", headers={"Authorization": token, "If-None-Match": etag})
+    assert response.status_code == 304, response.text
+    monkeypatch.undo()
+
+    client.patch(f"/api/contacts/{body[0]['id']}/favorite", json={"favorite": True}, headers={"Authorization": token})
+    response = client.get("/api/contacts", headers={"Authorization": token, "If-None-Match": etag})
+    assert response.status_code == 200, response.text
+    assert response.json()[0]["favorite"] is True
+
+
+def test_contacts_cache_birthdays(client, token, fake_redis):
+    response = client.get("/api/contacts/search/birtdays", headers={"Authorization": token})
+    assert response.status_code == 200, response.text
+    ttls = [ttl for key, ttl in fake_redis.ttl.items() if key.startswith("contacts:cache:")]
+    assert len(ttls) == 1 and 0 < ttls[0] <= 86400
+
+
+def test_contacts_token_claims(client, user, token, monkeypatch):
+    from src.services.auth.auth import auth_service
+
+    monkeypatch.setattr(auth_service, "CLAIMS_EXPIRE", 300)
+    claims_token = get_access_token_user(client, user)
+    claims = auth_service.decode_access_claims(claims_token.removeprefix("Bearer "))
+    assert claims["sub"] == user["email"] and claims["role"] == "user" and claims["confirmed"] is True
+    assert claims["exp"] - claims["iat"] <= 300
+
+    async def not_called(*args, **kwargs):
+        raise AssertionError("lookup of user is not expected")
+
+    monkeypatch.setattr("src.repository.auth.a_get_current_user", not_called)
+    response = client.get("/api/contacts", headers={"Authorization": claims_token})
+    assert response.status_code == 200, response.text
+    assert all(contact["user"]["email"] == user["email"] for contact in response.json())
+
+
+def test_autocomplete_contacts_dotted_email(client, token):
+    body = {
+        "first_name": "John",
+        "last_name": "Smith",
+        "email": "john.smith@example.com",
+        "phone": "+380 (44) 1234567",
+    }
+    response = client.post("/api/contacts", json=body, headers={"Authorization": token})
+    assert response.status_code == 201, response.text
+    contact_id = response.json()["id"]
+    for prefix in ("john.s", "John.Smith@ex"):
+        response = client.get(
+            "/api/contacts/autocomplete", params={"prefix": prefix}, headers={"Authorization": token}
+        )
+        assert response.status_code == 200, response.text
+        assert [item["id"] for item in response.json()] == [contact_id]
+
+
+def test_import_contacts_invalid_encoding(client, token):
+    lines = [
+        json.dumps({"first_name": "enc1", "last_name": "enc", "email": "enc1@uu.cc", "phone": "1234567"}).encode(),
+        '{"first_name": "Ënc", "last_name": "enc", "email": "enc2@uu.cc", "phone": "1234567"}'.encode("latin-1"),
+        json.dumps({"first_name": "enc3", "last_name": "enc", "email": "enc3@uu.cc", "phone": "1234567"}).encode(),
+    ]
+    response = client.post(
+        "/api/contacts/import",
+        content=b"\n".join(lines),
+        headers={"Authorization": token, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert (data["total"], data["inserted"], data["errors"]) == (3, 2, 1)
+    assert data["error_rows"] == [{"row": 2, "error": "Expected UTF-8 encoding"}]
+
+    body = "first_name,last_name,email,phone\nenc4,enc,enc4@uu.cc,\nËnc,enc,enc5@uu.cc,\n".encode("latin-1")
+    response = client.post(
+        "/api/contacts/import", content=body, headers={"Authorization": token, "Content-Type": "text/csv"}
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert (data["total"], data["inserted"], data["errors"]) == (2, 1, 1)
+    assert data["error_rows"] == [{"row": 2, "error": "Expected UTF-8 encoding"}]
+
+
+def contact_ids(session, user):
+    owner = session.query(User).filter(User.email == user.get("email")).first()
+    query = session.query(Contact.id).filter(Contact.user_id == owner.id).order_by(Contact.id)
+    return [contact_id for contact_id, in query]
+
+
+def walk_pages(client, token, limit):
+    pages, params = [], {"limit": limit}
+    while True:
+        response = client.get("/api/contacts", params=params, headers={"Authorization": token})
+        assert response.status_code == 200, response.text
+        pages.append([contact["id"] for contact in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+        params = {"limit": limit, "cursor": cursor}
+
+
+def test_get_contacts_pages(client, user, token, session):
+    body = "\n".join(
+        json.dumps({"first_name": f"page{n}", "last_name": "page", "email": f"page{n}@uu.cc", "phone": "1234567"})
+        for n in range(25)
+    )
+    response = client.post(
+        "/api/contacts/import", content=body, headers={"Authorization": token, "Content-Type": "application/x-ndjson"}
+    )
+    assert response.json()["inserted"] == 25
+    expected = contact_ids(session, user)
+    assert len(expected) > 20
+
+    pages = walk_pages(client, token, limit=10)
+    ids = [contact_id for page in pages for contact_id in page]
+    # no duplicates and no gaps, every page but the last one is full
+    assert ids == expected
+    assert all(len(page) == 10 for page in pages[:-1]) and 0 < len(pages[-1]) <= 10
+
+
+def test_get_contacts_pages_cache(client, user, token, session, fake_redis):
+    expected = contact_ids(session, user)
+    # the second walk reads pages and their cursors from cache
+    for _ in range(2):
+        pages = walk_pages(client, token, limit=10)
+        assert [contact_id for page in pages for contact_id in page] == expected
+    cached = [value for key, value in fake_redis.data.items() if key.startswith("contacts:cache:")]
+    assert len(cached) == len(pages) and sum(b"next" in value for value in cached) == len(pages) - 1
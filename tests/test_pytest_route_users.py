@@ -9,7 +9,7 @@ os.environ["PYTHONPATH"] += os.pathsep + hw_path
 from src.database.models import User
 
 
-def test_create_user(client, user, mock_ratelimiter, monkeypatch):
+def test_create_user(client, user, monkeypatch):
     mock_send_email = MagicMock()
     monkeypatch.setattr("src.services.emails.send_email", mock_send_email)
     response = client.post(
@@ -22,7 +22,7 @@ def test_create_user(client, user, mock_ratelimiter, monkeypatch):
     assert "id" in data["user"]
 
 
-def test_repeat_create_user(client, user, mock_ratelimiter):
+def test_repeat_create_user(client, user):
     response = client.post(
         "/api/auth/signup",
         json=user,
@@ -32,7 +32,7 @@ def test_repeat_create_user(client, user, mock_ratelimiter):
     assert data["detail"] == "Account already exists"
 
 
-def test_login_user_not_confirmed(client, user, mock_ratelimiter):
+def test_login_user_not_confirmed(client, user):
     response = client.post(
         "/api/auth/login",
         data={"username": user.get("email"), "password": user.get("password")},
@@ -42,7 +42,7 @@ def test_login_user_not_confirmed(client, user, mock_ratelimiter):
     assert data["detail"] == "Not confirmed"
 
 
-def test_login_user(client, user, mock_ratelimiter, session):
+def test_login_user(client, user, session):
     current_user: User = session.query(User).filter(User.email == user.get("email")).first()
     current_user.confirmed = True
     session.commit()
@@ -55,7 +55,7 @@ def test_login_user(client, user, mock_ratelimiter, session):
     assert data["token_type"] == "bearer"
 
 
-def test_login_wrong_password(client, user, mock_ratelimiter):
+def test_login_wrong_password(client, user):
     response = client.post(
         "/api/auth/login",
         data={"username": user.get("email"), "password": "password"},
@@ -65,7 +65,7 @@ def test_login_wrong_password(client, user, mock_ratelimiter):
     assert data["detail"] == "Invalid credentianal"
 
 
-def test_login_wrong_email(client, user, mock_ratelimiter):
+def test_login_wrong_email(client, user):
     response = client.post(
         "/api/auth/login",
         data={"username": "email", "password": user.get("password")},
@@ -73,3 +73,84 @@ def test_login_wrong_email(client, user, mock_ratelimiter):
     assert response.status_code == 401, response.text
     data = response.json()
     assert data["detail"] == "Invalid credentianal"
+
+
+class FakeLoginRedis:
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        cache = self
+
+        class Pipeline:
+            def __init__(self):
+                self.keys = []
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *args):
+                return False
+
+            def incr(self, key):
+                self.keys.append(key)
+
+            def expire(self, key, seconds):
+                self.keys.append(None)
+
+            async def execute(self):
+                result = []
+                for key in self.keys:
+                    if key:
+                        cache.data[key] = int(cache.data.get(key, 0)) + 1
+                    result.append(cache.data.get(key, True))
+                return result
+
+        return Pipeline()
+
+    async def mget(self, *keys):
+        return [self.data.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = str(value).encode()
+
+    async def exists(self, key):
+        return int(key in self.data)
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+def test_login_lockout_behind_proxy(client, user, monkeypatch):
+    from main import app
+    from src.conf.config import settings
+    from src.database.db import get_redis
+
+    # every request comes from one proxy, "testclient" is peer address of TestClient
+    monkeypatch.setattr(settings, "forwarded_allow_ips", "testclient")
+    monkeypatch.setattr(settings, "login_ip_fails_limit", 2)
+    cache = FakeLoginRedis()
+    override = app.dependency_overrides.get(get_redis)
+    app.dependency_overrides[get_redis] = lambda: cache
+    try:
+        for email in ("one@example.com", "two@example.com"):
+            response = client.post(
+                "/api/auth/login",
+                data={"username": email, "password": "password"},
+                headers={"X-Forwarded-For": "1.2.3.4"},
+            )
+            assert response.status_code == 401, response.text
+        response = client.post(
+            "/api/auth/login",
+            data={"username": "three@example.com", "password": "password"},
+            headers={"X-Forwarded-For": "1.2.3.4"},
+        )
+        assert response.status_code == 429, response.text
+        response = client.post(
+            "/api/auth/login",
+            data={"username": user.get("email"), "password": user.get("password")},
+            headers={"X-Forwarded-For": "5.6.7.8"},
+        )
+        assert response.status_code == 200, response.text
+    finally:
+        app.dependency_overrides[get_redis] = override
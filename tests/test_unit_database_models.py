@@ -0,0 +1,66 @@
+import importlib.util
+import sys
+import os
+import unittest
+from pathlib import Path
+
+hw_path: str = str(Path(__file__).resolve().parent.parent.joinpath("hw14"))
+sys.path.append(hw_path)
+os.environ["PYTHONPATH"] += os.pathsep + hw_path
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateIndex
+
+from hw14.src.database.models import CONTACTS_FTS_COLUMNS, CONTACTS_FTS_DDL, Contact, contacts_fts_ddl
+
+
+def load_migration(name: str):
+    path = Path(hw_path).joinpath("migrations", "versions", f"{name}.py")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)  # type: ignore
+    spec.loader.exec_module(module)  # type: ignore
+    return module
+
+
+class TestContactsFts(unittest.TestCase):
+    def test_models_ddl_equal_head_migration(self):
+        migration = load_migration("c4e7a1f02d35_contacts_name_keys")
+        self.assertEqual(CONTACTS_FTS_COLUMNS, migration.FTS_COLUMNS)
+        # metadata.create_all creates objects only if not exist, migration recreates them
+        ddl = [statement.replace(" IF NOT EXISTS", "") for statement in CONTACTS_FTS_DDL]
+        self.assertEqual(ddl, migration.fts_ddl(migration.FTS_COLUMNS))
+
+    def test_models_ddl_equal_migration(self):
+        migration = load_migration("9362d2dca418_contacts_search_q")
+        columns = ["first_name", "last_name", "email", "phone"]
+        ddl = [statement.replace(" IF NOT EXISTS", "") for statement in contacts_fts_ddl(columns)]
+        self.assertEqual(ddl, migration.fts_ddl(columns))
+
+    def test_migration_search_key_frozen(self):
+        migration = load_migration("c4e7a1f02d35_contacts_name_keys")
+        self.assertEqual(migration.search_key("Тарас"), "taras")
+        self.assertEqual(migration.search_key("Юрій Шевченко"), "iuri shevchenko")
+        self.assertEqual(migration.search_key("Kharkiv"), "harkiv")
+        self.assertIsNone(migration.search_key("--"))
+
+
+class TestContactsIndexes(unittest.TestCase):
+    def test_index_names_unique(self):
+        names = [index.name for index in Contact.__table__.indexes]
+        self.assertEqual(len(names), len(set(names)))
+
+    def test_prefix_index_collation(self):
+        indexes = {index.name: index for index in Contact.__table__.indexes}
+        index = indexes["ix_contacts_user_id_first_name_key"]
+        self.assertEqual(
+            str(CreateIndex(index).compile(dialect=postgresql.dialect())),
+            'CREATE INDEX ix_contacts_user_id_first_name_key ON contacts (user_id, first_name_key COLLATE "C")',
+        )
+        self.assertEqual(
+            str(CreateIndex(index).compile(dialect=sqlite.dialect())),
+            "CREATE INDEX ix_contacts_user_id_first_name_key ON contacts (user_id, first_name_key)",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,14 @@
-from datetime import date, timedelta
+import asyncio
+from datetime import date, datetime, timedelta
 import sys
 import os
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 from pathlib import Path
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy import select, text, extract, desc
+from sqlalchemy.dialects import postgresql, sqlite
 
 hw_path: str = str(Path(__file__).resolve().parent.parent.joinpath("hw14"))
 sys.path.append(hw_path)
@@ -19,6 +21,7 @@ from hw14.src.database.models import User, Contact
 from hw14.src.shemas.contact import ContactModel, ContactFavoriteModel
 from hw14.src.shemas.users import UserModel, UserResponse, UserDetailResponse, NewUserResponse
 
+from hw14.src.repository import contacts as repository_contacts
 from hw14.src.repository.contacts import (
     get_contacts,
     get_contact_by_id,
@@ -28,93 +31,152 @@ from hw14.src.repository.contacts import (
     delete,
     favorite_update,
     search_birthday,
+    get_contacts_version,
+    bump_contacts_version,
+    birthday_doy,
+    birthday_doy_ranges,
+    purge_tombstones,
+    purge_tombstones_periodically,
 )
+from hw14.src.repository.search import prefix_upper_bound, starts_with
 
 
 class TestContactsRepository (unittest.IsolatedAsyncioTestCase):
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
+        self.result = MagicMock()
+        self.session.execute.return_value = self.result
         self.user = User(id=1, email="some@email.ua")
 
     async def test_get_contacts(self):
         contacts = [Contact(), Contact(), Contact()]
         favorite = True
-        q = self.session.query().filter_by()
-        if favorite is not None:
-            q = q.filter_by()
-        q.offset().limit().all.return_value = contacts
+        self.result.scalars.return_value.all.return_value = contacts
         result = await get_contacts(skip=0, limit=10, user_id=self.user.id, favorite=favorite, db=self.session)  # type: ignore
         self.assertEqual(result, contacts)
 
     async def test_get_contact_found_by_id(self):
         contact = Contact()
-        self.session.query().filter_by().first.return_value = contact
+        self.result.scalars.return_value.first.return_value = contact
         result = await get_contact_by_id(contact_id=1, user_id=self.user.id, db=self.session)  # type: ignore
         self.assertEqual(result, contact)
 
     async def test_get_contact_found_by_email(self):
         contact = Contact()
-        self.session.query().filter_by().first.return_value = contact
+        self.result.scalars.return_value.first.return_value = contact
         result = await get_contact_by_email(email="as@ee.ua", user_id=self.user.id, db=self.session)  # type: ignore
         self.assertEqual(result, contact)
 
     async def test_get_contact_not_found_by_id(self):
-        self.session.query().filter_by().first.return_value = None
+        self.result.scalars.return_value.first.return_value = None
         result = await get_contact_by_id(contact_id=1, user_id=self.user.id, db=self.session)  # type: ignore
         self.assertIsNone(result)
 
     async def test_get_contact_not_found_by_email(self):
-        self.session.query().filter_by().first.return_value = None
+        self.result.scalars.return_value.first.return_value = None
         result = await get_contact_by_email(email="as@ee.ua", user_id=self.user.id, db=self.session)  # type: ignore
         self.assertIsNone(result)
 
     async def test_create_contact(self):
         body = ContactModel(first_name="test1", last_name="test2", email="aa@uu.uu", phone="+380 (44) 1234567")
+        contact = Contact(id=1, **body.model_dump(), user_id=self.user.id)
+        self.session.get_bind = MagicMock()
+        self.session.get_bind.return_value.dialect.name = "postgresql"
+        contact.user = self.user
+        self.result.scalars.return_value.unique.return_value.all.return_value = [contact]
         result = await create(body=body, user_id=self.user.id, db=self.session)  # type: ignore
-        self.assertEqual(result.first_name, body.first_name)
-        self.assertEqual(result.last_name, body.last_name)
-        self.assertEqual(result.email, body.email)
-        self.assertEqual(result.phone, body.phone)
-        self.assertTrue(hasattr(result, "id"))
-        self.assertEqual(result.user_id, self.user.id)
+        self.assertEqual(result, contact)
+        self.assertEqual(result.user, self.user)
+        # owner is joined to RETURNING in the same statement
+        self.session.get.assert_not_awaited()
+        stmt = self.session.execute.call_args.args[0]
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        self.assertIn("WITH written AS", sql)
+        self.assertIn("ON CONFLICT (user_id, lower(email)) DO NOTHING", sql)
+        self.assertIn("RETURNING", sql)
+        self.assertIn("FROM written JOIN users ON users.id = written.user_id", sql)
+        self.assertEqual(sql.count("JOIN users"), 1)
+        # first_name and computed first_name_key
+        self.assertEqual(list(stmt.compile().params.values()).count("test1"), 2)
+        self.session.commit.assert_awaited_once()
+
+    async def test_create_contact_exist(self):
+        body = ContactModel(first_name="test1", last_name="test2", email="aa@uu.uu", phone="+380 (44) 1234567")
+        self.session.get_bind = MagicMock()
+        self.session.get_bind.return_value.dialect.name = "sqlite"
+        self.result.scalars.return_value.unique.return_value.all.return_value = []
+        result = await create(body=body, user_id=self.user.id, db=self.session)  # type: ignore
+        self.assertIsNone(result)
+        self.session.get.assert_not_awaited()
 
     async def test_remove_contact_found(self):
         contact = Contact()
-        self.session.query().filter_by().first.return_value = contact
+        self.result.scalars.return_value.first.return_value = contact
         result = await delete(contact_id=1, user_id=self.user.id, db=self.session)  # type: ignore
         self.assertEqual(result, contact)
+        # DELETE ... RETURNING and tombstone for delta sync, one commit
+        self.assertEqual(self.session.execute.await_count, 2)
+        stmt, params = self.session.execute.call_args.args
+        self.assertEqual(stmt.table.name, "contact_tombstones")
+        self.assertEqual(params, [{"contact_id": 1, "user_id": self.user.id}])
+        self.session.commit.assert_awaited_once()
 
     async def test_remove_contact_not_found(self):
-        self.session.query().filter_by().first.return_value = None
+        self.result.scalars.return_value.first.return_value = None
         result = await delete(contact_id=1, user_id=self.user.id, db=self.session)  # type: ignore
         self.assertIsNone(result)
 
+    async def test_purge_tombstones(self):
+        await purge_tombstones(before=datetime(2023, 1, 1), db=self.session)
+        stmt = self.session.execute.call_args.args[0]
+        self.assertEqual(stmt.table.name, "contact_tombstones")
+        self.session.commit.assert_awaited_once()
+
+    async def test_purge_tombstones_periodically(self):
+        self.session.get_bind = MagicMock()
+        self.session.get_bind.return_value.dialect.name = "sqlite"
+        self.result.scalar.return_value = datetime(2023, 6, 1)
+        self.session.__aenter__.return_value = self.session
+        task = asyncio.create_task(purge_tombstones_periodically(MagicMock(return_value=self.session), 60))
+        await asyncio.sleep(0)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        # now from db_now, then delete of tombstones
+        self.assertEqual(self.session.execute.await_count, 2)
+        self.session.commit.assert_awaited_once()
+
     async def test_update_contact_found(self):
         contact = Contact()
         body = ContactModel(first_name="test1-1", last_name="test2-1", email="aa@uu.uu", phone="+380 (44) 1234567")
-        self.session.query().filter_by().first.return_value = contact
-        self.session.commit.return_value = None
+        self.result.scalars.return_value.unique.return_value.all.return_value = [contact]
         result = await update(contact_id=1, body=body, user_id=self.user.id, db=self.session)  # type: ignore
         self.assertEqual(result, contact)
 
     async def test_update_contact_not_found(self):
         body = ContactModel(first_name="test1-1", last_name="test2-1", email="aa@uu.uu", phone="+380 (44) 1234567")
-        self.session.query().filter_by().first.return_value = None
-        self.session.commit.return_value = None
+        self.result.scalars.return_value.unique.return_value.all.return_value = []
         result = await update(contact_id=1, body=body, user_id=self.user.id, db=self.session)  # type: ignore
         self.assertIsNone(result)
 
     async def test_update_favorite_contact_found(self):
         body = ContactFavoriteModel(favorite=True)
         contact = Contact()
-        self.session.query().filter_by().first.return_value = contact
+        self.session.get_bind = MagicMock()
+        self.session.get_bind.return_value.dialect.name = "sqlite"
+        self.result.scalars.return_value.unique.return_value.all.return_value = [contact]
+        self.session.get.return_value = self.user
         result = await favorite_update(contact_id=1, body=body, user_id=self.user.id, db=self.session)  # type: ignore
         self.assertEqual(result, contact)
+        self.assertEqual(result.user, self.user)
+        self.session.execute.assert_awaited_once()
+        sql = str(self.session.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+        self.assertIn("UPDATE contacts SET favorite=", sql)
+        self.assertIn("RETURNING", sql)
 
     async def test_update_favorite_contact_not_found(self):
         body = ContactFavoriteModel(favorite=True)
-        contact = Contact()
-        self.session.query().filter_by().first.return_value = None
+        self.result.scalars.return_value.unique.return_value.all.return_value = []
         result = await favorite_update(contact_id=1, body=body, user_id=self.user.id, db=self.session)  # type: ignore
         self.assertIsNone(result)
 
@@ -123,24 +185,126 @@ class TestContactsRepository (unittest.IsolatedAsyncioTestCase):
         bd1 = date_now.replace(year=1990) + timedelta(days=2)
         bd2 = date_now.replace(year=2000) + timedelta(days=3)
         bd3 = date_now.replace(year=2010) + timedelta(days=4)
-        bd4 = date_now.replace(year=2011) + timedelta(days=25)
-        contacts = [Contact(birthday=bd1), Contact(birthday=bd2), Contact(birthday=bd3), Contact(birthday=bd4)]
+        contacts = [Contact(birthday=bd1), Contact(birthday=bd2), Contact(birthday=bd3)]
         param = {"days": 7, "skip": 0, "limit": 10}
-        query = select().where().order_by()
-        self.session.execute(query).scalars.return_value = contacts
-        result = await search_birthday(param=param, user_id=self.user.id, db=self.session)  # type: ignore
-        self.assertEqual(result, contacts[:-1])   
-        
-    async def test_get_contact_search_birthday_leap(self):
-        date_now = date.today()
-        bd1 = date(1988,2,29)
-        contacts = [Contact(birthday=bd1)]
-        param = {"days": 7, "skip": 0, "limit": 10, "fixed_now": date(2023,2,27)}
-        query = select().where().order_by()
-        self.session.execute(query).scalars.return_value = contacts
+        self.result.scalars.return_value.all.return_value = contacts
         result = await search_birthday(param=param, user_id=self.user.id, db=self.session)  # type: ignore
         self.assertEqual(result, contacts)
 
+    async def test_get_contacts_version(self):
+        cache = AsyncMock()
+        cache.get.return_value = b"v1"
+        self.assertEqual(await get_contacts_version(self.user.id, cache), "v1")
+        cache.set.assert_not_awaited()
+        self.assertIsNone(await get_contacts_version(self.user.id, None))
+
+    async def test_get_contacts_version_new(self):
+        cache = AsyncMock()
+        cache.get.side_effect = [None, b"v2"]
+        self.assertEqual(await get_contacts_version(self.user.id, cache), "v2")
+        self.assertTrue(cache.set.call_args.kwargs["nx"])
+
+    async def test_bump_contacts_version(self):
+        cache = AsyncMock()
+        await bump_contacts_version(self.user.id, cache)
+        key, version = cache.set.call_args.args
+        self.assertEqual(key, f"contacts:version:{self.user.id}")
+        cache.set.side_effect = ConnectionError
+        await bump_contacts_version(self.user.id, cache)
+
+    def test_birthday_doy(self):
+        self.assertEqual(birthday_doy(date(1990, 1, 1)), 1)
+        self.assertEqual(birthday_doy(date(1990, 2, 28)), 59)
+        self.assertEqual(birthday_doy(date(1988, 2, 29)), 60)
+        self.assertEqual(birthday_doy(date(1990, 3, 1)), 61)
+        self.assertEqual(birthday_doy(date(1990, 12, 31)), 366)
+        self.assertIsNone(birthday_doy(None))
+
+    def test_birthday_doy_ranges(self):
+        self.assertEqual(birthday_doy_ranges(date(2023, 6, 5), 8), [(157, 165)])
+        self.assertEqual(birthday_doy_ranges(date(2023, 12, 28), 8), [(363, 366), (1, 5)])
+
+    def test_birthday_doy_ranges_leap(self):
+        self.assertEqual(birthday_doy_ranges(date(2023, 2, 27), 8), [(58, 67)])
+        self.assertEqual(birthday_doy_ranges(date(2023, 3, 1), 8), [(60, 69)])
+        self.assertEqual(birthday_doy_ranges(date(2024, 3, 1), 8), [(61, 69)])
+
+    def test_prefix_upper_bound(self):
+        self.assertEqual(prefix_upper_bound("john.s"), "john.t")
+        self.assertEqual(prefix_upper_bound("a" + chr(0x10FFFF)), "b")
+        self.assertIsNone(prefix_upper_bound(chr(0x10FFFF)))
+        self.assertEqual(prefix_upper_bound("a" + chr(0xD7FF)), "a" + chr(0xE000))
+
+    def test_starts_with_code_point_order(self):
+        condition = starts_with(Contact.email, "john.s")
+        sql = str(condition.compile(dialect=postgresql.dialect()))
+        self.assertEqual(sql.count('COLLATE "C"'), 4)
+        self.assertIn("LIKE", sql)
+        sql = str(condition.compile(dialect=sqlite.dialect()))
+        self.assertNotIn("COLLATE", sql)
+
+
+class TestSearchBirthdaySql(unittest.IsolatedAsyncioTestCase):
+    """search_birthday against SQLite database in memory"""
+
+    async def asyncSetUp(self):
+        # repository uses models of package src, not of hw14.src
+        self.models = sys.modules[repository_contacts.Contact.__module__]
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as connection:
+            await connection.run_sync(self.models.Base.metadata.create_all)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)()
+        self.session.add_all(
+            [
+                self.models.User(id=1, username="one", email="one@uu.uu", password="x"),
+                self.models.User(id=2, username="two", email="two@uu.uu", password="x"),
+            ]
+        )
+        await self.session.commit()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def add_contacts(self, birthdays: list[date], user_id: int = 1) -> list[int]:
+        contacts = [
+            self.models.Contact(
+                first_name="bd",
+                email=f"bd{n}.{user_id}@uu.uu",
+                birthday=birthday,
+                birthday_doy=birthday_doy(birthday),
+                user_id=user_id,
+            )
+            for n, birthday in enumerate(birthdays)
+        ]
+        self.session.add_all(contacts)
+        await self.session.commit()
+        return [contact.id for contact in contacts]
+
+    async def search(self, fixed_now: date, days: int = 7) -> list[int]:
+        param = {"days": days, "skip": 0, "limit": 10, "fixed_now": fixed_now}
+        return [contact.id for contact in await search_birthday(param=param, user_id=1, db=self.session)]
+
+    async def test_year_end(self):
+        dec_30, jan_2, jan_10, dec_20 = await self.add_contacts(
+            [date(1990, 12, 30), date(1985, 1, 2), date(1999, 1, 10), date(1980, 12, 20)]
+        )
+        self.assertEqual(await self.search(date(2023, 12, 28)), [dec_30, jan_2])
+
+    async def test_leap_day_in_not_leap_year(self):
+        feb_29, mar_1, feb_28, mar_10 = await self.add_contacts(
+            [date(1988, 2, 29), date(1990, 3, 1), date(1991, 2, 28), date(1992, 3, 10)]
+        )
+        # 29.02 is celebrated on 01.03 in 2023
+        self.assertEqual(await self.search(date(2023, 2, 27)), [feb_28, feb_29, mar_1])
+        # in 2024 it is on its own day, before 01.03
+        self.assertEqual(await self.search(date(2024, 2, 27)), [feb_28, feb_29, mar_1])
+        self.assertEqual(await self.search(date(2023, 3, 1), days=0), [feb_29, mar_1])
+
+    async def test_out_of_window(self):
+        inside, before, after = await self.add_contacts([date(1990, 6, 7), date(1990, 6, 4), date(1990, 6, 14)])
+        await self.add_contacts([date(1990, 6, 7)], user_id=2)
+        self.assertEqual(await self.search(date(2023, 6, 5)), [inside])
 
 
 if __name__ == "__main__":
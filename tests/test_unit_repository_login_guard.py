@@ -0,0 +1,113 @@
+import sys
+import os
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+
+hw_path: str = str(Path(__file__).resolve().parent.parent.joinpath("hw14"))
+sys.path.append(hw_path)
+os.environ["PYTHONPATH"] += os.pathsep + hw_path
+
+from hw14.src.repository import login_guard
+from hw14.src.repository.login_guard import get_lockout, lockout_seconds, register_failure, reset_failures
+from hw14.src.repository.users import is_unknown_email, set_unknown_email
+
+
+# login_guard reads settings of package src, not of hw14.src
+settings = login_guard.settings
+
+
+class FakePipeline:
+    def __init__(self, cache):
+        self.cache = cache
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def incr(self, key):
+        self.commands.append(("incr", key))
+
+    def expire(self, key, seconds):
+        self.commands.append(("expire", key))
+
+    async def execute(self):
+        result = []
+        for command, key in self.commands:
+            if command == "incr":
+                self.cache.data[key] = int(self.cache.data.get(key, 0)) + 1
+                result.append(self.cache.data[key])
+            else:
+                result.append(True)
+        return result
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def mget(self, *keys):
+        return [self.data.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = str(value).encode()
+
+    async def exists(self, key):
+        return int(key in self.data)
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+class TestLoginGuard(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = FakeRedis()
+
+    def test_lockout_seconds(self):
+        limit = settings.login_fails_limit
+        self.assertEqual(lockout_seconds(limit - 1, limit), 0)
+        self.assertEqual(lockout_seconds(limit, limit), settings.login_lockout_seconds)
+        self.assertEqual(lockout_seconds(limit + 2, limit), settings.login_lockout_seconds * 4)
+        self.assertEqual(lockout_seconds(limit + 1000, limit), settings.login_lockout_max_seconds)
+
+    async def test_account_lockout(self):
+        for _ in range(settings.login_fails_limit - 1):
+            self.assertEqual(await register_failure("User@example.com", "10.0.0.1", self.cache), 0)
+        self.assertEqual(await get_lockout("user@example.com", "10.0.0.2", self.cache), 0)
+        lockout = await register_failure("user@example.com", "10.0.0.1", self.cache)
+        self.assertEqual(lockout, settings.login_lockout_seconds)
+        self.assertGreater(await get_lockout("USER@example.com", "10.0.0.2", self.cache), 0)
+        self.assertEqual(await get_lockout("other@example.com", "10.0.0.2", self.cache), 0)
+
+    async def test_ip_lockout(self):
+        with patch.object(settings, "login_ip_fails_limit", 2):
+            await register_failure("one@example.com", "10.0.0.1", self.cache)
+            await register_failure("two@example.com", "10.0.0.1", self.cache)
+        self.assertGreater(await get_lockout("three@example.com", "10.0.0.1", self.cache), 0)
+
+    async def test_reset_failures(self):
+        for _ in range(settings.login_fails_limit - 1):
+            await register_failure("user@example.com", "10.0.0.1", self.cache)
+        await reset_failures("user@example.com", self.cache)
+        self.assertEqual(await register_failure("user@example.com", "10.0.0.1", self.cache), 0)
+
+    async def test_without_cache(self):
+        self.assertEqual(await register_failure("user@example.com", "10.0.0.1", None), 0)
+        self.assertEqual(await get_lockout("user@example.com", "10.0.0.1", None), 0)
+
+    async def test_unknown_email(self):
+        self.assertFalse(await is_unknown_email("user@example.com", self.cache))
+        await set_unknown_email("user@example.com", self.cache)
+        self.assertTrue(await is_unknown_email("user@example.com", self.cache))
+        await set_unknown_email("user@example.com", self.cache, registered=True)
+        self.assertFalse(await is_unknown_email("user@example.com", self.cache))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import sys
+import os
+import unittest
+from unittest.mock import AsyncMock
+from pathlib import Path
+
+hw_path: str = str(Path(__file__).resolve().parent.parent.joinpath("hw14"))
+sys.path.append(hw_path)
+os.environ["PYTHONPATH"] += os.pathsep + hw_path
+
+from hw14.src.services.auth.auth import auth_service
+from hw14.src.repository.refresh_tokens import issue, rotate, refresh_family_key, ROTATE_SCRIPT
+
+
+class TestRefreshTokens(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = AsyncMock()
+
+    async def test_issue(self):
+        refresh_token, expire = await issue("user@example.com", self.cache)
+        claims = auth_service.decode_refresh_claims(refresh_token)
+        self.assertEqual(claims["sub"], "user@example.com")
+        key, jti = self.cache.set.await_args.args
+        self.assertEqual(key, refresh_family_key(claims["fam"]))
+        self.assertEqual(jti, claims["jti"])
+        self.assertGreater(self.cache.set.await_args.kwargs["ex"], 0)
+
+    async def test_issue_without_cache(self):
+        self.assertIsNone(await issue("user@example.com", None))
+
+    async def test_rotate(self):
+        refresh_token, _ = await issue("user@example.com", self.cache)
+        claims = auth_service.decode_refresh_claims(refresh_token)
+        self.cache.eval.return_value = 1
+        new_token, _ = await rotate(claims, self.cache)
+        new_claims = auth_service.decode_refresh_claims(new_token)
+        self.assertEqual(new_claims["fam"], claims["fam"])
+        self.assertNotEqual(new_claims["jti"], claims["jti"])
+        script, numkeys, key, old_jti, new_jti, ttl = self.cache.eval.await_args.args
+        self.assertEqual((script, numkeys, key), (ROTATE_SCRIPT, 1, refresh_family_key(claims["fam"])))
+        self.assertEqual((old_jti, new_jti), (claims["jti"], new_claims["jti"]))
+
+    async def test_rotate_reuse(self):
+        refresh_token, _ = await issue("user@example.com", self.cache)
+        claims = auth_service.decode_refresh_claims(refresh_token)
+        for result in (0, -1):
+            with self.subTest(result=result):
+                self.cache.eval.return_value = result
+                self.assertIsNone(await rotate(claims, self.cache))
+
+
+if __name__ == "__main__":
+    unittest.main()
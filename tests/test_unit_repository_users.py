@@ -0,0 +1,101 @@
+import sys
+import os
+import unittest
+from unittest.mock import AsyncMock, patch
+from pathlib import Path
+
+hw_path: str = str(Path(__file__).resolve().parent.parent.joinpath("hw14"))
+sys.path.append(hw_path)
+os.environ["PYTHONPATH"] += os.pathsep + hw_path
+
+from hw14.src.database.models import User
+from hw14.src.shemas.users import Role
+from hw14.src.services.local_cache import TTLCache
+from hw14.src.repository import users as repository_users
+from hw14.src.repository.users import (
+    get_cache_user_by_email,
+    update_cache_user,
+    user_cache_key,
+    USER_CACHE_TTL,
+    USER_INVALIDATE_CHANNEL,
+    UserPrincipal,
+)
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_expire(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        with patch("time.monotonic", return_value=1000):
+            cache.set("a", 1)
+        with patch("time.monotonic", return_value=1061):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_disabled(self):
+        cache = TTLCache(maxsize=2, ttl=60, enabled=False)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
+
+
+class TestUsersCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.user = User(
+            id=1,
+            username="user",
+            email="user@example.com",
+            password="secret",
+            refresh_token="token",
+            role=Role.user,
+            confirmed=True,
+        )
+        self.cache = AsyncMock()
+        repository_users.local_users.clear()
+        repository_users.local_users.enabled = True
+
+    def tearDown(self):
+        repository_users.local_users.clear()
+        repository_users.local_users.enabled = False
+
+    async def test_update_cache_user_compact(self):
+        await update_cache_user(self.user, self.cache)
+        key, value = self.cache.set.await_args.args
+        self.assertEqual(key, user_cache_key(self.user.email))
+        self.assertEqual(self.cache.set.await_args.kwargs, {"ex": USER_CACHE_TTL})
+        self.assertNotIn("password", value)
+        self.assertNotIn("refresh_token", value)
+        self.assertEqual(UserPrincipal.model_validate_json(value), UserPrincipal.model_validate(self.user))
+
+    async def test_get_cache_user_local(self):
+        self.cache.get.return_value = UserPrincipal.model_validate(self.user).model_dump_json().encode()
+        user = await get_cache_user_by_email(self.user.email, self.cache)
+        self.assertIsInstance(user, UserPrincipal)
+        self.assertEqual(user.id, self.user.id)
+        self.assertEqual(user.role, Role.user)
+        self.assertTrue(user.confirmed)
+        user_local = await get_cache_user_by_email(self.user.email, self.cache)
+        self.assertIs(user_local, user)
+        self.cache.get.assert_awaited_once()
+
+    async def test_update_cache_user_invalidate(self):
+        repository_users.local_users.set(self.user.email, self.user)
+        await update_cache_user(self.user, self.cache)
+        self.assertIsNone(repository_users.local_users.get(self.user.email))
+        self.cache.publish.assert_awaited_once_with(USER_INVALIDATE_CHANNEL, self.user.email)
+
+    async def test_get_cache_user_without_cache(self):
+        repository_users.local_users.set(self.user.email, self.user)
+        self.assertIsNone(await get_cache_user_by_email(self.user.email, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
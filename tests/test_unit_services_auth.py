@@ -0,0 +1,72 @@
+import asyncio
+import sys
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+
+from jose import jwt
+
+hw_path: str = str(Path(__file__).resolve().parent.parent.joinpath("hw14"))
+sys.path.append(hw_path)
+os.environ["PYTHONPATH"] += os.pathsep + hw_path
+
+from hw14.src.services.auth.auth_token import AuthToken, PassCrypt, PasswordPoolBusy, token_digest
+
+
+class TestPassCryptPool(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.crypt = PassCrypt(workers=1, max_queue=1)
+
+    def tearDown(self):
+        self.crypt.executor.shutdown(wait=True)
+
+    async def test_hash_verify(self):
+        hashed = await self.crypt.a_get_password_hash("secret")
+        self.assertTrue(await self.crypt.a_verify_password("secret", hashed))
+        self.assertFalse(await self.crypt.a_verify_password("wrong", hashed))
+        self.assertEqual(self.crypt.get_pool_status()["in_flight"], 0)
+
+    async def test_queue_limit(self):
+        release = threading.Event()
+        first = asyncio.create_task(self.crypt.run_in_pool(release.wait))
+        second = asyncio.create_task(self.crypt.run_in_pool(release.wait))
+        await asyncio.sleep(0)
+        self.assertEqual(self.crypt.get_pool_status(), {"workers": 1, "in_flight": 1, "queued": 1, "max_queue": 1})
+        with self.assertRaises(PasswordPoolBusy):
+            await self.crypt.run_in_pool(release.wait)
+        release.set()
+        await asyncio.gather(first, second)
+        self.assertEqual(self.crypt.get_pool_status()["queued"], 0)
+
+
+class TestAuthTokenCache(unittest.TestCase):
+    def setUp(self):
+        self.auth = AuthToken(secret_key="secret", password_workers=1)
+
+    def tearDown(self):
+        self.auth.executor.shutdown(wait=True)
+
+    def test_decode_memoized(self):
+        token, _ = self.auth.create_access_token(data={"sub": "user@example.com"})
+        with patch("hw14.src.services.auth.auth_token.jwt.decode", wraps=jwt.decode) as decode:
+            self.assertEqual(self.auth.decode_jwt(token), "user@example.com")
+            self.assertEqual(self.auth.decode_jwt(token), "user@example.com")
+            self.assertEqual(decode.call_count, 1)
+
+    def test_decode_expired(self):
+        token, _ = self.auth.create_access_token(data={"sub": "user@example.com"}, expires_delta=60)
+        self.assertEqual(self.auth.decode_jwt(token), "user@example.com")
+        with patch("time.monotonic", return_value=time.monotonic() + 61):
+            self.assertIsNone(self.auth.verified_tokens.get(token_digest(token)))
+
+    def test_decode_invalid(self):
+        token, _ = self.auth.create_access_token(data={"sub": "user@example.com"})
+        self.assertIsNone(self.auth.decode_jwt(token + "x"))
+        self.assertEqual(len(self.auth.verified_tokens), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import sys
+import os
+import unittest
+from pathlib import Path
+
+hw_path: str = str(Path(__file__).resolve().parent.parent.joinpath("hw14"))
+sys.path.append(hw_path)
+os.environ["PYTHONPATH"] += os.pathsep + hw_path
+
+from hw14.src.services.contacts_import import (
+    IMPORT_MAX_LINE,
+    INVALID_ENCODING,
+    LINE_TOO_LONG,
+    UNTERMINATED_QUOTE,
+    CsvRecords,
+    iter_csv,
+    iter_lines,
+    iter_ndjson,
+)
+
+
+async def stream(body: bytes, size: int = 4096):
+    for start in range(0, len(body), size):
+        yield body[start : start + size]
+
+
+async def collect(iterator) -> list:
+    return [item async for item in iterator]
+
+
+class TestContactsImport(unittest.IsolatedAsyncioTestCase):
+    async def test_iter_lines_too_long(self):
+        body = b'{"a": 1}\n' + b"x" * (IMPORT_MAX_LINE * 3) + b'\n{"b": 2}\n' + b"y" * (IMPORT_MAX_LINE + 1)
+        lines = await collect(iter_lines(stream(body)))
+        self.assertEqual(lines, [('{"a": 1}', None), (None, LINE_TOO_LONG), ('{"b": 2}', None), (None, LINE_TOO_LONG)])
+
+    async def test_iter_lines_too_long_in_chunk(self):
+        body = b"x" * (IMPORT_MAX_LINE + 1) + b"\nok\n"
+        lines = await collect(iter_lines(stream(body, size=len(body))))
+        self.assertEqual(lines, [(None, LINE_TOO_LONG), ("ok", None)])
+
+    async def test_iter_ndjson_errors(self):
+        body = b'{"a": 1}\n\xff\n' + b"x" * (IMPORT_MAX_LINE + 1) + b'\n{"b": 2}'
+        rows = await collect(iter_ndjson(iter_lines(stream(body))))
+        self.assertEqual(
+            rows, [(1, {"a": 1}, None), (2, None, INVALID_ENCODING), (3, None, LINE_TOO_LONG), (4, {"b": 2}, None)]
+        )
+
+    async def test_iter_csv_quoted_line_break(self):
+        body = b'name,comments\na,"line1\nline2"\nb,\n'
+        rows = await collect(iter_csv(iter_lines(stream(body))))
+        self.assertEqual(
+            rows, [(1, {"name": "a", "comments": "line1\nline2"}, None), (2, {"name": "b", "comments": None}, None)]
+        )
+
+    async def test_iter_csv_stray_quote(self):
+        count = IMPORT_MAX_LINE // 10
+        body = "name,comments\nbad,\"oops\n" + "".join(f"n{n},c\n" for n in range(count))
+        rows = await collect(iter_csv(iter_lines(stream(body.encode()))))
+        self.assertEqual(rows[0], (1, None, UNTERMINATED_QUOTE))
+        # rows after the stray quote are parsed, not swallowed
+        self.assertEqual(len(rows), count + 1)
+        self.assertEqual(rows[1], (2, {"name": "n0", "comments": "c"}, None))
+        self.assertEqual(rows[-1], (count + 1, {"name": f"n{count - 1}", "comments": "c"}, None))
+
+    async def test_iter_csv_stray_quote_at_end(self):
+        body = b'name,comments\na,"oops\nb,c\n'
+        rows = await collect(iter_csv(iter_lines(stream(body))))
+        self.assertEqual(rows, [(1, None, UNTERMINATED_QUOTE), (2, {"name": "b", "comments": "c"}, None)])
+
+    def test_csv_records_limit(self):
+        records = CsvRecords(max_size=10)
+        self.assertEqual(list(records.feed('a,"b')), [])
+        self.assertEqual(list(records.feed("c,d")), [])
+        self.assertEqual(list(records.feed("e,f")), [None, "c,d", "e,f"])
+        self.assertEqual(list(records.finish()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
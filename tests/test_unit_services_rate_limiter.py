@@ -0,0 +1,92 @@
+import sys
+import os
+import unittest
+from unittest.mock import AsyncMock, patch
+from pathlib import Path
+
+from fastapi import HTTPException
+from starlette.requests import Request
+
+hw_path: str = str(Path(__file__).resolve().parent.parent.joinpath("hw14"))
+sys.path.append(hw_path)
+os.environ["PYTHONPATH"] += os.pathsep + hw_path
+
+from hw14.src.services import rate_limiter
+from hw14.src.services.rate_limiter import RateLimiter, client_key, GCRA_SCRIPT
+
+
+# rate_limiter reads settings of package src, not of hw14.src
+settings = rate_limiter.settings
+
+
+def make_request(path="/api/contacts", host="10.0.0.1", headers=None):
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+            "client": (host, 12345),
+        }
+    )
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = AsyncMock()
+        self.cache.eval.return_value = 0
+
+    def test_client_key(self):
+        self.assertEqual(client_key(make_request()), "10.0.0.1:/api/contacts")
+        request = make_request(headers={"X-Forwarded-For": "1.2.3.4, 10.0.0.1"})
+        # header of untrusted peer is ignored
+        self.assertEqual(client_key(request), "10.0.0.1:/api/contacts")
+        with patch.object(settings, "forwarded_allow_ips", "10.0.0.0/8"):
+            self.assertEqual(client_key(request), "1.2.3.4:/api/contacts")
+            request = make_request(headers={"X-Forwarded-For": "5.6.7.8, 1.2.3.4"})
+            self.assertEqual(client_key(request), "1.2.3.4:/api/contacts")
+
+    async def test_redis_one_call(self):
+        limiter = RateLimiter(times=2, seconds=5)
+        await limiter(make_request(), self.cache)
+        self.cache.eval.assert_awaited_once_with(GCRA_SCRIPT, 1, "ratelimit:10.0.0.1:/api/contacts", 2500, 2500)
+
+    async def test_local_bucket(self):
+        limiter = RateLimiter(times=2, seconds=5)
+        await limiter(make_request(), self.cache)
+        await limiter(make_request(), self.cache)
+        with self.assertRaises(HTTPException) as err:
+            await limiter(make_request(), self.cache)
+        self.assertEqual(err.exception.status_code, 429)
+        self.assertEqual(err.exception.headers, {"Retry-After": "3"})
+        self.assertEqual(self.cache.eval.await_count, 2)
+        await limiter(make_request(host="10.0.0.2"), self.cache)
+
+    async def test_local_bucket_refill(self):
+        limiter = RateLimiter(times=2, seconds=5)
+        with patch("time.monotonic", return_value=1000):
+            await limiter(make_request(), self.cache)
+            await limiter(make_request(), self.cache)
+        with patch("time.monotonic", return_value=1002.5):
+            await limiter(make_request(), self.cache)
+        self.assertEqual(self.cache.eval.await_count, 3)
+
+    async def test_redis_rejected(self):
+        limiter = RateLimiter(times=2, seconds=5)
+        self.cache.eval.return_value = 1200
+        with self.assertRaises(HTTPException) as err:
+            await limiter(make_request(), self.cache)
+        self.assertEqual(err.exception.headers, {"Retry-After": "2"})
+        with self.assertRaises(HTTPException):
+            await limiter(make_request(), self.cache)
+        self.cache.eval.assert_awaited_once()
+
+    async def test_redis_error(self):
+        limiter = RateLimiter(times=2, seconds=5)
+        self.cache.eval.side_effect = ConnectionError("down")
+        await limiter(make_request(), self.cache)
+        await limiter(make_request(), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import sys
+import os
+import unittest
+from pathlib import Path
+
+hw_path: str = str(Path(__file__).resolve().parent.parent.joinpath("hw14"))
+sys.path.append(hw_path)
+os.environ["PYTHONPATH"] += os.pathsep + hw_path
+
+from hw14.src.services.translit import transliterate, search_key
+
+
+class TestTranslit(unittest.TestCase):
+    def test_transliterate(self):
+        self.assertEqual(transliterate("Шевченко"), "shevchenko")
+        self.assertEqual(transliterate("Taras"), "taras")
+
+    def test_search_key_cyrillic_latin(self):
+        for cyrillic, latin in (("Тарас", "Taras"), ("Юрій", "Yuriy"), ("Харків", "Kharkiv"), ("Сергій", "Serhii")):
+            with self.subTest(cyrillic=cyrillic):
+                self.assertEqual(search_key(cyrillic), search_key(latin))
+
+    def test_search_key_empty(self):
+        self.assertIsNone(search_key(None))
+        self.assertIsNone(search_key(""))
+        self.assertIsNone(search_key("--"))
+
+
+if __name__ == "__main__":
+    unittest.main()